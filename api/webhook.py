@@ -1,5 +1,5 @@
-from flask import Flask, request, Response
-import json
+from flask import Flask, request, Response, jsonify
+import hmac
 import os
 import sys
 import logging
@@ -7,15 +7,44 @@ import logging
 # Ajouter le répertoire parent au chemin pour pouvoir importer les modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.config import verify_webhook
-from src.messenger_api import handle_message
-from src.utils.logger import setup_logger
+from src.config import verify_webhook, WEBHOOK_MODE, REQUEST_BUDGET_SECONDS, METRICS_TOKEN
+from src.messenger_api import handle_webhook_event, claim_webhook_event, process_webhook_event
+from src.event_queue import get_worker_pool
+from src.dispatcher import get_dispatcher
+from src.conversation import conversation_memory
+from src.utils.logger import setup_logger, lazy_json
+from src.utils.metrics import metrics
+from src.utils.deadline import Deadline
 
 # Configurer le logger
 logger = setup_logger()
 
 app = Flask(__name__)
 
+def extract_events(data):
+    """
+    Valide le corps de la requête et retourne les événements de messagerie à traiter,
+    ou None si la requête n'est pas un événement de page
+    """
+    if not isinstance(data, dict) or data.get('object') != 'page':
+        return None
+
+    events = []
+    for entry in data.get('entry', []) or []:
+        if not isinstance(entry, dict):
+            continue
+        logger.debug("Entrée reçue: %s", lazy_json(entry))
+        messaging = entry.get('messaging', [])
+        if messaging:
+            # Facebook peut regrouper plusieurs événements dans une même entrée
+            for webhook_event in messaging:
+                if isinstance(webhook_event, dict):
+                    logger.debug("Événement Webhook reçu: %s", lazy_json(webhook_event))
+                    events.append(webhook_event)
+        else:
+            logger.info("Aucun événement de messagerie dans cette entrée")
+    return events
+
 @app.route('/api/webhook', methods=['GET'])
 def webhook_verification():
     """
@@ -30,49 +59,55 @@ def webhook_handler():
     Endpoint pour recevoir les événements du webhook
     """
     logger.info("Requête POST reçue du webhook")
-    data = request.json
-    logger.info(f"Corps de la requête: {json.dumps(data)}")
-    
-    if data.get('object') == 'page':
-        logger.info("Événement de page reçu")
-        for entry in data.get('entry', []):
-            logger.info(f"Entrée reçue: {json.dumps(entry)}")
-            messaging = entry.get('messaging', [])
-            if messaging:
-                webhook_event = messaging[0]
-                logger.info(f"Événement Webhook reçu: {json.dumps(webhook_event)}")
-                
-                sender_id = webhook_event.get('sender', {}).get('id')
-                logger.info(f"ID de l'expéditeur: {sender_id}")
-                
-                if webhook_event.get('message'):
-                    logger.info("Message reçu, appel de handle_message")
-                    try:
-                        handle_message(sender_id, webhook_event.get('message'))
-                        logger.info("handle_message terminé avec succès")
-                    except Exception as e:
-                        logger.error(f"Erreur lors du traitement du message: {str(e)}")
-                elif webhook_event.get('postback'):
-                    logger.info(f"Postback reçu: {json.dumps(webhook_event.get('postback'))}")
-                    try:
-                        handle_message(sender_id, {'postback': webhook_event.get('postback')})
-                        logger.info("handle_message pour postback terminé avec succès")
-                    except Exception as e:
-                        logger.error(f"Erreur lors du traitement du postback: {str(e)}")
-                else:
-                    logger.info(f"Événement non reconnu: {webhook_event}")
-            else:
-                logger.info("Aucun événement de messagerie dans cette entrée")
-        
-        return Response("EVENT_RECEIVED", status=200)
-    else:
+    # Budget de temps commun à tous les traitements de la requête
+    deadline = Deadline(REQUEST_BUDGET_SECONDS)
+    data = request.get_json(silent=True)
+    logger.debug("Corps de la requête: %s", lazy_json(data))
+
+    events = extract_events(data)
+    if events is None:
         logger.info("Requête non reconnue reçue")
         return Response(status=404)
 
+    logger.info("Événement de page reçu")
+    if WEBHOOK_MODE == 'ingest':
+        # Accuser réception immédiatement, le traitement se fait dans le pool de workers.
+        # Les renvois sont écartés ici, avant d'occuper la file: un événement repris par
+        # une autre instance est alors traité sans être pris pour un doublon
+        pool = get_worker_pool(process_webhook_event)
+        for webhook_event in events:
+            if not claim_webhook_event(webhook_event):
+                continue
+            if not pool.submit(webhook_event):
+                # File pleine: traiter l'événement dans la requête plutôt que de le perdre,
+                # après les événements du même expéditeur déjà en file
+                pool.process_overflow(webhook_event, deadline=deadline)
+    else:
+        # Expéditeurs différents en parallèle, messages d'un même expéditeur dans l'ordre
+        get_dispatcher(handle_webhook_event).dispatch_batch(events, timeout=deadline.remaining(), deadline=deadline)
+        # Écrire les conversations de la requête avant que la fonction ne soit suspendue
+        conversation_memory.flush()
+
+    return Response("EVENT_RECEIVED", status=200)
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_handler():
+    """
+    Endpoint exposant les métriques internes (profondeur de file, temps d'attente...),
+    réservé aux requêtes portant METRICS_TOKEN
+    """
+    if not METRICS_TOKEN:
+        return Response(status=404)
+    expected = f"Bearer {METRICS_TOKEN}"
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+        logger.warning("Accès refusé à /api/metrics")
+        return Response(status=401)
+    return jsonify(metrics.snapshot())
+
 @app.errorhandler(Exception)
 def handle_error(e):
     logger.error(f"Erreur non gérée: {str(e)}")
     return Response("Quelque chose s'est mal passé!", status=500)
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
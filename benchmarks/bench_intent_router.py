@@ -0,0 +1,66 @@
+"""
+Microbenchmark du routage d'un message texte: chaîne de comparaisons et expressions
+régulières testées une à une (ancien comportement) contre le routeur compilé.
+
+Usage: python benchmarks/bench_intent_router.py [messages]
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.messenger_api import intent_router
+
+MESSAGES = [
+    "/yt", "yt/", "Qui t'a créé ?", "D'où viens-tu ?",
+    "Quelle est la capitale de la France ?",
+    "Explique-moi la photosynthèse en quelques phrases s'il te plaît",
+    "Bonjour, comment vas-tu aujourd'hui ?",
+    "Peux-tu m'aider à rédiger une lettre de motivation pour un stage en informatique ?",
+]
+
+LEGACY_PATTERNS = [
+    r"qui (t'a|ta|t as) (créé|cree|construit|développé|developpe|conçu|concu|fabriqué|fabrique|inventé|invente)",
+    r"par qui as[- ]?tu (été|ete) (créé|cree|développé|developpe|construit|conçu|concu)",
+    r"qui est (ton|responsable de|derrière|derriere) (créateur|createur|développeur|developpeur|toi)",
+    r"d['oòo]u viens[- ]?tu"
+]
+
+
+def legacy_dispatch(text):
+    text = text.lower()
+    if text == '/yt':
+        return 'youtube_mode'
+    if text == 'yt/':
+        return 'mistral_mode'
+    if text.startswith('/cache'):
+        return 'cache'
+    for pattern in LEGACY_PATTERNS:
+        if re.search(pattern, text):
+            return 'creator'
+    return None
+
+
+def router_dispatch(text):
+    return intent_router.match(text.lower(), "123")
+
+
+def bench(name, dispatch, messages):
+    start = time.perf_counter()
+    for text in messages:
+        dispatch(text)
+    elapsed = time.perf_counter() - start
+    print(f"{name}: {elapsed / len(messages) * 1e6:.2f} µs par message")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    messages = [MESSAGES[i % len(MESSAGES)] for i in range(count)]
+    bench("chaîne if/elif + re.search", legacy_dispatch, messages)
+    bench("routeur compilé", router_dispatch, messages)
+
+
+if __name__ == '__main__':
+    main()
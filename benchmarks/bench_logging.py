@@ -0,0 +1,92 @@
+"""
+Microbenchmark du coût de journalisation par message traité.
+
+Compare l'ancienne journalisation (json.dumps des payloads dans des f-strings au niveau INFO)
+avec la journalisation paresseuse (lazy_json au niveau DEBUG), le niveau effectif étant INFO.
+
+Usage: python benchmarks/bench_logging.py [iterations]
+"""
+import io
+import json
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.logger import lazy_json, PayloadSamplingFilter
+
+BODY = {
+    "object": "page",
+    "entry": [{
+        "id": "1234567890",
+        "time": 1700000000000,
+        "messaging": [{
+            "sender": {"id": "24000000000000001"},
+            "recipient": {"id": "1234567890"},
+            "timestamp": 1700000000000,
+            "message": {"mid": "m_" + "x" * 80, "text": "Explique-moi la photosynthèse en quelques phrases."}
+        }]
+    }]
+}
+YOUTUBE_RESPONSE = {
+    "items": [
+        {"id": {"videoId": f"vid{i:08d}"}, "snippet": {
+            "title": f"Vidéo {i}", "description": "d" * 300,
+            "thumbnails": {q: {"url": f"https://i.ytimg.com/vi/vid{i:08d}/{q}.jpg"} for q in ("default", "medium", "high")}
+        }} for i in range(5)
+    ]
+}
+REPLY = {"recipient": {"id": "24000000000000001"}, "message": {"text": "r" * 1500}}
+
+
+def make_logger():
+    logger = logging.getLogger("bench")
+    logger.handlers = []
+    handler = logging.StreamHandler(io.StringIO())
+    handler.addFilter(PayloadSamplingFilter(1.0))
+    logger.addHandler(handler)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def before(logger):
+    entry = BODY["entry"][0]
+    event = entry["messaging"][0]
+    logger.info(f"Corps de la requête: {json.dumps(BODY)}")
+    logger.info(f"Entrée reçue: {json.dumps(entry)}")
+    logger.info(f"Événement Webhook reçu: {json.dumps(event)}")
+    logger.info(f"Message reçu: {json.dumps(event['message'])}")
+    logger.info(f"Structure complète de la réponse YouTube: {json.dumps(YOUTUBE_RESPONSE, indent=2)}")
+    for item in YOUTUBE_RESPONSE["items"]:
+        logger.info(f"Traitement de l'élément: {json.dumps(item, indent=2)}")
+    logger.info(f"Début de call_send_api avec message_data: {json.dumps(REPLY)}")
+    logger.info(f"Réponse de l'API Facebook: {json.dumps({'recipient_id': '1', 'message_id': 'm'})}")
+
+
+def after(logger):
+    entry = BODY["entry"][0]
+    event = entry["messaging"][0]
+    logger.debug("Corps de la requête: %s", lazy_json(BODY))
+    logger.debug("Entrée reçue: %s", lazy_json(entry))
+    logger.debug("Événement Webhook reçu: %s", lazy_json(event))
+    logger.debug("Message reçu: %s", lazy_json(event['message']))
+    logger.debug("Structure complète de la réponse YouTube: %s", lazy_json(YOUTUBE_RESPONSE))
+    for item in YOUTUBE_RESPONSE["items"]:
+        logger.debug("Traitement de l'élément: %s", lazy_json(item))
+    logger.debug("Début de send_message_now avec message_data: %s", lazy_json(REPLY))
+    logger.debug("Réponse de l'API Facebook: %s", lazy_json({'recipient_id': '1', 'message_id': 'm'}))
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    logger = make_logger()
+    for name, fn in (("avant (f-string + json.dumps, INFO)", before), ("après (lazy_json, DEBUG)", after)):
+        elapsed = timeit.timeit(lambda: fn(logger), number=iterations)
+        print(f"{name:40s}: {elapsed / iterations * 1e6:8.1f} µs/message")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Microbenchmark du cache de quasi-doublons (MinHash + LSH).
+
+Remplit le cache avec des prompts synthétiques puis mesure la latence d'une recherche
+(signature comprise) pour des prompts connus reformulés et des prompts inconnus.
+
+Usage: python benchmarks/bench_similarity_cache.py [entrées] [recherches]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.minhash import SimilarityCache
+from src.utils.text_processing import similarity_shingles
+
+SYLLABLES = "ba be bi bo bu ca ce ci co cu da de di do du fa fe fi fo fu la le li lo lu ma me mi mo mu na ne ni no nu pa pe pi po pu ra re ri ro ru sa se si so su ta te ti to tu va ve vi vo vu".split()
+
+
+def make_vocabulary(rng, size=20000):
+    return list({"".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 5))) for _ in range(size)})
+
+
+def make_prompt(rng, words):
+    return "explique " + " ".join(rng.sample(words, rng.randint(3, 6)))
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    rng = random.Random(42)
+    words = make_vocabulary(rng)
+    cache = SimilarityCache(maxsize=entries)
+
+    prompts = [make_prompt(rng, words) for _ in range(entries)]
+    start = time.perf_counter()
+    for i, prompt in enumerate(prompts):
+        cache.set(similarity_shingles(prompt), i)
+    print(f"remplissage: {entries} entrées en {time.perf_counter() - start:.1f}s")
+
+    for name, queries in (
+        ("connus reformulés", [" ".join(reversed(rng.choice(prompts).split())) + " ?" for _ in range(lookups)]),
+        ("inconnus", [make_prompt(rng, words) for _ in range(lookups)]),
+    ):
+        timings, hits = [], 0
+        for query in queries:
+            start = time.perf_counter()
+            match = cache.get(similarity_shingles(query))
+            timings.append(time.perf_counter() - start)
+            hits += match is not None
+        print(f"{name:20s}: p50 {percentile(timings, 50) * 1e6:7.1f} µs, "
+              f"p99 {percentile(timings, 99) * 1e6:7.1f} µs, succès {hits / lookups:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark du traitement d'un lot d'événements du webhook:
+boucle séquentielle (ancien comportement) contre répartition par expéditeur.
+
+Le traitement d'un message est simulé par une attente (appel Mistral, envoi Graph...).
+
+Usage: python benchmarks/bench_webhook_dispatch.py [nb_expediteurs] [messages_par_expediteur] [latence_ms]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.dispatcher import LaneDispatcher
+
+
+def simulated_handler(latency):
+    def handler(webhook_event):
+        time.sleep(latency)
+    return handler
+
+
+def build_batch(senders, per_sender):
+    return [
+        {"sender": {"id": f"user-{s}"}, "message": {"mid": f"m-{s}-{i}", "text": f"message {i}"}}
+        for i in range(per_sender)
+        for s in range(senders)
+    ]
+
+
+def run_sequential(events, handler):
+    start = time.perf_counter()
+    for webhook_event in events:
+        handler(webhook_event)
+    return time.perf_counter() - start
+
+
+def run_dispatcher(events, handler, workers):
+    dispatcher = LaneDispatcher(handler, max_workers=workers)
+    start = time.perf_counter()
+    dispatcher.dispatch_batch(events)
+    elapsed = time.perf_counter() - start
+    dispatcher.shutdown()
+    return elapsed
+
+
+def main():
+    senders = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    per_sender = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    latency = (int(sys.argv[3]) if len(sys.argv) > 3 else 50) / 1000.0
+
+    events = build_batch(senders, per_sender)
+    handler = simulated_handler(latency)
+
+    sequential = run_sequential(events, handler)
+    print(f"{len(events)} événements, {senders} expéditeurs, latence simulée {latency * 1000:.0f} ms")
+    print(f"  boucle séquentielle : {sequential:.3f} s ({len(events) / sequential:.1f} évt/s)")
+    for workers in (2, 4, 8):
+        elapsed = run_dispatcher(events, handler, workers)
+        print(f"  répartiteur {workers} threads : {elapsed:.3f} s ({len(events) / elapsed:.1f} évt/s, x{sequential / elapsed:.1f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from src.config import MONGODB_URI
+from src.utils.cache import TTLCache
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TwoTierCache:
+    """
+    Cache à deux niveaux: LRU en mémoire devant une collection MongoDB partagée entre
+    les instances, purgée par un index TTL. Les entrées expirées peuvent rester lisibles
+    pendant stale_ttl secondes (lecture avec allow_stale=True).
+    """
+
+    def __init__(self, name, collection_name, ttl, maxsize=1024, stale_ttl=0):
+        self.name = name
+        self.collection_name = collection_name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl + stale_ttl)
+        self._collection = None
+        self._collection_lock = threading.Lock()
+        metrics.register_gauge(f'cache.{name}.hit_rate', self.hit_rate)
+
+    def _get_collection(self):
+        if not MONGODB_URI:
+            return None
+        with self._collection_lock:
+            if self._collection is None:
+                from src.database import Database
+                # Les documents sont supprimés à la date purgeAt
+                self._collection = Database.get_instance().ensure_ttl_index(
+                    self.collection_name, 'purgeAt', 0
+                )
+            return self._collection
+
+    def get(self, key, allow_stale=False):
+        """
+        Retourne la valeur en cache, ou None si absente (ou expirée sans allow_stale)
+        """
+        entry = self._memory.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if allow_stale or expires_at > time.time():
+                metrics.incr(f'cache.{self.name}.hits_memory')
+                return value
+
+        try:
+            collection = self._get_collection()
+            doc = collection.find_one({'_id': key}) if collection is not None else None
+        except Exception as e:
+            logger.warning(f"Impossible de lire le cache {self.name}: {str(e)}")
+            doc = None
+
+        if doc:
+            # Les dates MongoDB sont en UTC sans fuseau
+            expires_at = _utc_timestamp(doc.get('expiresAt'))
+            if allow_stale or expires_at > time.time():
+                self._memory.set(key, (doc['value'], expires_at))
+                metrics.incr(f'cache.{self.name}.hits_shared')
+                return doc['value']
+
+        metrics.incr(f'cache.{self.name}.misses')
+        return None
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl
+        self._memory.set(key, (value, expires_at), ttl=ttl + self.stale_ttl)
+
+        try:
+            collection = self._get_collection()
+            if collection is not None:
+                now = datetime.utcnow()
+                collection.update_one(
+                    {'_id': key},
+                    {'$set': {
+                        'value': value,
+                        'createdAt': now,
+                        'expiresAt': now + timedelta(seconds=ttl),
+                        'purgeAt': now + timedelta(seconds=ttl + self.stale_ttl)
+                    }},
+                    upsert=True
+                )
+        except Exception as e:
+            logger.warning(f"Impossible d'écrire dans le cache {self.name}: {str(e)}")
+
+    def delete(self, key):
+        self._memory.delete(key)
+        try:
+            collection = self._get_collection()
+            if collection is not None:
+                collection.delete_one({'_id': key})
+        except Exception as e:
+            logger.warning(f"Impossible de supprimer une entrée du cache {self.name}: {str(e)}")
+
+    def flush(self):
+        """
+        Vide les deux niveaux du cache
+        """
+        self._memory.clear()
+        try:
+            collection = self._get_collection()
+            if collection is not None:
+                collection.delete_many({})
+        except Exception as e:
+            logger.warning(f"Impossible de vider le cache {self.name}: {str(e)}")
+
+    def hit_rate(self):
+        hits = (metrics.get_counter(f'cache.{self.name}.hits_memory')
+                + metrics.get_counter(f'cache.{self.name}.hits_shared'))
+        total = hits + metrics.get_counter(f'cache.{self.name}.misses')
+        return hits / total if total else None
+
+
+def _utc_timestamp(value):
+    if not isinstance(value, datetime):
+        return 0
+    return (value - datetime(1970, 1, 1)).total_seconds()
@@ -15,6 +15,13 @@ cloudinary.config(
     api_secret=CLOUDINARY_API_SECRET
 )
 
+# Transformation appliquée aux vidéos envoyées dans Messenger
+VIDEO_TRANSFORMATION = [
+    {"width": 320, "crop": "scale"},
+    {"quality": "auto:low"},
+    {"duration": 60}  # Limiter à 60 secondes
+]
+
 def upload_video(file_path, public_id):
     """
     Télécharge une vidéo vers Cloudinary
@@ -34,11 +41,7 @@ def upload_video(file_path, public_id):
             public_id=public_id,
             overwrite=True,
             format="mp4",
-            transformation=[
-                {"width": 320, "crop": "scale"},
-                {"quality": "auto:low"},
-                {"duration": 60}  # Limiter à 60 secondes
-            ]
+            transformation=VIDEO_TRANSFORMATION
         )
         logger.info(f"Vidéo téléchargée avec succès: {result['url']}")
         return result
@@ -50,3 +53,38 @@ def upload_video(file_path, public_id):
         if isinstance(file_path, str) and os.path.exists(file_path):
             os.remove(file_path)
             logger.info(f"Fichier temporaire supprimé: {file_path}")
+
+def upload_remote_video(source_url, public_id, timeout=None):
+    """
+    Demande à Cloudinary de récupérer lui-même une vidéo depuis son URL (upload distant):
+    aucun octet de la vidéo ne transite par notre fonction
+    
+    Args:
+        source_url: URL directe de la vidéo
+        public_id: ID public pour la vidéo
+        timeout: Durée maximale de l'appel à Cloudinary en secondes
+        
+    Returns:
+        dict: Informations sur la vidéo téléchargée ou None en cas d'erreur
+    """
+    if not CLOUDINARY_CLOUD_NAME:
+        logger.warning("Cloudinary n'est pas configuré, upload distant impossible")
+        return None
+    
+    try:
+        logger.info(f"Upload distant de la vidéo {public_id} vers Cloudinary...")
+        options = {'timeout': timeout} if timeout else {}
+        result = cloudinary.uploader.upload(
+            source_url,
+            resource_type="video",
+            public_id=public_id,
+            overwrite=True,
+            format="mp4",
+            transformation=VIDEO_TRANSFORMATION,
+            **options
+        )
+        logger.info(f"Vidéo récupérée par Cloudinary: {result.get('secure_url')}")
+        return result
+    except Exception as e:
+        logger.error(f"Erreur lors de l'upload distant vers Cloudinary: {str(e)}")
+        return None
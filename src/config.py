@@ -8,21 +8,149 @@ load_dotenv()
 # Variables d'environnement Messenger
 MESSENGER_VERIFY_TOKEN = os.getenv('MESSENGER_VERIFY_TOKEN')
 MESSENGER_PAGE_ACCESS_TOKEN = os.getenv('MESSENGER_PAGE_ACCESS_TOKEN')
+# ID de la page (les pièces jointes réutilisables sont propres à une page)
+MESSENGER_PAGE_ID = os.getenv('MESSENGER_PAGE_ID')
 
 # Variables d'environnement Mistral
 MISTRAL_API_KEY = os.getenv('MISTRAL_API_KEY')
 
+# Routage des requêtes Mistral vers le plus petit modèle adapté
+MISTRAL_ROUTING_ENABLED = os.getenv('MISTRAL_ROUTING_ENABLED', 'true').lower() == 'true'
+MISTRAL_MODEL_SMALL = os.getenv('MISTRAL_MODEL_SMALL', 'mistral-small-latest')
+MISTRAL_MODEL_MEDIUM = os.getenv('MISTRAL_MODEL_MEDIUM', 'mistral-medium-latest')
+MISTRAL_MODEL_LARGE = os.getenv('MISTRAL_MODEL_LARGE', 'mistral-large-latest')
+# Au-delà de ce p95 (secondes), un modèle est remplacé par le niveau inférieur
+MISTRAL_ROUTE_MAX_P95 = float(os.getenv('MISTRAL_ROUTE_MAX_P95', '15'))
+
+# Protection des appels à Mistral: disjoncteur, plafond d'appels simultanés et requête de couverture
+MISTRAL_BREAKER_THRESHOLD = int(os.getenv('MISTRAL_BREAKER_THRESHOLD', '5'))
+MISTRAL_BREAKER_RESET_SECONDS = float(os.getenv('MISTRAL_BREAKER_RESET_SECONDS', '30'))
+MISTRAL_MAX_CONCURRENCY = int(os.getenv('MISTRAL_MAX_CONCURRENCY', '8'))
+# Attente maximale d'une place libre avant de renoncer
+MISTRAL_CONCURRENCY_WAIT = float(os.getenv('MISTRAL_CONCURRENCY_WAIT', '2'))
+# Deuxième requête identique lancée quand la première dépasse le p95 observé
+MISTRAL_HEDGING = os.getenv('MISTRAL_HEDGING', 'false').lower() == 'true'
+
+# Génération en flux: les paragraphes sont envoyés au fil de la génération
+MISTRAL_STREAMING = os.getenv('MISTRAL_STREAMING', 'false').lower() == 'true'
+
+# Cache des réponses Mistral (mémoire + MongoDB)
+MISTRAL_CACHE_ENABLED = os.getenv('MISTRAL_CACHE_ENABLED', 'true').lower() == 'true'
+MISTRAL_CACHE_TTL = int(os.getenv('MISTRAL_CACHE_TTL', '86400'))
+MISTRAL_CACHE_SIZE = int(os.getenv('MISTRAL_CACHE_SIZE', '1000'))
+# Cache de quasi-doublons (MinHash): similarité minimale pour réutiliser une réponse, 0 pour le désactiver
+MISTRAL_SIMILARITY_THRESHOLD = float(os.getenv('MISTRAL_SIMILARITY_THRESHOLD', '0.8'))
+MISTRAL_SIMILARITY_CACHE_SIZE = int(os.getenv('MISTRAL_SIMILARITY_CACHE_SIZE', '10000'))
+
+# Mémoire des conversations: derniers échanges par expéditeur, ajoutés au prompt dans la limite d'un budget de tokens
+CONVERSATION_MAX_TURNS = int(os.getenv('CONVERSATION_MAX_TURNS', '6'))
+CONVERSATION_TOKEN_BUDGET = int(os.getenv('CONVERSATION_TOKEN_BUDGET', '800'))
+CONVERSATION_TTL_SECONDS = int(os.getenv('CONVERSATION_TTL_SECONDS', '604800'))
+CONVERSATION_CACHE_SIZE = int(os.getenv('CONVERSATION_CACHE_SIZE', '1000'))
+# Écritures MongoDB regroupées: au plus tard après ce nombre d'expéditeurs ou ce délai (secondes)
+CONVERSATION_WRITE_BATCH = int(os.getenv('CONVERSATION_WRITE_BATCH', '20'))
+CONVERSATION_FLUSH_SECONDS = float(os.getenv('CONVERSATION_FLUSH_SECONDS', '2'))
+
+# Base de questions fréquentes, répondues sans appeler Mistral
+FAQ_PATH = os.getenv('FAQ_PATH', os.path.join(os.path.dirname(__file__), 'data', 'faq.json'))
+# Confiance minimale d'une réponse de la FAQ (0 à 1), et part minimale du poids des termes
+# de la question couverte par la formulation retenue: un sujet inconnu de la base
+# ("Qui a créé Python ?") part à Mistral même si le reste de la question correspond
+FAQ_MIN_CONFIDENCE = float(os.getenv('FAQ_MIN_CONFIDENCE', '0.7'))
+FAQ_MIN_COVERAGE = float(os.getenv('FAQ_MIN_COVERAGE', '0.75'))
+
+# IDs Messenger des administrateurs autorisés à utiliser les commandes (ex: /cache flush)
+ADMIN_SENDER_IDS = {sender.strip() for sender in os.getenv('ADMIN_SENDER_IDS', '').split(',') if sender.strip()}
+
 # Variables d'environnement YouTube
 YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY')
+# Quota journalier de l'API YouTube Data (unités) et seuil sous lequel le cache périmé est préféré
+YOUTUBE_DAILY_QUOTA = int(os.getenv('YOUTUBE_DAILY_QUOTA', '10000'))
+YOUTUBE_QUOTA_RESERVE = int(os.getenv('YOUTUBE_QUOTA_RESERVE', '1000'))
+# Cache des recherches: durée de fraîcheur, puis durée pendant laquelle les résultats périmés restent disponibles
+YOUTUBE_SEARCH_CACHE_TTL = int(os.getenv('YOUTUBE_SEARCH_CACHE_TTL', '21600'))
+YOUTUBE_SEARCH_STALE_SECONDS = int(os.getenv('YOUTUBE_SEARCH_STALE_SECONDS', '604800'))
+YOUTUBE_SEARCH_CACHE_SIZE = int(os.getenv('YOUTUBE_SEARCH_CACHE_SIZE', '500'))
+# Cache des détails de vidéos, par ID, et fenêtre de regroupement des recherches simultanées (secondes)
+YOUTUBE_DETAILS_CACHE_TTL = int(os.getenv('YOUTUBE_DETAILS_CACHE_TTL', '604800'))
+YOUTUBE_DETAILS_CACHE_SIZE = int(os.getenv('YOUTUBE_DETAILS_CACHE_SIZE', '5000'))
+YOUTUBE_DETAILS_BATCH_WINDOW = float(os.getenv('YOUTUBE_DETAILS_BATCH_WINDOW', '0.02'))
+# Pagination du mode YouTube: durée de vie de la dernière recherche d'un expéditeur, et
+# nombre de résultats demandés par appel search.list (100 unités quel que soit ce nombre, 50 au plus)
+# puis découpés en pages localement
+YOUTUBE_SESSION_TTL = int(os.getenv('YOUTUBE_SESSION_TTL', '1800'))
+YOUTUBE_SEARCH_FETCH_SIZE = min(50, int(os.getenv('YOUTUBE_SEARCH_FETCH_SIZE', '15')))
 
 # Variables d'environnement Cloudinary
 CLOUDINARY_CLOUD_NAME = os.getenv('CLOUDINARY_CLOUD_NAME')
 CLOUDINARY_API_KEY = os.getenv('CLOUDINARY_API_KEY')
 CLOUDINARY_API_SECRET = os.getenv('CLOUDINARY_API_SECRET')
 
+# Mode de livraison des vidéos
+# 'upload' : la vidéo transite par la fonction et est téléversée dans Messenger
+# 'cloudinary' : Cloudinary récupère la vidéo lui-même et Messenger la reçoit par URL
+VIDEO_DELIVERY_MODE = os.getenv('VIDEO_DELIVERY_MODE', 'upload')
+
+# Préchargement des sources vidéo (extraction yt-dlp) des vidéos montrées dans un carrousel:
+# nombre d'extractions simultanées et en attente, et taille du cache.
+# Une source expire avec son URL signée, moins une marge pour le téléchargement;
+# VIDEO_SOURCE_DEFAULT_TTL s'applique quand l'URL n'indique pas son expiration.
+VIDEO_PREFETCH_ENABLED = os.getenv('VIDEO_PREFETCH_ENABLED', 'true').lower() == 'true'
+VIDEO_PREFETCH_WORKERS = int(os.getenv('VIDEO_PREFETCH_WORKERS', '2'))
+VIDEO_PREFETCH_MAX_PENDING = int(os.getenv('VIDEO_PREFETCH_MAX_PENDING', '10'))
+VIDEO_SOURCE_CACHE_SIZE = int(os.getenv('VIDEO_SOURCE_CACHE_SIZE', '200'))
+VIDEO_SOURCE_DEFAULT_TTL = int(os.getenv('VIDEO_SOURCE_DEFAULT_TTL', '600'))
+VIDEO_SOURCE_EXPIRY_MARGIN = int(os.getenv('VIDEO_SOURCE_EXPIRY_MARGIN', '300'))
+
 # Variables d'environnement MongoDB
 MONGODB_URI = os.getenv('MONGODB_URI')
 
+# Traitement des événements du webhook
+# 'inline' : traitement pendant la requête, 'ingest' : accusé de réception immédiat puis traitement en arrière-plan
+WEBHOOK_MODE = os.getenv('WEBHOOK_MODE', 'inline')
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '4'))
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))
+WEBHOOK_QUEUE_BACKEND = os.getenv('WEBHOOK_QUEUE_BACKEND', 'memory')
+# File MongoDB: un événement pris par une instance arrêtée ou suspendue est repris après ce délai
+# (secondes), au plus WEBHOOK_MAX_ATTEMPTS fois
+WEBHOOK_VISIBILITY_TIMEOUT = int(os.getenv('WEBHOOK_VISIBILITY_TIMEOUT', '300'))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', '3'))
+# Durée de conservation (secondes) des événements abandonnés après WEBHOOK_MAX_ATTEMPTS prises
+WEBHOOK_DEAD_LETTER_TTL = int(os.getenv('WEBHOOK_DEAD_LETTER_TTL', '604800'))
+# Nombre de threads traitant en parallèle les événements d'expéditeurs différents en mode 'inline'
+WEBHOOK_DISPATCH_WORKERS = int(os.getenv('WEBHOOK_DISPATCH_WORKERS', '8'))
+# Jeton exigé par /api/metrics (en-tête "Authorization: Bearer <jeton>"); sans jeton, l'endpoint est désactivé
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Déduplication des événements renvoyés par Facebook
+DEDUP_TTL_SECONDS = int(os.getenv('DEDUP_TTL_SECONDS', '86400'))
+DEDUP_CACHE_SIZE = int(os.getenv('DEDUP_CACHE_SIZE', '10000'))
+
+# Client HTTP partagé: taille des pools de connexions keep-alive
+# HTTP_POOL_SIZES permet de surcharger la taille par hôte, ex: "graph.facebook.com=20,api.mistral.ai=10"
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '10'))
+# Hôtes non dédiés (serveurs googlevideo des téléchargements...): une session commune
+# qui garde au plus HTTP_SHARED_HOSTS pools, les moins récemment utilisés étant fermés
+HTTP_SHARED_HOSTS = int(os.getenv('HTTP_SHARED_HOSTS', '10'))
+HTTP_POOL_SIZES = {
+    host.strip(): int(size)
+    for host, size in (item.split('=', 1) for item in os.getenv('HTTP_POOL_SIZES', '').split(',') if '=' in item)
+}
+
+# Ordonnanceur des envois Messenger: débit par token de page et nouvelles tentatives
+SEND_RATE_PER_SECOND = float(os.getenv('SEND_RATE_PER_SECOND', '10'))
+SEND_BURST = int(os.getenv('SEND_BURST', '20'))
+SEND_QUEUE_SIZE = int(os.getenv('SEND_QUEUE_SIZE', '500'))
+SEND_WORKERS = int(os.getenv('SEND_WORKERS', '4'))
+SEND_MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', '3'))
+SEND_BACKOFF_BASE = float(os.getenv('SEND_BACKOFF_BASE', '0.5'))
+SEND_BACKOFF_MAX = float(os.getenv('SEND_BACKOFF_MAX', '8'))
+
+# Budget de temps d'une requête webhook, sous la durée maximale de la fonction (maxDuration: 60s)
+REQUEST_BUDGET_SECONDS = float(os.getenv('REQUEST_BUDGET_SECONDS', '55'))
+# Temps gardé pour envoyer la réponse ou le message de repli après un appel long
+DEADLINE_SEND_RESERVE_SECONDS = float(os.getenv('DEADLINE_SEND_RESERVE_SECONDS', '5'))
+
 def verify_webhook(request):
     """
     Vérifie le webhook avec le token fourni par Facebook
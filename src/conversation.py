@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from pymongo import UpdateOne
+from src.config import (
+    MONGODB_URI, CONVERSATION_MAX_TURNS, CONVERSATION_TTL_SECONDS, CONVERSATION_CACHE_SIZE,
+    CONVERSATION_WRITE_BATCH, CONVERSATION_FLUSH_SECONDS
+)
+from src.utils.cache import TTLCache
+from src.utils.metrics import metrics
+from src.utils.text_processing import extract_keywords
+
+logger = logging.getLogger(__name__)
+
+# Un tour trop long est tronqué avant d'être mémorisé
+TURN_MAX_CHARS = 1000
+# Résumé des tours oubliés: mots-clés des anciennes questions
+SUMMARY_MAX_CHARS = 300
+
+
+class Conversation:
+    """
+    Historique d'un expéditeur: derniers échanges (question, réponse) et résumé des plus anciens
+    """
+    __slots__ = ('turns', 'summary')
+
+    def __init__(self, turns=None, summary=''):
+        self.turns = list(turns or [])
+        self.summary = summary
+
+    def __bool__(self):
+        return bool(self.turns or self.summary)
+
+
+def summarize_turns(summary, dropped_turns):
+    """
+    Ajoute au résumé les mots-clés des questions oubliées, en gardant les plus récents
+    """
+    keywords = summary.split() if summary else []
+    for question, _ in dropped_turns:
+        for word in extract_keywords(question):
+            if word in keywords:
+                keywords.remove(word)
+            keywords.append(word)
+    text = ' '.join(keywords)
+    if len(text) > SUMMARY_MAX_CHARS:
+        text = text[-SUMMARY_MAX_CHARS:].split(' ', 1)[-1]
+    return text
+
+
+class ConversationMemory:
+    """
+    Mémoire des conversations par expéditeur: cache en mémoire mis à jour à chaque échange,
+    devant une collection MongoDB (un document par expéditeur, purgé par un index TTL).
+
+    Les écritures MongoDB sont regroupées: les échanges en attente sont écrits en une seule
+    opération bulk_write quand write_batch expéditeurs sont en attente, après flush_interval
+    secondes, ou à l'appel de flush() en fin de requête webhook.
+    """
+
+    def __init__(self, max_turns=CONVERSATION_MAX_TURNS, ttl=CONVERSATION_TTL_SECONDS,
+                 maxsize=CONVERSATION_CACHE_SIZE, write_batch=CONVERSATION_WRITE_BATCH,
+                 flush_interval=CONVERSATION_FLUSH_SECONDS, collection_name='conversations'):
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self.write_batch = write_batch
+        self.flush_interval = flush_interval
+        self.collection_name = collection_name
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # sender_id -> échanges pas encore écrits dans MongoDB
+        self._pending = {}
+        self._timer = None
+        self._lock = threading.Lock()
+        self._collection = None
+        self._collection_lock = threading.Lock()
+
+    def _get_collection(self):
+        if not MONGODB_URI:
+            return None
+        with self._collection_lock:
+            if self._collection is None:
+                from src.database import Database
+                self._collection = Database.get_instance().ensure_ttl_index(
+                    self.collection_name, 'updatedAt', self.ttl
+                )
+            return self._collection
+
+    def get(self, sender_id):
+        """
+        Retourne l'historique de l'expéditeur (vide s'il n'en a pas)
+        """
+        conversation = self._cache.get(sender_id)
+        if conversation is not None:
+            metrics.incr('conversation.hits')
+            return conversation
+
+        metrics.incr('conversation.misses')
+        conversation = Conversation()
+        try:
+            collection = self._get_collection()
+            doc = collection.find_one({'_id': sender_id}) if collection is not None else None
+        except Exception as e:
+            logger.warning(f"Impossible de lire la conversation de {sender_id}: {str(e)}")
+            doc = None
+        if doc:
+            conversation = Conversation(
+                [(turn.get('q', ''), turn.get('a', '')) for turn in doc.get('turns', [])],
+                doc.get('summary', '')
+            )
+        self._cache.set(sender_id, conversation)
+        return conversation
+
+    def append(self, sender_id, question, answer):
+        """
+        Mémorise un échange; l'écriture dans MongoDB est différée et regroupée
+        """
+        turn = (question[:TURN_MAX_CHARS], answer[:TURN_MAX_CHARS])
+        current = self.get(sender_id)
+        turns = current.turns + [turn]
+        summary = current.summary
+        if len(turns) > self.max_turns:
+            dropped, turns = turns[:-self.max_turns], turns[-self.max_turns:]
+            summary = summarize_turns(summary, dropped)
+        # Nouvel objet: un lecteur concurrent garde une vue cohérente
+        self._cache.set(sender_id, Conversation(turns, summary))
+
+        with self._lock:
+            pending = self._pending.setdefault(sender_id, {'turns': [], 'summary': summary})
+            pending['turns'].append(turn)
+            pending['summary'] = summary
+            full = len(self._pending) >= self.write_batch
+            if not full and self._timer is None and self.flush_interval:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """
+        Écrit les échanges en attente dans MongoDB en une seule opération
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return
+
+        try:
+            collection = self._get_collection()
+            if collection is None:
+                return
+            now = datetime.utcnow()
+            operations = [
+                UpdateOne(
+                    {'_id': sender_id},
+                    {
+                        '$push': {'turns': {
+                            '$each': [{'q': question, 'a': answer} for question, answer in entry['turns']],
+                            '$slice': -self.max_turns
+                        }},
+                        '$set': {'summary': entry['summary'], 'updatedAt': now}
+                    },
+                    upsert=True
+                )
+                for sender_id, entry in pending.items()
+            ]
+            started = time.monotonic()
+            collection.bulk_write(operations, ordered=False)
+            metrics.observe('conversation.flush_seconds', time.monotonic() - started)
+            metrics.incr('conversation.writes', len(operations))
+        except Exception as e:
+            # L'historique reste disponible dans le cache local
+            logger.warning(f"Impossible d'enregistrer {len(pending)} conversation(s): {str(e)}")
+
+    def clear(self, sender_id):
+        self._cache.delete(sender_id)
+        with self._lock:
+            self._pending.pop(sender_id, None)
+        try:
+            collection = self._get_collection()
+            if collection is not None:
+                collection.delete_one({'_id': sender_id})
+        except Exception as e:
+            logger.warning(f"Impossible d'effacer la conversation de {sender_id}: {str(e)}")
+
+
+conversation_memory = ConversationMemory()
@@ -35,6 +35,18 @@ class Database:
             self.connect()
         return self._db[collection_name]
     
+    def ensure_ttl_index(self, collection_name, field='createdAt', expire_after_seconds=86400):
+        """
+        Crée (si nécessaire) un index TTL: MongoDB supprime les documents
+        expire_after_seconds après la date contenue dans le champ
+        """
+        collection = self.get_collection(collection_name)
+        try:
+            collection.create_index(field, expireAfterSeconds=expire_after_seconds)
+        except Exception as e:
+            logger.warning(f"Impossible de créer l'index TTL sur {collection_name}.{field}: {str(e)}")
+        return collection
+    
     def close(self):
         if self._client:
             self._client.close()
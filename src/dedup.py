@@ -0,0 +1,84 @@
+import logging
+import threading
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+from src.config import MONGODB_URI, DEDUP_TTL_SECONDS, DEDUP_CACHE_SIZE
+from src.utils.cache import TTLCache
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def event_key(webhook_event):
+    """
+    Clé d'idempotence d'un événement: le 'mid' du message,
+    ou expéditeur + horodatage pour un postback
+    """
+    message = webhook_event.get('message')
+    if message and message.get('mid'):
+        return f"mid:{message['mid']}"
+
+    if webhook_event.get('postback'):
+        sender_id = (webhook_event.get('sender') or {}).get('id')
+        timestamp = webhook_event.get('timestamp')
+        if sender_id and timestamp:
+            return f"postback:{sender_id}:{timestamp}"
+
+    return None
+
+
+class EventDeduplicator:
+    """
+    Détecte les événements déjà reçus (renvois de Facebook) avec un cache LRU local
+    et une collection MongoDB partagée entre les instances, purgée par un index TTL
+    """
+
+    def __init__(self, ttl=DEDUP_TTL_SECONDS, maxsize=DEDUP_CACHE_SIZE, collection_name='processed_events'):
+        self.ttl = ttl
+        self.collection_name = collection_name
+        self._seen = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._collection = None
+        self._collection_lock = threading.Lock()
+
+    def _get_collection(self):
+        if not MONGODB_URI:
+            return None
+        with self._collection_lock:
+            if self._collection is None:
+                from src.database import Database
+                self._collection = Database.get_instance().ensure_ttl_index(
+                    self.collection_name, 'createdAt', self.ttl
+                )
+            return self._collection
+
+    def claim(self, key):
+        """
+        Enregistre la clé d'un événement
+
+        Returns:
+            bool: True si l'événement est nouveau et doit être traité, False si c'est un doublon
+        """
+        if key is None:
+            return True
+
+        if not self._seen.add(key):
+            metrics.incr('dedup.duplicates_local')
+            return False
+
+        try:
+            collection = self._get_collection()
+            if collection is not None:
+                # L'_id unique rend l'insertion atomique entre les instances
+                collection.insert_one({'_id': key, 'createdAt': datetime.utcnow()})
+        except DuplicateKeyError:
+            metrics.incr('dedup.duplicates_shared')
+            return False
+        except Exception as e:
+            # Base indisponible: on traite l'événement plutôt que de le perdre
+            logger.warning(f"Impossible d'enregistrer l'événement {key} dans MongoDB: {str(e)}")
+
+        metrics.incr('dedup.events_claimed')
+        return True
+
+
+deduplicator = EventDeduplicator()
@@ -0,0 +1,120 @@
+import threading
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from src.config import WEBHOOK_DISPATCH_WORKERS
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def sender_key(webhook_event):
+    """
+    Clé de la file ordonnée d'un événement: l'ID de l'expéditeur
+    """
+    return (webhook_event.get('sender') or {}).get('id')
+
+
+class SenderLanes:
+    """
+    Files ordonnées par expéditeur: au plus un événement en cours par expéditeur,
+    les suivants attendent leur tour dans l'ordre d'arrivée
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def offer(self, key, item):
+        """
+        Propose un élément pour un expéditeur
+
+        Returns:
+            bool: True si l'appelant prend la main sur la file de cet expéditeur et doit traiter
+            l'élément, False si l'élément a été mis en attente derrière un traitement en cours
+        """
+        with self._lock:
+            if key in self._pending:
+                self._pending[key].append(item)
+                return False
+            self._pending[key] = deque()
+            return True
+
+    def next(self, key):
+        """
+        Retourne l'élément suivant de l'expéditeur, ou None (et libère la file) s'il n'y en a plus
+        """
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending:
+                return pending.popleft()
+            self._pending.pop(key, None)
+            return None
+
+    def active(self):
+        with self._lock:
+            return len(self._pending)
+
+
+class LaneDispatcher:
+    """
+    Exécute les événements en parallèle entre expéditeurs et dans l'ordre pour un même expéditeur
+    """
+
+    def __init__(self, handler, max_workers=WEBHOOK_DISPATCH_WORKERS):
+        self.handler = handler
+        self.lanes = SenderLanes()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sender-lane')
+
+    def submit(self, webhook_event, **handler_kwargs):
+        """
+        Planifie un événement et retourne un Future résolu à la fin de son traitement.
+        handler_kwargs sont transmis au handler (par exemple le budget de temps de la requête).
+        """
+        key = sender_key(webhook_event)
+        future = Future()
+        item = (webhook_event, future, handler_kwargs)
+        if self.lanes.offer(key, item):
+            self._executor.submit(self._drain, key, item)
+        return future
+
+    def dispatch_batch(self, events, timeout=None, **handler_kwargs):
+        """
+        Traite tous les événements d'un lot et attend la fin de leur traitement
+        """
+        futures = [self.submit(webhook_event, **handler_kwargs) for webhook_event in events]
+        done, not_done = wait(futures, timeout=timeout)
+        if not_done:
+            logger.warning(f"{len(not_done)} événements toujours en cours après {timeout}s")
+        return futures
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def _drain(self, key, item):
+        while item is not None:
+            webhook_event, future, handler_kwargs = item
+            try:
+                with metrics.timer('webhook.event_processing_seconds'):
+                    result = self.handler(webhook_event, **handler_kwargs)
+                future.set_result(result)
+            except Exception as e:
+                logger.error(f"Erreur lors du traitement de l'événement: {str(e)}")
+                future.set_exception(e)
+            item = self.lanes.next(key)
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher(handler):
+    """
+    Retourne le répartiteur partagé, créé au premier appel
+    """
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = LaneDispatcher(handler)
+            metrics.register_gauge('webhook.active_sender_lanes', _dispatcher.lanes.active)
+        return _dispatcher
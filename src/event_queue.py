@@ -0,0 +1,344 @@
+import queue
+import threading
+import time
+import logging
+from datetime import datetime, timedelta
+from src.config import (
+    WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, WEBHOOK_QUEUE_BACKEND, WEBHOOK_VISIBILITY_TIMEOUT, WEBHOOK_MAX_ATTEMPTS,
+    WEBHOOK_DEAD_LETTER_TTL
+)
+from src.dispatcher import SenderLanes, sender_key
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryQueueBackend:
+    """
+    File bornée en mémoire (par défaut)
+    """
+
+    def __init__(self, maxsize):
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, item):
+        # Lève queue.Full si la file est pleine
+        self._queue.put_nowait(item)
+
+    def get(self, timeout):
+        # Lève queue.Empty si aucun élément n'arrive avant le timeout
+        return self._queue.get(timeout=timeout)
+
+    def ack(self, item):
+        self._queue.task_done()
+
+    def qsize(self):
+        return self._queue.qsize()
+
+
+class MongoQueueBackend:
+    """
+    File durable stockée dans MongoDB: les événements survivent à un redémarrage de l'instance.
+
+    Un événement pris (status 'processing') mais pas acquitté au bout de visibility_timeout
+    secondes est repris par une autre instance: celle qui le traitait s'est arrêtée ou a été
+    suspendue (normal sur Vercel une fois la réponse envoyée). Après max_attempts prises,
+    l'événement est abandonné (status 'dead') pour ne pas bloquer les workers, puis supprimé
+    par un index TTL dead_letter_ttl secondes plus tard.
+    """
+
+    def __init__(self, maxsize, collection_name='webhook_events', poll_interval=0.2,
+                 visibility_timeout=WEBHOOK_VISIBILITY_TIMEOUT, max_attempts=WEBHOOK_MAX_ATTEMPTS,
+                 dead_letter_ttl=WEBHOOK_DEAD_LETTER_TTL):
+        from src.database import Database
+        self.maxsize = maxsize
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        database = Database.get_instance()
+        self.collection = database.get_collection(collection_name)
+        self.collection.create_index([('status', 1), ('enqueuedAt', 1)])
+        self.collection.create_index([('status', 1), ('claimedAt', 1)])
+        # Seuls les événements abandonnés ont un champ deadAt
+        database.ensure_ttl_index(collection_name, 'deadAt', dead_letter_ttl)
+        self._next_burial = 0.0
+
+    def put(self, item):
+        if self.maxsize and self.qsize() >= self.maxsize:
+            raise queue.Full()
+        self.collection.insert_one({
+            'event': item['event'],
+            'enqueuedAt': item['enqueued_at'],
+            'status': 'pending',
+            'createdAt': datetime.now()
+        })
+
+    def _claimable(self, now):
+        return {'$or': [
+            {'status': 'pending'},
+            {
+                'status': 'processing',
+                'claimedAt': {'$lt': now - timedelta(seconds=self.visibility_timeout)},
+                'attempts': {'$not': {'$gte': self.max_attempts}}
+            }
+        ]}
+
+    def _bury_exhausted(self, now):
+        # Au plus une fois par visibility_timeout: marquer 'dead' les événements pris
+        # max_attempts fois sans acquittement, que l'index TTL sur deadAt supprimera
+        if time.monotonic() < self._next_burial:
+            return
+        self._next_burial = time.monotonic() + self.visibility_timeout
+        result = self.collection.update_many(
+            {
+                'status': 'processing',
+                'claimedAt': {'$lt': now - timedelta(seconds=self.visibility_timeout)},
+                'attempts': {'$gte': self.max_attempts}
+            },
+            {'$set': {'status': 'dead', 'deadAt': now}}
+        )
+        if result.modified_count:
+            metrics.incr('webhook.events_dead', result.modified_count)
+            logger.warning(f"{result.modified_count} événement(s) abandonné(s) après {self.max_attempts} prises")
+
+    def get(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            now = datetime.now()
+            doc = self.collection.find_one_and_update(
+                self._claimable(now),
+                {'$set': {'status': 'processing', 'claimedAt': now}, '$inc': {'attempts': 1}},
+                sort=[('enqueuedAt', 1)]
+            )
+            if doc:
+                if doc['status'] == 'processing':
+                    metrics.incr('webhook.events_reclaimed')
+                    logger.warning(f"Événement {doc['_id']} repris après {self.visibility_timeout}s sans acquittement")
+                return {'_id': doc['_id'], 'event': doc['event'], 'enqueued_at': doc['enqueuedAt']}
+            self._bury_exhausted(now)
+            if time.monotonic() >= deadline:
+                raise queue.Empty()
+            time.sleep(self.poll_interval)
+
+    def ack(self, item):
+        self.collection.delete_one({'_id': item['_id']})
+
+    def qsize(self):
+        return self.collection.count_documents({'status': 'pending'})
+
+
+# Backends disponibles, extensibles via register_queue_backend
+QUEUE_BACKENDS = {
+    'memory': InMemoryQueueBackend,
+    'mongo': MongoQueueBackend,
+}
+
+
+def register_queue_backend(name, factory):
+    """
+    Enregistre un nouveau backend de file (factory appelée avec maxsize)
+    """
+    QUEUE_BACKENDS[name] = factory
+
+
+class EventQueue:
+    """
+    File bornée d'événements du webhook, en attente de traitement
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def put(self, webhook_event):
+        """
+        Ajoute un événement à la file
+
+        Returns:
+            bool: True si l'événement a été mis en file, False si la file est pleine ou indisponible
+        """
+        try:
+            self.backend.put({'event': webhook_event, 'enqueued_at': time.time()})
+            metrics.incr('webhook.events_enqueued')
+            return True
+        except queue.Full:
+            metrics.incr('webhook.queue_full')
+            logger.warning("File d'événements pleine")
+            return False
+        except Exception as e:
+            # File indisponible (base injoignable): l'événement, déjà enregistré comme reçu,
+            # est traité comme si la file était pleine plutôt que perdu
+            metrics.incr('webhook.queue_errors')
+            logger.error(f"Impossible de mettre l'événement en file: {str(e)}")
+            return False
+
+    def get(self, timeout=1.0):
+        return self.backend.get(timeout)
+
+    def ack(self, item):
+        self.backend.ack(item)
+
+    def depth(self):
+        return self.backend.qsize()
+
+
+class WorkerPool:
+    """
+    Pool de threads qui consomme la file d'événements et appelle le gestionnaire fourni.
+    Les événements d'un même expéditeur sont traités un par un, dans l'ordre de la file.
+    """
+
+    def __init__(self, event_queue, handler, num_workers=WEBHOOK_WORKERS):
+        self.event_queue = event_queue
+        self.handler = handler
+        self.num_workers = num_workers
+        self.lanes = SenderLanes()
+        self._threads = []
+        self._running = False
+        self._lock = threading.Lock()
+        # Lecture de la file (sans attente) et prise de la file de l'expéditeur en une seule
+        # étape, pour que deux workers ne puissent pas inverser deux messages du même expéditeur.
+        # Les workers inactifs attendent _work_ready, signalé par submit(), hors de ce verrou
+        self._claim_lock = threading.Lock()
+        self._work_ready = threading.Event()
+        # Par expéditeur: événements mis en file par cette instance et pas encore pris,
+        # et événements refusés par la file pleine qui doivent passer après eux
+        self._pending_lock = threading.Lock()
+        self._queued = {}
+        self._held = {}
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            for i in range(self.num_workers):
+                thread = threading.Thread(target=self._run, name=f"webhook-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            logger.info(f"Pool de {self.num_workers} workers démarré")
+
+    def stop(self, timeout=5.0):
+        with self._lock:
+            self._running = False
+            threads, self._threads = self._threads, []
+        self._work_ready.set()
+        for thread in threads:
+            thread.join(timeout)
+
+    def submit(self, webhook_event):
+        self.start()
+        key = sender_key(webhook_event)
+        with self._pending_lock:
+            self._queued[key] = self._queued.get(key, 0) + 1
+        if self.event_queue.put(webhook_event):
+            self._work_ready.set()
+            return True
+        with self._pending_lock:
+            self._unqueue(key)
+        return False
+
+    def process_overflow(self, webhook_event, **handler_kwargs):
+        """
+        Traite un événement refusé par la file pleine sans inverser l'ordre de son expéditeur:
+        dans le thread appelant s'il n'a aucun événement en attente ou en cours, sinon à la
+        suite de ceux-ci, par le worker qui tient sa file.
+        handler_kwargs (budget de temps de la requête) ne s'appliquent qu'au traitement immédiat.
+
+        Returns:
+            bool: True si l'événement a été traité, False s'il attend son tour
+        """
+        key = sender_key(webhook_event)
+        item = {'event': webhook_event, 'enqueued_at': time.time(), 'overflow': True}
+        with self._pending_lock:
+            if self._queued.get(key):
+                self._held.setdefault(key, []).append(item)
+                metrics.incr('webhook.overflow_held')
+                return False
+            if not self.lanes.offer(key, item):
+                metrics.incr('webhook.overflow_held')
+                return False
+
+        metrics.incr('webhook.overflow_inline')
+        self._process(dict(item, kwargs=handler_kwargs))
+        item = self.lanes.next(key)
+        while item is not None:
+            self._process(item)
+            item = self.lanes.next(key)
+        return True
+
+    def _unqueue(self, key):
+        # Doit être appelé avec _pending_lock
+        count = self._queued.get(key, 0) - 1
+        if count > 0:
+            self._queued[key] = count
+            return
+        self._queued.pop(key, None)
+        # Plus rien de cet expéditeur dans la file: ses événements retenus passent à la suite
+        for held in self._held.pop(key, []):
+            self.lanes.offer(key, held)
+
+    def _run(self):
+        while self._running:
+            try:
+                with self._claim_lock:
+                    item = self.event_queue.get(timeout=0)
+                    key = sender_key(item['event'])
+                    with self._pending_lock:
+                        owns_lane = self.lanes.offer(key, item)
+                        if key in self._queued:
+                            self._unqueue(key)
+            except queue.Empty:
+                # File vide: attendre un submit() (ou un événement d'une autre instance)
+                self._work_ready.wait(0.5)
+                self._work_ready.clear()
+                continue
+            except Exception as e:
+                logger.error(f"Erreur lors de la lecture de la file d'événements: {str(e)}")
+                time.sleep(1)
+                continue
+
+            # Un autre worker traite déjà cet expéditeur: il prendra l'événement à la suite
+            if not owns_lane:
+                continue
+
+            while item is not None:
+                self._process(item)
+                item = self.lanes.next(key)
+
+    def _process(self, item):
+        metrics.observe('webhook.queue_wait_seconds', time.time() - item['enqueued_at'])
+        try:
+            with metrics.timer('webhook.event_processing_seconds'):
+                self.handler(item['event'], **item.get('kwargs', {}))
+            metrics.incr('webhook.events_processed')
+        except Exception as e:
+            metrics.incr('webhook.events_failed')
+            logger.error(f"Erreur lors du traitement de l'événement: {str(e)}")
+        finally:
+            # Un événement refusé par la file pleine n'y a jamais été
+            if not item.get('overflow'):
+                try:
+                    self.event_queue.ack(item)
+                except Exception as e:
+                    logger.warning(f"Impossible d'acquitter l'événement: {str(e)}")
+
+
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+
+
+def get_worker_pool(handler):
+    """
+    Retourne le pool de workers partagé, créé au premier appel selon la configuration
+    """
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            factory = QUEUE_BACKENDS.get(WEBHOOK_QUEUE_BACKEND)
+            if factory is None:
+                logger.warning(f"Backend de file inconnu '{WEBHOOK_QUEUE_BACKEND}', utilisation de la mémoire")
+                factory = InMemoryQueueBackend
+            event_queue = EventQueue(factory(WEBHOOK_QUEUE_SIZE))
+            metrics.register_gauge('webhook.queue_depth', event_queue.depth)
+            _worker_pool = WorkerPool(event_queue, handler)
+        return _worker_pool
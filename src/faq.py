@@ -0,0 +1,161 @@
+import json
+import logging
+import math
+import re
+from collections import Counter
+from src.config import FAQ_PATH, FAQ_MIN_CONFIDENCE, FAQ_MIN_COVERAGE
+from src.utils.metrics import metrics
+from src.utils.text_processing import extract_keywords, strip_accents
+
+logger = logging.getLogger(__name__)
+
+
+# Élisions (l'historique, d'une) et traits d'union (sais-tu), séparés avant l'extraction
+# des mots-clés pour que "sais-tu" et "tu sais" donnent les mêmes termes
+_SEPARATORS = re.compile(r"\b(?:[cdjlmnst]|qu)['’]|[-'’]")
+
+
+def faq_terms(text):
+    """
+    Termes indexés: mots-clés sans accents, au singulier approximatif
+    """
+    return [
+        word[:-1] if len(word) > 4 and word.endswith('s') else word
+        for word in extract_keywords(_SEPARATORS.sub(' ', strip_accents(text.lower())))
+    ]
+
+
+class FaqIndex:
+    """
+    Base de questions fréquentes: index inversé des questions, classées par BM25.
+
+    Chaque entrée a plusieurs formulations indexées séparément et une réponse. La confiance
+    est la moyenne géométrique de deux couvertures, pondérées par l'IDF des termes: celle de
+    la question posée par la formulation la mieux classée, et celle de la formulation par la
+    question. Une question longue qui mentionne un mot de la base, ou une question de suivi
+    d'un seul mot ("pourquoi ?"), reste sous le seuil et part à Mistral.
+
+    Une formulation courte entièrement couverte ne suffit pas: la question doit aussi être
+    couverte à min_coverage au moins. Les termes inconnus de la base pèsent comme les plus
+    rares, si bien qu'un sujet étranger ("Qui a créé Python ?", "les commandes SQL") écarte
+    la correspondance.
+    """
+
+    def __init__(self, entries=(), min_confidence=FAQ_MIN_CONFIDENCE, min_coverage=FAQ_MIN_COVERAGE,
+                 k1=1.2, b=0.75):
+        self.min_confidence = min_confidence
+        self.min_coverage = min_coverage
+        self.k1 = k1
+        self.b = b
+        self._answers = []
+        # terme -> [(id de formulation, fréquence)]
+        self._postings = {}
+        # id de formulation -> (id d'entrée, longueur)
+        self._documents = []
+        # id de formulation -> poids IDF total de ses termes
+        self._weights = []
+        self._idf = {}
+        self._avg_length = 0.0
+        self._unknown_idf = 0.0
+        for entry in entries:
+            self.add(entry['questions'], entry['answer'])
+        metrics.register_gauge('faq.hit_rate', self.hit_rate)
+
+    def add(self, questions, answer):
+        entry_id = len(self._answers)
+        self._answers.append(answer)
+        for question in questions:
+            terms = faq_terms(question)
+            doc_id = len(self._documents)
+            self._documents.append((entry_id, len(terms)))
+            for term, count in Counter(terms).items():
+                self._postings.setdefault(term, []).append((doc_id, count))
+        self._finalize()
+
+    def _finalize(self):
+        total = len(self._documents)
+        self._avg_length = sum(length for _, length in self._documents) / total if total else 0.0
+        self._idf = {
+            term: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+        # Un terme absent de la base pèse comme le plus rare des termes connus
+        self._unknown_idf = math.log(1 + (total + 0.5) / 0.5) if total else 0.0
+        weights = [0.0] * total
+        for term, postings in self._postings.items():
+            for doc_id, _ in postings:
+                weights[doc_id] += self._idf[term]
+        self._weights = weights
+
+    def __len__(self):
+        return len(self._answers)
+
+    def search(self, question):
+        """
+        Retourne (réponse, confiance) de la meilleure entrée, ou None si aucun terme ne correspond.
+        La confiance est nulle quand la question est trop peu couverte par la formulation.
+        """
+        terms = set(faq_terms(question))
+        if not terms or not self._documents:
+            return None
+
+        scores = {}
+        # Poids IDF des termes de la question présents dans chaque formulation
+        coverage = {}
+        for term in terms:
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, count in self._postings[term]:
+                length = self._documents[doc_id][1]
+                norm = count * (self.k1 + 1) / (count + self.k1 * (1 - self.b + self.b * length / self._avg_length))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * norm
+                coverage[doc_id] = coverage.get(doc_id, 0.0) + idf
+        if not scores:
+            return None
+
+        best = max(scores, key=scores.get)
+        query_weight = sum(self._idf.get(term, self._unknown_idf) for term in terms)
+        query_coverage = coverage[best] / query_weight
+        if query_coverage < self.min_coverage:
+            confidence = 0.0
+        else:
+            confidence = math.sqrt(query_coverage * coverage[best] / self._weights[best])
+        return self._answers[self._documents[best][0]], confidence
+
+    def answer(self, question):
+        """
+        Réponse de la base si la correspondance est assez sûre, sinon None
+        """
+        result = self.search(question)
+        if result is not None:
+            metrics.observe('faq.confidence', result[1])
+        if result is None or result[1] < self.min_confidence:
+            metrics.incr('faq.misses')
+            return None
+        metrics.incr('faq.hits')
+        return result[0]
+
+    def hit_rate(self):
+        hits = metrics.get_counter('faq.hits')
+        total = hits + metrics.get_counter('faq.misses')
+        return hits / total if total else None
+
+
+def load_faq(path=FAQ_PATH):
+    """
+    Charge la base de questions fréquentes depuis un fichier JSON
+    (liste d'entrées {"questions": [...], "answer": "..."})
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Impossible de charger la FAQ depuis {path}: {str(e)}")
+        entries = []
+    index = FaqIndex(entries)
+    logger.info(f"FAQ chargée: {len(index)} entrées")
+    return index
+
+
+faq_index = load_faq()
@@ -0,0 +1,177 @@
+import threading
+import time
+import logging
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from src.config import HTTP_POOL_MAXSIZE, HTTP_POOL_SIZES, HTTP_SHARED_HOSTS
+from src.utils.metrics import metrics
+from src.utils.deadline import current_deadline
+
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy:
+    """
+    Politique de nouvelle tentative d'un endpoint: nombre d'essais supplémentaires,
+    backoff exponentiel et codes HTTP considérés comme temporaires
+    """
+
+    def __init__(self, retries=0, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504), retry_on_errors=True):
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.status_forcelist = status_forcelist
+        self.retry_on_errors = retry_on_errors
+
+    def backoff(self, attempt):
+        return self.backoff_factor * (2 ** attempt)
+
+
+class EndpointPolicy:
+    """
+    Timeout (connexion, lecture) et politique de nouvelle tentative d'un type d'appel
+    """
+
+    def __init__(self, timeout, retry=None):
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+
+
+# Politiques par type d'appel. Les POST non idempotents (envoi de message, génération)
+# ne sont pas rejoués automatiquement pour éviter les doublons.
+ENDPOINT_POLICIES = {
+    'default': EndpointPolicy(timeout=(5, 30)),
+    'graph_send': EndpointPolicy(timeout=(5, 30)),
+    'graph_upload': EndpointPolicy(timeout=(5, 60)),
+    'mistral': EndpointPolicy(timeout=(5, 45)),
+    # En flux, le timeout de lecture s'applique entre deux morceaux et non à la réponse entière
+    'mistral_stream': EndpointPolicy(timeout=(5, 20)),
+    'youtube': EndpointPolicy(timeout=(5, 10), retry=RetryPolicy(retries=2, backoff_factor=0.3)),
+    'video_download': EndpointPolicy(timeout=(5, 30), retry=RetryPolicy(retries=1)),
+}
+
+
+# Hôtes des API appelées en continu: une session et un pool dédiés chacun
+DEDICATED_HOSTS = ('graph.facebook.com', 'api.mistral.ai', 'www.googleapis.com')
+# Clé de la session commune aux autres hôtes
+SHARED_SESSION = '*'
+
+
+class HttpClient:
+    """
+    Client HTTP partagé: une session keep-alive par API (graph.facebook.com, api.mistral.ai,
+    googleapis.com et les hôtes de pool_sizes), pour réutiliser les connexions TCP/TLS entre
+    les appels. Les autres hôtes, en nombre non borné (un serveur googlevideo par vidéo),
+    passent par une session commune dont les pools sont limités à shared_hosts.
+    """
+
+    def __init__(self, pool_maxsize=HTTP_POOL_MAXSIZE, pool_sizes=None, shared_hosts=HTTP_SHARED_HOSTS):
+        self.pool_maxsize = pool_maxsize
+        self.pool_sizes = pool_sizes if pool_sizes is not None else HTTP_POOL_SIZES
+        self.shared_hosts = shared_hosts
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _session_for(self, url):
+        parts = urlsplit(url)
+        dedicated = parts.hostname in DEDICATED_HOSTS or parts.hostname in self.pool_sizes
+        key = parts.netloc if dedicated else SHARED_SESSION
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                if dedicated:
+                    pool_size = self.pool_sizes.get(parts.hostname, self.pool_maxsize)
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                else:
+                    # urllib3 ferme les pools au-delà de pool_connections, du moins récent au plus récent
+                    adapter = HTTPAdapter(pool_connections=self.shared_hosts, pool_maxsize=self.pool_maxsize)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._sessions[key] = session
+            return session
+
+    def request(self, method, url, endpoint='default', timeout=None, deadline=None, **kwargs):
+        """
+        Effectue une requête en appliquant le timeout et la politique de l'endpoint.
+        Avec un budget de temps (deadline, ou à défaut celui du thread courant), le timeout
+        est borné par le temps restant et les nouvelles tentatives s'arrêtent quand il est épuisé.
+
+        Raises:
+            DeadlineExceeded: si le budget est épuisé avant l'envoi de la requête
+        """
+        policy = ENDPOINT_POLICIES.get(endpoint, ENDPOINT_POLICIES['default'])
+        retry = policy.retry
+        deadline = deadline or current_deadline()
+        session = self._session_for(url)
+        attempt = 0
+
+        while True:
+            request_timeout = timeout or policy.timeout
+            if deadline is not None:
+                request_timeout = deadline.timeout(request_timeout)
+            try:
+                with metrics.timer(f'http.{endpoint}.seconds'):
+                    response = session.request(method, url, timeout=request_timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if not retry.retry_on_errors or attempt >= retry.retries or not self._can_retry(deadline, retry, attempt):
+                    metrics.incr(f'http.{endpoint}.errors')
+                    raise
+                logger.warning(f"Erreur réseau sur {endpoint} ({str(e)}), nouvelle tentative...")
+            else:
+                if (response.status_code not in retry.status_forcelist or attempt >= retry.retries
+                        or not self._can_retry(deadline, retry, attempt)):
+                    return response
+                logger.warning(f"Réponse {response.status_code} sur {endpoint}, nouvelle tentative...")
+                response.close()
+
+            metrics.incr(f'http.{endpoint}.retries')
+            time.sleep(retry.backoff(attempt))
+            attempt += 1
+
+    @staticmethod
+    def _can_retry(deadline, retry, attempt):
+        # Pas de nouvelle tentative si le budget ne couvre pas l'attente et un nouvel essai
+        return deadline is None or deadline.has(retry.backoff(attempt) + 2)
+
+    def get(self, url, endpoint='default', **kwargs):
+        return self.request('GET', url, endpoint=endpoint, **kwargs)
+
+    def post(self, url, endpoint='default', **kwargs):
+        return self.request('POST', url, endpoint=endpoint, **kwargs)
+
+    def connection_stats(self):
+        """
+        Compteurs par hôte dédié ('*' pour les autres): requêtes effectuées,
+        connexions ouvertes et connexions réutilisées
+        """
+        stats = {}
+        with self._lock:
+            sessions = dict(self._sessions)
+        for host, session in sessions.items():
+            requests_count = 0
+            opened = 0
+            for adapter in session.adapters.values():
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is not None:
+                        requests_count += pool.num_requests
+                        opened += pool.num_connections
+            stats[host] = {
+                'requests': requests_count,
+                'connections_opened': opened,
+                'connections_reused': max(0, requests_count - opened),
+            }
+        return stats
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            session.close()
+
+
+# Client partagé par toute l'application
+http_client = HttpClient()
+metrics.register_gauge('http.connections', http_client.connection_stats)
@@ -0,0 +1,106 @@
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Route:
+    """
+    Intention enregistrée: son gestionnaire et une condition optionnelle sur l'expéditeur
+    """
+    __slots__ = ('name', 'handler', 'when')
+
+    def __init__(self, name, handler, when=None):
+        self.name = name
+        self.handler = handler
+        self.when = when
+
+    def applies(self, sender_id):
+        return self.when is None or self.when(sender_id)
+
+    def __repr__(self):
+        return f"Route({self.name})"
+
+
+class IntentRouter:
+    """
+    Routage déclaratif des messages: commandes (texte exact ou préfixe), intentions
+    reconnues par expressions régulières et actions de postback.
+
+    Les commandes et les actions de postback sont indexées dans des dictionnaires. Les
+    intentions sont compilées en une seule expression régulière, sans groupe au premier
+    niveau pour que le moteur garde son préfiltre sur le premier caractère: un message
+    est analysé en une passe quel que soit le nombre d'intentions, et l'expression à
+    groupes nommés n'est évaluée qu'à la position trouvée pour identifier l'intention.
+
+    Le texte est comparé tel quel: l'appelant le passe en minuscules.
+    """
+
+    def __init__(self):
+        self._routes = {}
+        self._commands = {}
+        self._prefix_commands = {}
+        self._patterns = []
+        self._postbacks = {}
+        self._screen = None
+        self._named = None
+
+    def _add(self, name, handler, when):
+        if name in self._routes:
+            raise ValueError(f"Route déjà enregistrée: {name}")
+        route = self._routes[name] = Route(name, handler, when)
+        return route
+
+    def command(self, name, command, handler, prefix=False, when=None):
+        """
+        Commande reconnue quand elle forme tout le message, ou son premier mot si prefix=True
+        """
+        route = self._add(name, handler, when)
+        (self._prefix_commands if prefix else self._commands)[command] = route
+
+    def pattern(self, name, patterns, handler, when=None):
+        """
+        Intention reconnue n'importe où dans le message par l'une des expressions
+        (sans groupes capturants)
+        """
+        self._add(name, handler, when)
+        self._patterns.append((name, '|'.join(f'(?:{p})' for p in patterns)))
+        # Recompilé à la première recherche
+        self._screen = None
+
+    def postback(self, action, handler, when=None):
+        self._postbacks[action] = Route(action, handler, when)
+
+    def compile(self):
+        sources = [source for _, source in self._patterns]
+        self._screen = re.compile('|'.join(f'(?:{source})' for source in sources) or r'(?!)')
+        self._named = re.compile('|'.join(f'(?P<{name}>{source})' for name, source in self._patterns) or r'(?!)')
+        return self
+
+    def match(self, text, sender_id=None):
+        """
+        Retourne la route correspondant au texte et applicable à l'expéditeur, ou None
+        """
+        stripped = text.strip()
+        route = self._commands.get(stripped)
+        if route is None and stripped:
+            route = self._prefix_commands.get(stripped.split(None, 1)[0])
+        if route is None:
+            route = self._match_pattern(text)
+        if route is None or not route.applies(sender_id):
+            return None
+        return route
+
+    def _match_pattern(self, text):
+        if self._screen is None:
+            self.compile()
+        found = self._screen.search(text)
+        if found is None:
+            return None
+        return self._routes[self._named.match(text, found.start()).lastgroup]
+
+    def match_postback(self, action, sender_id=None):
+        route = self._postbacks.get(action)
+        if route is None or not route.applies(sender_id):
+            return None
+        return route
@@ -1,26 +1,161 @@
 import json
-import requests
 import logging
 import io
-import tempfile
-import os
-from src.config import MESSENGER_PAGE_ACCESS_TOKEN
-from src.mistral_api import generate_mistral_response
-from src.youtube_api import search_youtube
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlparse, parse_qs
+from src.config import (
+    MESSENGER_PAGE_ACCESS_TOKEN, MESSENGER_PAGE_ID, MONGODB_URI, VIDEO_DELIVERY_MODE, ADMIN_SENDER_IDS,
+    MISTRAL_STREAMING, REQUEST_BUDGET_SECONDS, DEADLINE_SEND_RESERVE_SECONDS,
+    YOUTUBE_SESSION_TTL, VIDEO_PREFETCH_ENABLED, VIDEO_PREFETCH_WORKERS,
+    VIDEO_PREFETCH_MAX_PENDING, VIDEO_SOURCE_CACHE_SIZE, VIDEO_SOURCE_DEFAULT_TTL, VIDEO_SOURCE_EXPIRY_MARGIN
+)
+from src.mistral_api import (
+    generate_mistral_response, set_response_cache_enabled, flush_response_cache, response_cache_stats,
+    UNAVAILABLE_RESPONSE, CREATOR_PATTERNS, CREATOR_RESPONSE
+)
+from src.youtube_api import search_youtube_page
+from src.cache_store import TwoTierCache
 from src.models.video import Video
+from src.cloudinary_service import upload_remote_video
 from src.database import Database
+from src.dedup import deduplicator, event_key
+from src.http_client import http_client
+from src.send_batcher import outbound_batch, current_batch
+from src.send_scheduler import (
+    send_scheduler, is_retryable, SendQueueFull, PRIORITY_TEXT, PRIORITY_TEMPLATE, PRIORITY_MEDIA
+)
+from src.video_stream import open_video_stream, VideoTooLarge
+from src.utils.cache import TTLCache
+from src.utils.metrics import metrics
+from src.utils.deadline import Deadline, DeadlineExceeded, current_deadline
+from src.utils.singleflight import SingleFlight
+from src.intent_router import IntentRouter
+from src.utils.logger import lazy_json
 
 logger = logging.getLogger(__name__)
 
 # Dictionnaire pour stocker l'état des utilisateurs
 user_states = {}
 
-def handle_message(sender_id, received_message):
+# Dernière recherche YouTube de chaque expéditeur (requête et jeton de la page suivante),
+# partagée entre les instances pour le bouton "Plus de résultats"
+search_sessions = TwoTierCache('youtube_sessions', 'youtube_search_sessions', ttl=YOUTUBE_SESSION_TTL)
+
+# Réponse rapide proposée sous un carrousel quand la recherche a une page suivante
+MORE_RESULTS_ACTION = 'youtube_more'
+
+# Limites des vidéos envoyées dans Messenger
+VIDEO_MAX_DURATION = 60
+VIDEO_MAX_FILESIZE = 8 * 1024 * 1024
+# Temps minimal restant pour tenter l'extraction, le téléchargement et l'upload d'une vidéo,
+# puis pour l'upload seul; en dessous, le lien YouTube est envoyé à la place
+VIDEO_MIN_BUDGET_SECONDS = 25
+VIDEO_UPLOAD_MIN_BUDGET_SECONDS = 12
+
+# Vidéos en cours de préparation, par ID YouTube
+video_flight = SingleFlight('video')
+
+# Sources vidéo (URL directe du format MP4 choisi) par ID YouTube, gardées tant que leur URL
+# signée est valide. Locales à l'instance: l'URL est liée à l'adresse IP qui l'a demandée.
+video_sources = TTLCache(maxsize=VIDEO_SOURCE_CACHE_SIZE)
+source_flight = SingleFlight('video_source')
+_source_prefetch_executor = ThreadPoolExecutor(max_workers=VIDEO_PREFETCH_WORKERS, thread_name_prefix='video-prefetch')
+_source_prefetch_pending = set()
+_source_prefetch_lock = threading.Lock()
+
+class GraphAPIError(Exception):
+    """
+    Erreur retournée par l'API Graph de Facebook
+    """
+    # Codes de limitation de débit (application, utilisateur, page, envoi)
+    THROTTLING_CODES = (4, 17, 32, 613)
+    # Erreurs temporaires du service
+    TRANSIENT_CODES = (1, 2)
+    
+    def __init__(self, error, status_code=None):
+        super().__init__(error.get('message', "Erreur de l'API Graph"))
+        self.error = error
+        self.code = error.get('code')
+        self.subcode = error.get('error_subcode')
+        self.status_code = status_code
+        self.is_transient = bool(error.get('is_transient'))
+    
+    @property
+    def throttled(self):
+        return self.code in self.THROTTLING_CODES
+    
+    @property
+    def retryable(self):
+        return (self.throttled or self.is_transient or self.code in self.TRANSIENT_CODES
+                or (self.status_code is not None and self.status_code >= 500))
+
+def claim_webhook_event(webhook_event):
+    """
+    Enregistre un événement reçu par le webhook
+
+    Returns:
+        bool: False si c'est un renvoi d'un événement déjà reçu, à ignorer
+    """
+    if deduplicator.claim(event_key(webhook_event)):
+        return True
+    sender_id = webhook_event.get('sender', {}).get('id')
+    logger.info(f"Événement déjà reçu ignoré pour l'expéditeur {sender_id}")
+    return False
+
+def handle_webhook_event(webhook_event, deadline=None):
+    """
+    Traite un événement de messagerie reçu par le webhook (message ou postback),
+    sauf s'il a déjà été reçu
+
+    deadline: budget de temps de la requête webhook; un nouveau budget est créé s'il est absent
+    (traitement en arrière-plan)
+    """
+    # Ignorer les renvois d'un événement déjà reçu avant tout appel externe
+    if claim_webhook_event(webhook_event):
+        process_webhook_event(webhook_event, deadline=deadline)
+
+def process_webhook_event(webhook_event, deadline=None):
+    """
+    Traite un événement déjà enregistré par claim_webhook_event (mode 'ingest': un événement
+    repris après l'arrêt de l'instance qui le traitait ne doit pas être pris pour un doublon)
+
+    deadline: budget de temps de la requête webhook; un nouveau budget est créé s'il est absent
+    (traitement en arrière-plan)
+    """
+    sender_id = webhook_event.get('sender', {}).get('id')
+    logger.info(f"ID de l'expéditeur: {sender_id}")
+
+    deadline = deadline or Deadline(REQUEST_BUDGET_SECONDS)
+    with deadline:
+        if webhook_event.get('message'):
+            logger.info("Message reçu, appel de handle_message")
+            try:
+                handle_message(sender_id, webhook_event.get('message'), deadline=deadline)
+                logger.info("handle_message terminé avec succès")
+            except Exception as e:
+                logger.error(f"Erreur lors du traitement du message: {str(e)}")
+        elif webhook_event.get('postback'):
+            logger.info("Postback reçu: %s", lazy_json(webhook_event.get('postback')))
+            try:
+                handle_message(sender_id, {'postback': webhook_event.get('postback')}, deadline=deadline)
+                logger.info("handle_message pour postback terminé avec succès")
+            except Exception as e:
+                logger.error(f"Erreur lors du traitement du postback: {str(e)}")
+        else:
+            logger.info(f"Événement non reconnu: {webhook_event}")
+
+def handle_message(sender_id, received_message, deadline=None):
     """
     Gère les messages reçus des utilisateurs
+
+    deadline: budget de temps de la requête (à défaut, celui du thread courant)
     """
+    deadline = deadline or current_deadline()
     logger.info(f"Début de handle_message pour sender_id: {sender_id}")
-    logger.info(f"Message reçu: {json.dumps(received_message)}")
+    logger.debug("Message reçu: %s", lazy_json(received_message))
     
     try:
         # Initialiser la base de données si nécessaire
@@ -30,49 +165,54 @@ def handle_message(sender_id, received_message):
             logger.warning(f"Impossible de se connecter à la base de données: {str(db_error)}")
             # Continuer sans la base de données
         
-        if 'text' in received_message:
+        if 'quick_reply' in received_message:
+            handle_quick_reply(sender_id, received_message, deadline=deadline)
+        elif 'text' in received_message:
             text = received_message['text'].lower()
+            route = intent_router.match(text, sender_id)
             
-            if text == '/yt':
-                user_states[sender_id] = 'youtube'
-                send_text_message(sender_id, "Mode YouTube activé. Donnez-moi les mots-clés pour la recherche YouTube.")
-            elif text == 'yt/':
-                user_states[sender_id] = 'mistral'
-                send_text_message(sender_id, "Mode Mistral réactivé. Comment puis-je vous aider ?")
+            if route is not None:
+                # Commande ou réponse prédéfinie: aucun appel externe
+                logger.info(f"Intention reconnue: {route.name}")
+                route.handler(sender_id, text)
             elif sender_id in user_states and user_states[sender_id] == 'youtube':
                 logger.info(f"Recherche YouTube pour: {received_message['text']}")
                 try:
-                    videos = search_youtube(received_message['text'])
-                    if not videos or len(videos) == 0:
+                    page = search_youtube_page(received_message['text'])
+                    if not page or not page['videos']:
                         send_text_message(sender_id, "Aucune vidéo trouvée pour cette recherche. Essayez avec d'autres mots-clés.")
                         return
                         
-                    logger.info(f"Résultats de la recherche YouTube: {json.dumps(videos)}")
-                    send_youtube_results(sender_id, videos)
+                    logger.debug("Résultats de la recherche YouTube: %s", lazy_json(page))
+                    send_youtube_results(sender_id, page['videos'], more_results=bool(page['nextPageToken']))
+                    remember_search_page(sender_id, received_message['text'], page['nextPageToken'])
                 except Exception as e:
                     logger.error(f"Erreur lors de la recherche YouTube: {str(e)}")
                     send_text_message(sender_id, "Désolé, je n'ai pas pu effectuer la recherche YouTube. Veuillez réessayer plus tard.")
             else:
                 logger.info("Génération de la réponse Mistral...")
                 try:
-                    response = generate_mistral_response(received_message['text'])
-                    logger.info(f"Réponse Mistral générée: {response}")
-                    send_text_message(sender_id, response)
+                    if MISTRAL_STREAMING:
+                        stream_mistral_reply(sender_id, received_message['text'], deadline=deadline)
+                    else:
+                        response = generate_mistral_response(received_message['text'], deadline=deadline, sender_id=sender_id)
+                        logger.debug("Réponse Mistral générée: %s", response)
+                        send_text_message(sender_id, response)
                 except Exception as e:
                     logger.error(f"Erreur lors de la génération de la réponse Mistral: {str(e)}")
-                    fallback_response = "Je suis désolé, je ne peux pas accéder à mon service de réponse en ce moment. Vous pouvez essayer le mode YouTube en tapant '/yt'."
-                    send_text_message(sender_id, fallback_response)
+                    send_text_message(sender_id, UNAVAILABLE_RESPONSE)
             
             logger.info("Message envoyé avec succès")
         elif 'postback' in received_message:
-            logger.info(f"Traitement du postback: {json.dumps(received_message['postback'])}")
+            logger.debug("Traitement du postback: %s", lazy_json(received_message['postback']))
             try:
                 payload = json.loads(received_message['postback']['payload'])
-                logger.info(f"Payload du postback: {json.dumps(payload)}")
+                logger.info("Payload du postback: %s", lazy_json(payload))
                 
-                if payload.get('action') == 'watch_video':
-                    logger.info(f"Action watch_video détectée pour videoId: {payload.get('videoId')}")
-                    handle_watch_video(sender_id, payload.get('videoId'))
+                route = intent_router.match_postback(payload.get('action'), sender_id)
+                if route is not None:
+                    logger.info(f"Action {route.name} détectée")
+                    route.handler(sender_id, payload, deadline=deadline)
                 else:
                     logger.info(f"Action de postback non reconnue: {payload.get('action')}")
             except Exception as e:
@@ -90,30 +230,166 @@ def handle_message(sender_id, received_message):
     
     logger.info("Fin de handle_message")
 
-def send_youtube_results(recipient_id, videos):
+def enter_youtube_mode(sender_id, text):
+    user_states[sender_id] = 'youtube'
+    send_text_message(sender_id, "Mode YouTube activé. Donnez-moi les mots-clés pour la recherche YouTube.")
+
+def enter_mistral_mode(sender_id, text):
+    user_states[sender_id] = 'mistral'
+    send_text_message(sender_id, "Mode Mistral réactivé. Comment puis-je vous aider ?")
+
+def canned_reply(response):
     """
-    Envoie les résultats de recherche YouTube sous forme de carrousel
+    Gestionnaire qui répond par un texte fixe
+    """
+    def handler(sender_id, text):
+        metrics.incr('intents.canned_replies')
+        send_text_message(sender_id, response)
+    return handler
+
+def is_admin(sender_id):
+    return sender_id in ADMIN_SENDER_IDS
+
+def in_mistral_mode(sender_id):
+    return user_states.get(sender_id) != 'youtube'
+
+# Routes des messages texte et des postbacks, compilées une fois au chargement du module.
+# Un message qui ne correspond à aucune route va à la recherche YouTube ou à Mistral selon le mode.
+intent_router = IntentRouter()
+intent_router.command('youtube_mode', '/yt', enter_youtube_mode)
+intent_router.command('mistral_mode', 'yt/', enter_mistral_mode)
+intent_router.command('cache', '/cache', lambda sender_id, text: handle_cache_command(sender_id, text),
+                      prefix=True, when=is_admin)
+intent_router.pattern('creator', CREATOR_PATTERNS, canned_reply(CREATOR_RESPONSE), when=in_mistral_mode)
+intent_router.postback('watch_video', lambda sender_id, payload, deadline=None: handle_watch_video(
+    sender_id, payload.get('videoId'), deadline=deadline
+))
+intent_router.postback(MORE_RESULTS_ACTION, lambda sender_id, payload, deadline=None: handle_more_results(
+    sender_id, payload, deadline=deadline
+))
+intent_router.compile()
+
+def stream_mistral_reply(recipient_id, prompt, deadline=None):
+    """
+    Génère la réponse Mistral en flux: l'indicateur de saisie est affiché pendant la génération
+    et chaque paragraphe est envoyé dès qu'il est complet
+    """
+    send_sender_action(recipient_id, 'typing_on')
+
+    def on_message(text):
+        send_text_message(recipient_id, text)
+        # L'indicateur disparaît à chaque message reçu: le réafficher pour la suite
+        send_sender_action(recipient_id, 'typing_on')
+
+    try:
+        return generate_mistral_response(prompt, on_message=on_message, deadline=deadline, sender_id=recipient_id)
+    finally:
+        send_sender_action(recipient_id, 'typing_off')
+
+def handle_cache_command(sender_id, text):
+    """
+    Commande d'administration du cache des réponses: /cache on|off|flush|stats
+    """
+    action = text[len('/cache'):].strip()
+    if action == 'off':
+        set_response_cache_enabled(False)
+        send_text_message(sender_id, "Cache des réponses désactivé.")
+    elif action == 'on':
+        set_response_cache_enabled(True)
+        send_text_message(sender_id, "Cache des réponses activé.")
+    elif action == 'flush':
+        flush_response_cache()
+        send_text_message(sender_id, "Cache des réponses vidé.")
+    else:
+        stats = response_cache_stats()
+        hit_rate = stats['hit_rate']
+        send_text_message(
+            sender_id,
+            f"Cache {'activé' if stats['enabled'] else 'désactivé'}, "
+            f"{stats['entries']} entrées en mémoire, taux de succès: "
+            f"{'n/a' if hit_rate is None else f'{hit_rate:.0%}'}"
+        )
+
+def is_downloadable(video):
+    """
+    Indique si la vidéo peut être envoyée en MP4: durée inconnue (on tente), ou non nulle
+    (0 pour un direct) et dans la limite de VIDEO_MAX_DURATION
+    """
+    duration = video.get('duration')
+    return duration is None or 0 < duration <= VIDEO_MAX_DURATION
+
+def handle_quick_reply(sender_id, received_message, deadline=None):
+    """
+    Traite une réponse rapide: son payload est routé comme une action de postback,
+    à défaut le texte de la réponse est traité comme un message
+    """
+    try:
+        payload = json.loads(received_message['quick_reply'].get('payload') or '{}')
+    except ValueError:
+        payload = {}
+    route = intent_router.match_postback(payload.get('action'), sender_id) if isinstance(payload, dict) else None
+    if route is not None:
+        logger.info(f"Réponse rapide {route.name}")
+        route.handler(sender_id, payload, deadline=deadline)
+        return
+    message = {key: value for key, value in received_message.items() if key != 'quick_reply'}
+    handle_message(sender_id, message, deadline=deadline)
+
+def remember_search_page(sender_id, query, next_page_token):
+    """
+    Mémorise le jeton de la page suivante de la recherche
+    """
+    try:
+        search_sessions.set(sender_id, {'query': query, 'pageToken': next_page_token})
+    except Exception as e:
+        logger.warning(f"Impossible de mémoriser la recherche de {sender_id}: {str(e)}")
+
+def handle_more_results(sender_id, payload=None, deadline=None):
+    """
+    Envoie la page suivante de la dernière recherche YouTube de l'expéditeur, découpée dans
+    les résultats déjà en cache; un nouvel appel search.list n'est fait qu'une fois ceux-ci épuisés
+    """
+    metrics.incr('youtube.more_results')
+    session = search_sessions.get(sender_id)
+    page = None
+    if session and session.get('pageToken'):
+        page = search_youtube_page(session['query'], page_token=session['pageToken'])
+    if not page or not page['videos']:
+        send_text_message(sender_id, "Il n'y a pas d'autres résultats. Envoyez de nouveaux mots-clés pour une autre recherche.")
+        return
+    send_youtube_results(sender_id, page['videos'], more_results=bool(page['nextPageToken']))
+    remember_search_page(sender_id, session['query'], page['nextPageToken'])
+
+def send_youtube_results(recipient_id, videos, more_results=False):
+    """
+    Envoie les résultats de recherche YouTube sous forme de carrousel.
+    Le bouton de téléchargement n'est proposé que pour les vidéos assez courtes,
+    et more_results ajoute la réponse rapide "Plus de résultats".
     """
     elements = []
     for video in videos:
+        buttons = [
+            {
+                "type": "web_url",
+                "url": f"https://www.youtube.com/watch?v={video['videoId']}",
+                "title": "Regarder sur YouTube"
+            }
+        ]
+        if is_downloadable(video):
+            buttons.append({
+                "type": "postback",
+                "title": "Télécharger MP4",
+                "payload": json.dumps({
+                    "action": "watch_video",
+                    "videoId": video['videoId']
+                })
+            })
+        else:
+            metrics.incr('youtube.download_button_hidden')
         elements.append({
             "title": video['title'],
             "image_url": video['thumbnail'],
-            "buttons": [
-                {
-                    "type": "web_url",
-                    "url": f"https://www.youtube.com/watch?v={video['videoId']}",
-                    "title": "Regarder sur YouTube"
-                },
-                {
-                    "type": "postback",
-                    "title": "Télécharger MP4",
-                    "payload": json.dumps({
-                        "action": "watch_video",
-                        "videoId": video['videoId']
-                    })
-                }
-            ]
+            "buttons": buttons
         })
     
     message_data = {
@@ -128,39 +404,299 @@ def send_youtube_results(recipient_id, videos):
             }
         }
     }
+    if more_results:
+        message_data["message"]["quick_replies"] = [{
+            "content_type": "text",
+            "title": "Plus de résultats",
+            "payload": json.dumps({"action": MORE_RESULTS_ACTION})
+        }]
     
     call_send_api(message_data)
+    prefetch_video_sources(videos)
+
+def prefetch_video_sources(videos):
+    """
+    Extrait en arrière-plan les sources des vidéos téléchargeables d'un carrousel envoyé,
+    pour qu'un clic sur "Télécharger MP4" passe directement au téléchargement.
+    Au plus VIDEO_PREFETCH_WORKERS extractions simultanées; au-delà de
+    VIDEO_PREFETCH_MAX_PENDING vidéos en attente, les suivantes ne sont pas préchargées.
+    """
+    if not VIDEO_PREFETCH_ENABLED:
+        return
+    for video in videos:
+        video_id = video['videoId']
+        if not is_downloadable(video) or video_id in video_sources:
+            continue
+        with _source_prefetch_lock:
+            if video_id in _source_prefetch_pending:
+                continue
+            if len(_source_prefetch_pending) >= VIDEO_PREFETCH_MAX_PENDING:
+                metrics.incr('video_source.prefetch_skipped')
+                continue
+            _source_prefetch_pending.add(video_id)
+        metrics.incr('video_source.prefetch_started')
+        _source_prefetch_executor.submit(prefetch_video_source, video_id)
+
+def prefetch_video_source(video_id):
+    """
+    Met en cache la source d'une vidéo, sauf si sa pièce jointe Messenger est déjà enregistrée
+    """
+    try:
+        if MONGODB_URI:
+            video = Video.find_by_video_id(video_id)
+            if video and video.attachment_id and video.attachment_page_id == current_page_id():
+                return
+        resolve_video_source(video_id)
+    except Exception as e:
+        logger.warning(f"Échec du préchargement de la vidéo {video_id}: {str(e)}")
+    finally:
+        with _source_prefetch_lock:
+            _source_prefetch_pending.discard(video_id)
 
-def handle_watch_video(recipient_id, video_id):
+def handle_watch_video(recipient_id, video_id, deadline=None):
     """
     Télécharge et envoie une vidéo YouTube en MP4
+
+    deadline: budget de temps de la requête (à défaut, celui du thread courant). Quand il ne
+    reste plus assez de temps pour préparer la vidéo, le lien YouTube est envoyé à la place.
+
+    Les demandes simultanées de la même vidéo (lien partagé dans un groupe) ne la préparent
+    qu'une fois: les autres demandeurs attendent la pièce jointe et la reçoivent par son ID.
     """
+    deadline = deadline or current_deadline()
     try:
+        # Vidéo déjà envoyée à Messenger: réutiliser la pièce jointe sans la télécharger
+        if send_cached_video(recipient_id, video_id):
+            return
+        
+        if deadline is not None and not deadline.has(VIDEO_MIN_BUDGET_SECONDS):
+            send_video_link_fallback(recipient_id, video_id)
+            return
+        
         # Informer l'utilisateur que le téléchargement est en cours
         send_text_message(recipient_id, "Je télécharge votre vidéo, veuillez patienter...")
         
-        # Télécharger la vidéo
-        video_data, title, filename = download_youtube_video(video_id)
-        
-        if not video_data:
-            send_text_message(recipient_id, "Désolé, je n'ai pas pu télécharger cette vidéo. Elle est peut-être trop longue ou trop volumineuse.")
-            send_text_message(recipient_id, f"Voici le lien YouTube à la place: https://www.youtube.com/watch?v={video_id}")
+        wait = deadline.reserve(DEADLINE_SEND_RESERVE_SECONDS).remaining() if deadline is not None else None
+        try:
+            delivery, shared = video_flight.do(
+                video_id, lambda: prepare_and_send_video(recipient_id, video_id, deadline), timeout=wait
+            )
+        except TimeoutError:
+            send_video_link_fallback(recipient_id, video_id)
             return
         
-        # Envoyer la vidéo à l'utilisateur
-        success = send_video_file(recipient_id, video_data, filename, title)
-        
-        if not success:
-            # Fallback: envoyer le lien YouTube
-            send_text_message(recipient_id, "Désolé, je n'ai pas pu envoyer la vidéo. Voici le lien YouTube à la place:")
-            send_text_message(recipient_id, f"https://www.youtube.com/watch?v={video_id}")
+        if shared:
+            send_shared_video(recipient_id, video_id, delivery)
         
     except Exception as e:
         logger.error(f"Erreur lors de l'envoi de la vidéo: {str(e)}")
         send_text_message(recipient_id, "Désolé, je n'ai pas pu envoyer la vidéo. Veuillez réessayer plus tard.")
         send_text_message(recipient_id, f"Voici le lien YouTube à la place: https://www.youtube.com/watch?v={video_id}")
 
-def download_youtube_video(video_id, max_duration=60, max_filesize=8*1024*1024):
+def prepare_and_send_video(recipient_id, video_id, deadline=None):
+    """
+    Télécharge la vidéo, l'envoie au demandeur et mémorise la pièce jointe
+    
+    Returns:
+        dict: {'attachment_id', 'title'} de la vidéo envoyée (attachment_id peut être None),
+        ou None si la vidéo n'a pas pu être envoyée (le demandeur a reçu le lien YouTube)
+    """
+    # Trouver la source de la vidéo
+    source = resolve_video_source(video_id, deadline=deadline)
+    
+    # Livraison par URL: Cloudinary récupère la vidéo sans passer par notre fonction,
+    # sauf si l'URL est réservée à notre adresse IP (Cloudinary recevrait un 403)
+    if source and VIDEO_DELIVERY_MODE == 'cloudinary' and is_ip_bound(source['url']):
+        logger.info(f"URL de la vidéo {video_id} liée à notre adresse IP, envoi direct de la vidéo")
+        metrics.incr('video.cloudinary_skipped_ip_bound')
+    elif source and VIDEO_DELIVERY_MODE == 'cloudinary':
+        response = deliver_video_via_cloudinary(recipient_id, video_id, source, deadline=deadline)
+        if response is not None:
+            if response.get('attachment_id'):
+                remember_video_attachment(video_id, response['attachment_id'], source['title'])
+            return {'attachment_id': response.get('attachment_id'), 'title': source['title']}
+        logger.warning("Livraison via Cloudinary impossible, envoi direct de la vidéo")
+        forget_video_source(video_id)
+    
+    if deadline is not None and not deadline.has(VIDEO_UPLOAD_MIN_BUDGET_SECONDS):
+        send_video_link_fallback(recipient_id, video_id)
+        return None
+    
+    # Ouvrir la vidéo en flux continu vers l'upload
+    video_data = open_video_data(source['url'], deadline=deadline) if source else None
+    
+    if not video_data:
+        forget_video_source(video_id)
+        send_text_message(recipient_id, "Désolé, je n'ai pas pu télécharger cette vidéo. Elle est peut-être trop longue ou trop volumineuse.")
+        send_text_message(recipient_id, f"Voici le lien YouTube à la place: https://www.youtube.com/watch?v={video_id}")
+        return None
+    
+    # Envoyer la vidéo à l'utilisateur
+    title = source['title']
+    try:
+        attachment_id = send_video_file(recipient_id, video_data, f"{video_id}.mp4", title, deadline=deadline)
+    finally:
+        video_data.close()
+    
+    if not attachment_id:
+        # Fallback: envoyer le lien YouTube
+        send_text_message(recipient_id, "Désolé, je n'ai pas pu envoyer la vidéo. Voici le lien YouTube à la place:")
+        send_text_message(recipient_id, f"https://www.youtube.com/watch?v={video_id}")
+        return None
+    
+    # Mémoriser la pièce jointe pour les prochaines demandes de cette vidéo
+    remember_video_attachment(video_id, attachment_id, title)
+    return {'attachment_id': attachment_id, 'title': title}
+
+def send_shared_video(recipient_id, video_id, delivery):
+    """
+    Envoie à un demandeur la vidéo préparée pour un autre, par l'ID de sa pièce jointe
+    """
+    if delivery and delivery.get('attachment_id'):
+        send_video_attachment(recipient_id, delivery['attachment_id'], delivery['title'])
+        return
+    send_text_message(recipient_id, "Désolé, je n'ai pas pu envoyer la vidéo. Voici le lien YouTube à la place:")
+    send_text_message(recipient_id, f"https://www.youtube.com/watch?v={video_id}")
+
+def send_video_link_fallback(recipient_id, video_id):
+    """
+    Envoie le lien YouTube quand le temps restant ne permet pas de préparer la vidéo
+    """
+    logger.warning(f"Budget de temps insuffisant pour la vidéo {video_id}, envoi du lien YouTube")
+    metrics.incr('deadline.video_fallbacks')
+    send_text_message(recipient_id, "Je n'ai pas le temps de préparer cette vidéo maintenant. Voici le lien YouTube:")
+    send_text_message(recipient_id, f"https://www.youtube.com/watch?v={video_id}")
+
+def current_page_id():
+    """
+    Identifiant de la page Messenger: MESSENGER_PAGE_ID, ou à défaut une empreinte du token de page
+    """
+    if MESSENGER_PAGE_ID:
+        return MESSENGER_PAGE_ID
+    return hashlib.sha256((MESSENGER_PAGE_ACCESS_TOKEN or '').encode()).hexdigest()[:16]
+
+def send_cached_video(recipient_id, video_id):
+    """
+    Envoie une vidéo à partir de sa pièce jointe Messenger déjà enregistrée
+    
+    Returns:
+        bool: True si la vidéo a été envoyée depuis le cache, False sinon
+    """
+    if not MONGODB_URI:
+        return False
+    
+    try:
+        video = Video.find_by_video_id(video_id)
+    except Exception as e:
+        logger.warning(f"Impossible de lire le cache de pièces jointes: {str(e)}")
+        return False
+    
+    if not video:
+        metrics.incr('video_cache.misses')
+        return False
+    
+    if not video.attachment_id or video.attachment_page_id != current_page_id():
+        # Vidéo déjà hébergée sur Cloudinary: l'envoyer par URL sans la retélécharger
+        if video.cloudinary_url:
+            response = send_video_url(recipient_id, video.cloudinary_url, video.title)
+            if response is not None:
+                metrics.incr('video_cache.hits_cloudinary')
+                if response.get('attachment_id'):
+                    remember_video_attachment(video_id, response['attachment_id'], video.title)
+                return True
+        metrics.incr('video_cache.misses')
+        return False
+    
+    try:
+        send_video_attachment(recipient_id, video.attachment_id, video.title)
+    except GraphAPIError as e:
+        if e.retryable:
+            raise
+        # Pièce jointe expirée ou refusée: l'oublier et retélécharger la vidéo
+        logger.warning(f"Pièce jointe {video.attachment_id} refusée pour la vidéo {video_id}: {str(e)}")
+        metrics.incr('video_cache.invalidated')
+        try:
+            Video.clear_attachment(video_id)
+        except Exception as db_error:
+            logger.warning(f"Impossible d'invalider la pièce jointe: {str(db_error)}")
+        return False
+    
+    metrics.incr('video_cache.hits')
+    logger.info(f"Vidéo {video_id} envoyée depuis le cache de pièces jointes")
+    return True
+
+def deliver_video_via_cloudinary(recipient_id, video_id, source, deadline=None):
+    """
+    Fait récupérer la vidéo par Cloudinary depuis son URL directe, puis l'envoie par URL
+    
+    Returns:
+        dict: Réponse de l'API Send pour la vidéo, ou None en cas d'échec
+    """
+    if deadline is not None:
+        # Garder le temps d'envoyer la vidéo (ou le lien en repli) après l'upload distant
+        timeout = deadline.reserve(DEADLINE_SEND_RESERVE_SECONDS).remaining()
+        result = upload_remote_video(source['url'], f"youtube_{video_id}", timeout=timeout)
+    else:
+        result = upload_remote_video(source['url'], f"youtube_{video_id}")
+    if not result:
+        return None
+    
+    cloudinary_url = result.get('secure_url') or result.get('url')
+    if not cloudinary_url:
+        return None
+    
+    if MONGODB_URI:
+        try:
+            Video.save_cloudinary_url(video_id, cloudinary_url, title=source['title'], file_size=result.get('bytes'))
+        except Exception as e:
+            logger.warning(f"Impossible d'enregistrer l'URL Cloudinary de la vidéo {video_id}: {str(e)}")
+    
+    return send_video_url(recipient_id, cloudinary_url, source['title'])
+
+def send_video_url(recipient_id, video_url, title):
+    """
+    Envoie une vidéo hébergée par son URL publique, suivie de son titre
+    
+    Returns:
+        dict: Réponse de l'API Send pour la vidéo (avec l'ID de pièce jointe réutilisable),
+        ou None en cas d'échec
+    """
+    messages = [{
+        "recipient": {"id": recipient_id},
+        "message": {
+            "attachment": {
+                "type": "video",
+                "payload": {
+                    "url": video_url,
+                    "is_reusable": True
+                }
+            }
+        }
+    }]
+    if title:
+        messages.append({"recipient": {"id": recipient_id}, "message": {"text": f"Titre: {title}"}})
+    
+    try:
+        results = send_message_batch(messages)
+    except Exception as e:
+        logger.error(f"Erreur lors de l'envoi de la vidéo par URL: {str(e)}")
+        return None
+    
+    return results[0] or {}
+
+def remember_video_attachment(video_id, attachment_id, title):
+    """
+    Enregistre la pièce jointe réutilisable d'une vidéo
+    """
+    if not MONGODB_URI:
+        return
+    
+    try:
+        Video.save_attachment(video_id, attachment_id, current_page_id(), title=title)
+    except Exception as e:
+        logger.warning(f"Impossible d'enregistrer la pièce jointe de la vidéo {video_id}: {str(e)}")
+
+def download_youtube_video(video_id, max_duration=VIDEO_MAX_DURATION, max_filesize=VIDEO_MAX_FILESIZE):
     """
     Télécharge une vidéo YouTube et retourne les données binaires
     
@@ -172,18 +708,91 @@ def download_youtube_video(video_id, max_duration=60, max_filesize=8*1024*1024):
     Returns:
         tuple: (données_binaires, titre_video, nom_fichier) ou (None, None, None) en cas d'erreur
     """
-    logger.info(f"Début du téléchargement de la vidéo YouTube {video_id}...")
+    source = resolve_video_source(video_id, max_duration, max_filesize)
+    if not source:
+        return None, None, None
+    
+    video_data = download_video_data(source['url'], max_filesize)
+    if not video_data:
+        return None, None, None
+    
+    return video_data, source['title'], f"{video_id}.mp4"
+
+def resolve_video_source(video_id, max_duration=VIDEO_MAX_DURATION, max_filesize=VIDEO_MAX_FILESIZE, deadline=None):
+    """
+    Retourne la source d'une vidéo YouTube: depuis le cache si elle a été préchargée,
+    sinon en rejoignant l'extraction en cours ou en la lançant
+    
+    Returns:
+        dict: {'url', 'title', 'duration'} ou None si la vidéo n'est pas téléchargeable
+    """
+    source = video_sources.get(video_id)
+    if source is not None:
+        metrics.incr('video_source.hits')
+        return source if source['duration'] <= max_duration else None
+    
+    metrics.incr('video_source.misses')
+    wait = deadline.remaining() if deadline is not None else None
+    try:
+        source, _ = source_flight.do(
+            video_id, lambda: load_video_source(video_id, max_duration, max_filesize, deadline), timeout=wait
+        )
+    except TimeoutError:
+        logger.warning(f"Extraction de la vidéo {video_id} trop longue pour le budget restant")
+        return None
+    return source
+
+def load_video_source(video_id, max_duration=VIDEO_MAX_DURATION, max_filesize=VIDEO_MAX_FILESIZE, deadline=None):
+    """
+    Extrait la source d'une vidéo et la met en cache jusqu'à l'expiration de son URL signée
+    """
+    source = extract_video_source(video_id, max_duration, max_filesize, deadline=deadline)
+    if source:
+        ttl = source_ttl(source['url'])
+        if ttl > 0:
+            video_sources.set(video_id, source, ttl=ttl)
+    return source
+
+def source_ttl(direct_url):
+    """
+    Durée pendant laquelle une source peut être réutilisée: validité restante de l'URL signée
+    (paramètre expire, horodatage Unix) moins la marge laissée au téléchargement
+    """
+    try:
+        expire = int(parse_qs(urlparse(direct_url).query)['expire'][0])
+    except (KeyError, IndexError, ValueError):
+        return VIDEO_SOURCE_DEFAULT_TTL
+    return expire - time.time() - VIDEO_SOURCE_EXPIRY_MARGIN
+
+def is_ip_bound(direct_url):
+    """
+    Indique si l'URL signée n'est valable que pour l'adresse IP qui l'a obtenue
+    (paramètre ip des URL googlevideo, dans la requête ou le chemin)
+    """
+    parts = urlparse(direct_url)
+    return 'ip' in parse_qs(parts.query) or '/ip/' in parts.path
+
+def forget_video_source(video_id):
+    """
+    Oublie une source dont l'URL a été refusée, pour que la prochaine demande la réextraie
+    """
+    video_sources.delete(video_id)
+
+def extract_video_source(video_id, max_duration=VIDEO_MAX_DURATION, max_filesize=VIDEO_MAX_FILESIZE, deadline=None):
+    """
+    Extrait les informations d'une vidéo YouTube sans la télécharger et choisit
+    le format MP4 le plus léger
+    
+    Returns:
+        dict: {'url', 'title', 'duration'} ou None si la vidéo n'est pas téléchargeable
+    """
+    logger.info(f"Extraction des informations de la vidéo YouTube {video_id}...")
     
     try:
         from yt_dlp import YoutubeDL
         
-        # Créer un dossier temporaire
-        temp_dir = tempfile.mkdtemp()
-        output_path = os.path.join(temp_dir, f"{video_id}.mp4")
-        
         ydl_opts = {
             'format': 'worst[ext=mp4]',  # Qualité la plus basse pour réduire la taille
-            'outtmpl': output_path,
             'max_filesize': max_filesize,
             'max_downloads': 1,
             'noplaylist': True,
@@ -191,225 +800,446 @@ def download_youtube_video(video_id, max_duration=60, max_filesize=8*1024*1024):
             'no_warnings': False,
             'ignoreerrors': False,
         }
+        if deadline is not None:
+            ydl_opts['socket_timeout'] = deadline.timeout(15)
         
-        logger.info(f"Extraction des informations de la vidéo YouTube {video_id}...")
         with YoutubeDL(ydl_opts) as ydl:
-            # D'abord extraire les informations sans télécharger
             info = ydl.extract_info(f"https://www.youtube.com/watch?v={video_id}", download=False)
-            
-            # Vérifier la durée
-            duration = info.get('duration', 0)
-            if duration > max_duration:
-                logger.warning(f"Vidéo trop longue: {duration}s > {max_duration}s")
-                return None, None, None
-            
-            # Vérifier la taille estimée si disponible
-            filesize = info.get('filesize', 0)
-            if filesize > max_filesize and filesize > 0:
-                logger.warning(f"Vidéo trop volumineuse: {filesize} octets > {max_filesize} octets")
-                return None, None, None
-            
-            title = info.get('title', 'Video sans titre')
-            logger.info(f"Informations extraites: Titre={title}, Durée={duration}s")
-            
-            # Trouver le format mp4 de plus basse qualité
-            formats = info.get('formats', [])
-            mp4_formats = [f for f in formats if f.get('ext') == 'mp4']
-            
-            if not mp4_formats:
-                logger.error("Aucun format MP4 disponible")
-                return None, None, None
-            
-            # Trier par taille/résolution
-            sorted_formats = sorted(mp4_formats, 
-                                   key=lambda x: x.get('filesize', 0) if x.get('filesize', 0) > 0 
-                                   else x.get('height', 0))
-            
-            # Obtenir l'URL directe
-            direct_url = sorted_formats[0].get('url')
-            
-            if not direct_url:
-                logger.error("Impossible d'obtenir l'URL directe")
-                return None, None, None
-            
-            # Télécharger la vidéo directement depuis l'URL
-            logger.info(f"Téléchargement de la vidéo depuis l'URL directe...")
-            response = requests.get(direct_url, stream=True, timeout=30)
-            
-            if response.status_code != 200:
-                logger.error(f"Erreur lors du téléchargement: {response.status_code}")
-                return None, None, None
-            
-            # Lire les données en mémoire
-            video_data = io.BytesIO()
-            for chunk in response.iter_content(chunk_size=8192):
-                video_data.write(chunk)
-            
-            # Remettre le curseur au début du buffer
-            video_data.seek(0)
-            
-            # Vérifier la taille
-            size = video_data.getbuffer().nbytes
-            if size > max_filesize:
-                logger.warning(f"Vidéo téléchargée trop volumineuse: {size} octets > {max_filesize} octets")
-                return None, None, None
-            
-            logger.info(f"Vidéo téléchargée avec succès, taille: {size} octets")
-            filename = f"{video_id}.mp4"
-            return video_data, title, filename
-            
+        
+        # Vérifier la durée
+        duration = info.get('duration', 0)
+        if duration > max_duration:
+            logger.warning(f"Vidéo trop longue: {duration}s > {max_duration}s")
+            return None
+        
+        # Vérifier la taille estimée si disponible
+        filesize = info.get('filesize', 0)
+        if filesize > max_filesize and filesize > 0:
+            logger.warning(f"Vidéo trop volumineuse: {filesize} octets > {max_filesize} octets")
+            return None
+        
+        title = info.get('title', 'Video sans titre')
+        logger.info(f"Informations extraites: Titre={title}, Durée={duration}s")
+        
+        # Trouver le format mp4 de plus basse qualité
+        formats = info.get('formats', [])
+        mp4_formats = [f for f in formats if f.get('ext') == 'mp4']
+        
+        if not mp4_formats:
+            logger.error("Aucun format MP4 disponible")
+            return None
+        
+        # Trier par taille/résolution
+        sorted_formats = sorted(mp4_formats, 
+                               key=lambda x: x.get('filesize', 0) if x.get('filesize', 0) > 0 
+                               else x.get('height', 0))
+        
+        # Obtenir l'URL directe
+        direct_url = sorted_formats[0].get('url')
+        
+        if not direct_url:
+            logger.error("Impossible d'obtenir l'URL directe")
+            return None
+        
+        return {'url': direct_url, 'title': title, 'duration': duration}
+        
+    except Exception as e:
+        logger.error(f"Erreur lors de l'extraction des informations de la vidéo: {str(e)}", exc_info=True)
+        return None
+
+def open_video_data(direct_url, max_filesize=VIDEO_MAX_FILESIZE, deadline=None):
+    """
+    Ouvre la vidéo en flux continu (mémoire constante, téléchargement pendant l'upload).
+    Si la taille n'est pas annoncée par la source, la vidéo est téléchargée en mémoire.
+    
+    Returns:
+        Objet fichier à transmettre à send_video_file, ou None en cas d'erreur
+    """
+    try:
+        stream = open_video_stream(http_client, direct_url, max_filesize, deadline=deadline)
+    except VideoTooLarge as e:
+        logger.warning(str(e))
+        return None
+    except Exception as e:
+        logger.error(f"Erreur lors de l'ouverture du flux vidéo: {str(e)}")
+        return None
+    
+    if stream is not None:
+        return stream
+    
+    return download_video_data(direct_url, max_filesize, deadline=deadline)
+
+def download_video_data(direct_url, max_filesize=VIDEO_MAX_FILESIZE, deadline=None):
+    """
+    Télécharge la vidéo en mémoire, en s'arrêtant dès que la taille maximale est dépassée
+    
+    Returns:
+        BytesIO ou None en cas d'erreur
+    """
+    try:
+        # Télécharger la vidéo directement depuis l'URL
+        logger.info(f"Téléchargement de la vidéo depuis l'URL directe...")
+        response = http_client.get(direct_url, endpoint='video_download', stream=True, deadline=deadline)
+        
+        if response.status_code != 200:
+            logger.error(f"Erreur lors du téléchargement: {response.status_code}")
+            return None
+        
+        # Refuser tout de suite une vidéo annoncée comme trop volumineuse
+        content_length = response.headers.get('Content-Length')
+        if content_length and content_length.isdigit() and int(content_length) > max_filesize:
+            logger.warning(f"Vidéo trop volumineuse: {content_length} octets > {max_filesize} octets")
+            response.close()
+            return None
+        
+        # Lire les données en mémoire
+        video_data = io.BytesIO()
+        for chunk in response.iter_content(chunk_size=8192):
+            video_data.write(chunk)
+            if video_data.tell() > max_filesize:
+                logger.warning(f"Vidéo téléchargée trop volumineuse: plus de {max_filesize} octets")
+                response.close()
+                return None
+        
+        # Remettre le curseur au début du buffer
+        video_data.seek(0)
+        
+        logger.info(f"Vidéo téléchargée avec succès, taille: {video_data.getbuffer().nbytes} octets")
+        return video_data
+        
     except Exception as e:
         logger.error(f"Erreur lors du téléchargement de la vidéo: {str(e)}", exc_info=True)
-        return None, None, None
-    finally:
-        # Nettoyer le dossier temporaire
-        try:
-            if os.path.exists(temp_dir):
-                import shutil
-                shutil.rmtree(temp_dir)
-        except Exception as e:
-            logger.warning(f"Impossible de nettoyer le dossier temporaire: {str(e)}")
+        return None
 
-def send_video_file(recipient_id, video_data, filename, title):
+def send_video_file(recipient_id, video_data, filename, title, deadline=None):
     """
     Envoie un fichier vidéo à l'utilisateur via l'API Messenger
     
     Args:
         recipient_id: ID du destinataire
-        video_data: Données binaires de la vidéo (BytesIO)
+        video_data: Données binaires de la vidéo (BytesIO ou flux StreamingVideo)
         filename: Nom du fichier
         title: Titre de la vidéo
+        deadline: Budget de temps de la requête
         
     Returns:
-        bool: True si envoyé avec succès, False sinon
+        str: ID de la pièce jointe réutilisable si la vidéo a été envoyée, False sinon
     """
     try:
         logger.info(f"Envoi du fichier vidéo {filename} à l'utilisateur {recipient_id}...")
         
-        # L'API Messenger nécessite une URL publique pour les pièces jointes
-        # Nous devons donc utiliser l'API d'upload de pièces jointes
-        
-        url = f"https://graph.facebook.com/v13.0/me/message_attachments?access_token={MESSENGER_PAGE_ACCESS_TOKEN}"
-        
-        # Préparer les données pour l'upload
-        from requests_toolbelt.multipart.encoder import MultipartEncoder
-        
-        multipart_data = MultipartEncoder(
-            fields={
-                'recipient': json.dumps({"id": recipient_id}),
-                'message': json.dumps({
-                    "attachment": {
-                        "type": "video", 
-                        "payload": {
-                            "is_reusable": True
-                        }
-                    }
-                }),
-                'filedata': (filename, video_data, 'video/mp4')
-            }
-        )
-        
-        # Envoyer la requête
-        response = requests.post(
-            url,
-            data=multipart_data,
-            headers={'Content-Type': multipart_data.content_type},
-            timeout=60
-        )
-        
-        if response.status_code != 200:
-            logger.error(f"Erreur lors de l'upload du fichier: {response.status_code} - {response.text}")
+        attachment_id = upload_video_attachment(video_data, filename, deadline=deadline)
+        if not attachment_id:
             return False
         
-        # Récupérer l'ID de la pièce jointe
-        result = response.json()
-        attachment_id = result.get('attachment_id')
+        send_video_attachment(recipient_id, attachment_id, title)
         
-        if not attachment_id:
-            logger.error(f"Pas d'ID de pièce jointe dans la réponse: {result}")
-            return False
+        logger.info("Fichier vidéo envoyé avec succès")
+        return attachment_id
         
-        # Envoyer le message avec la pièce jointe
-        message_data = {
-            "recipient": {
-                "id": recipient_id
-            },
-            "message": {
+    except Exception as e:
+        logger.error(f"Erreur lors de l'envoi du fichier vidéo: {str(e)}")
+        return False
+
+def upload_video_attachment(video_data, filename, deadline=None):
+    """
+    Téléverse une vidéo comme pièce jointe réutilisable de la page
+    
+    Returns:
+        str: ID de la pièce jointe, ou None en cas d'erreur
+    """
+    # Garder le temps d'envoyer la vidéo (ou le lien en repli) après l'upload
+    upload_deadline = deadline.reserve(DEADLINE_SEND_RESERVE_SECONDS) if deadline is not None else None
+    # L'API Messenger nécessite une URL publique pour les pièces jointes
+    # Nous devons donc utiliser l'API d'upload de pièces jointes
+    
+    url = f"https://graph.facebook.com/v13.0/me/message_attachments?access_token={MESSENGER_PAGE_ACCESS_TOKEN}"
+    
+    # Préparer les données pour l'upload
+    from requests_toolbelt.multipart.encoder import MultipartEncoder
+    
+    multipart_data = MultipartEncoder(
+        fields={
+            'message': json.dumps({
                 "attachment": {
-                    "type": "video",
+                    "type": "video", 
                     "payload": {
-                        "attachment_id": attachment_id
+                        "is_reusable": True
                     }
                 }
+            }),
+            'filedata': (filename, video_data, 'video/mp4')
+        }
+    )
+    
+    # Envoyer la requête (priorité basse, pas de nouvelle tentative: le flux est consommé).
+    # L'upload s'exécute dans ce thread: les workers d'envoi restent libres pour le texte
+    response = send_scheduler.run(
+        lambda: http_client.post(
+            url,
+            endpoint='graph_upload',
+            data=multipart_data,
+            headers={'Content-Type': multipart_data.content_type},
+            deadline=upload_deadline
+        ),
+        priority=PRIORITY_MEDIA,
+        token_key=MESSENGER_PAGE_ACCESS_TOKEN,
+        max_retries=0,
+        inline=True
+    )
+    
+    if response.status_code != 200:
+        logger.error(f"Erreur lors de l'upload du fichier: {response.status_code} - {response.text}")
+        return None
+    
+    # Récupérer l'ID de la pièce jointe
+    result = response.json()
+    attachment_id = result.get('attachment_id')
+    
+    if not attachment_id:
+        logger.error(f"Pas d'ID de pièce jointe dans la réponse: {result}")
+        return None
+    
+    return attachment_id
+
+def send_video_attachment(recipient_id, attachment_id, title):
+    """
+    Envoie une pièce jointe vidéo déjà téléversée, suivie de son titre
+    """
+    message_data = {
+        "recipient": {
+            "id": recipient_id
+        },
+        "message": {
+            "attachment": {
+                "type": "video",
+                "payload": {
+                    "attachment_id": attachment_id
+                }
             }
         }
-        
+    }
+    
+    # La vidéo et son titre partent dans une seule requête batch
+    with outbound_batch(recipient_id, send_message_batch):
         call_send_api(message_data)
         
         # Envoyer également le titre comme message texte
-        send_text_message(recipient_id, f"Titre: {title}")
-        
-        logger.info("Fichier vidéo envoyé avec succès")
-        return True
-        
-    except Exception as e:
-        logger.error(f"Erreur lors de l'envoi du fichier vidéo: {str(e)}")
-        return False
+        if title:
+            send_text_message(recipient_id, f"Titre: {title}")
 
 def send_text_message(recipient_id, message_text):
     """
     Envoie un message texte à l'utilisateur
     """
     logger.info(f"Début de send_text_message pour recipient_id: {recipient_id}")
-    logger.info(f"Message à envoyer: {message_text}")
+    logger.debug("Message à envoyer: %s", message_text)
     
     # Diviser le message en chunks de 2000 caractères maximum
     chunks = [message_text[i:i+2000] for i in range(0, len(message_text), 2000)]
     
-    for chunk in chunks:
-        message_data = {
-            "recipient": {
-                "id": recipient_id
-            },
-            "message": {
-                "text": chunk
+    # Les chunks sont regroupés en une seule requête batch à la sortie du bloc
+    with outbound_batch(recipient_id, send_message_batch):
+        for chunk in chunks:
+            message_data = {
+                "recipient": {
+                    "id": recipient_id
+                },
+                "message": {
+                    "text": chunk
+                }
             }
-        }
-        
-        try:
-            call_send_api(message_data)
-        except Exception as e:
-            logger.error(f"Erreur lors de l'envoi du message: {str(e)}")
-            raise e
+            
+            try:
+                call_send_api(message_data)
+            except Exception as e:
+                logger.error(f"Erreur lors de l'envoi du message: {str(e)}")
+                raise e
     
     logger.info("Fin de send_text_message")
 
-def call_send_api(message_data):
+def send_sender_action(recipient_id, action):
     """
-    Appelle l'API Send de Facebook pour envoyer des messages
+    Envoie une action d'expéditeur (typing_on, typing_off, mark_seen).
+    Non essentielle: pas de nouvelle tentative et les erreurs sont seulement journalisées.
     """
-    logger.info(f"Début de call_send_api avec message_data: {json.dumps(message_data)}")
-    url = f"https://graph.facebook.com/v13.0/me/messages?access_token={MESSENGER_PAGE_ACCESS_TOKEN}"
+    message_data = {"recipient": {"id": recipient_id}, "sender_action": action}
+    deadline = current_deadline()
+    try:
+        send_scheduler.run(
+            lambda: post_message(message_data, deadline),
+            priority=PRIORITY_TEXT,
+            token_key=MESSENGER_PAGE_ACCESS_TOKEN,
+            max_retries=0
+        )
+    except Exception as e:
+        logger.warning(f"Impossible d'envoyer l'action {action}: {str(e)}")
+
+def send_message_batch(messages, deadline=None):
+    """
+    Envoie plusieurs messages en une seule requête batch de l'API Graph.
+    Chaque opération dépend de la précédente pour garantir l'ordre de livraison;
+    en cas d'échec partiel, les messages restants sont renvoyés un par un.
+    Si le lot a pu être délivré sans que la réponse soit reçue (timeout de lecture,
+    connexion coupée, réponse illisible), l'erreur est levée sans renvoi, pour ne pas
+    doubler les messages.
+    """
+    deadline = deadline or current_deadline()
+    if len(messages) == 1:
+        return [send_message_now(messages[0], deadline=deadline)]
+    
+    operations = []
+    for i, message_data in enumerate(messages):
+        operation = {
+            "method": "POST",
+            "name": f"msg{i}",
+            "relative_url": "v13.0/me/messages",
+            "body": urlencode({
+                "recipient": json.dumps(message_data["recipient"]),
+                "message": json.dumps(message_data["message"])
+            }),
+            "omit_response_on_success": False
+        }
+        if i > 0:
+            operation["depends_on"] = f"msg{i - 1}"
+        operations.append(operation)
     
+    # Un lot de médias (vidéo par URL, récupérée par Graph) peut être long: hors des workers
+    priority = min(message_priority(m) for m in messages)
+    results = []
+    response_body = []
     try:
-        response = requests.post(
-            url,
-            headers={"Content-Type": "application/json"},
-            json=message_data,
-            timeout=30
+        metrics.incr('messenger.batch_requests')
+        metrics.incr('messenger.batched_messages', len(messages))
+        # Pas de nouvelle tentative du lot entier: le repli ci-dessous renvoie les messages un par un
+        response_body = send_scheduler.run(
+            lambda: parse_graph_response(http_client.post(
+                "https://graph.facebook.com",
+                endpoint='graph_send',
+                data={
+                    "access_token": MESSENGER_PAGE_ACCESS_TOKEN,
+                    "batch": json.dumps(operations),
+                    "include_headers": "false"
+                },
+                deadline=deadline
+            )),
+            priority=priority,
+            token_key=MESSENGER_PAGE_ACCESS_TOKEN,
+            max_retries=0,
+            inline=priority == PRIORITY_MEDIA
+        )
+    except Exception as e:
+        if not batch_not_sent(e):
+            metrics.incr('messenger.batch_ambiguous')
+            logger.error(f"Lot de messages peut-être délivré, pas de renvoi: {str(e)}")
+            raise
+        logger.error(f"Erreur lors de l'envoi du lot de messages: {str(e)}")
+    
+    # Résultats par opération: celles qui suivent un échec n'ont pas été exécutées
+    for item in response_body:
+        body = json.loads(item['body']) if item and item.get('body') else {}
+        if not item or item.get('code') != 200 or 'error' in body:
+            logger.warning(f"Échec de l'opération {len(results)} du lot: {item}")
+            break
+        results.append(body)
+    
+    # Repli: renvoyer individuellement, dans l'ordre, les messages non confirmés
+    if len(results) < len(messages):
+        metrics.incr('messenger.batch_fallbacks')
+        for message_data in messages[len(results):]:
+            results.append(send_message_now(message_data, deadline=deadline))
+    
+    return results
+
+def batch_not_sent(error):
+    """
+    Indique si un lot n'a certainement pas été délivré: refusé avant l'envoi (file pleine,
+    budget épuisé, connexion impossible) ou rejeté en entier par Graph avec une erreur explicite
+    """
+    if isinstance(error, GraphAPIError):
+        # Sans code, la réponse était illisible (passerelle, coupure): Graph a pu exécuter le lot
+        return error.code is not None
+    return isinstance(error, (SendQueueFull, DeadlineExceeded)) or is_retryable(error)
+
+def call_send_api(message_data, deadline=None):
+    """
+    Appelle l'API Send de Facebook pour envoyer des messages.
+    Dans un bloc outbound_batch, le message est mis en attente et envoyé avec le lot.
+    Le timeout de l'appel est borné par le budget de temps (deadline, ou celui du thread courant).
+    """
+    batch = current_batch()
+    if batch is not None and batch.accepts(message_data):
+        batch.add(message_data)
+        return None
+    
+    return send_message_now(message_data, deadline=deadline or current_deadline())
+
+def send_message_now(message_data, deadline=None):
+    """
+    Envoie immédiatement un message via l'API Send, à travers l'ordonnanceur d'envoi
+    (limitation de débit par page et nouvelles tentatives sur les erreurs temporaires)
+    """
+    logger.debug("Début de send_message_now avec message_data: %s", lazy_json(message_data))
+    deadline = deadline or current_deadline()
+    priority = message_priority(message_data)
+    
+    try:
+        # Un média envoyé par URL est récupéré par Graph pendant l'appel: hors des workers
+        response_body = send_scheduler.run(
+            lambda: post_message(message_data, deadline),
+            priority=priority,
+            token_key=MESSENGER_PAGE_ACCESS_TOKEN,
+            inline=priority == PRIORITY_MEDIA
         )
-        
-        logger.info(f"Réponse reçue de l'API Facebook. Status: {response.status_code}")
-        
-        response_body = response.json()
-        logger.info(f"Réponse de l'API Facebook: {json.dumps(response_body)}")
-        
-        if 'error' in response_body:
-            logger.error(f"Erreur lors de l'appel à l'API Send: {response_body['error']}")
-            raise Exception(response_body['error']['message'])
         
         logger.info("Message envoyé avec succès")
         return response_body
     except Exception as e:
         logger.error(f"Erreur lors de l'appel à l'API Facebook: {str(e)}")
         raise e
+
+def post_message(message_data, deadline=None):
+    """
+    Effectue l'appel HTTP à l'API Send
+    """
+    url = f"https://graph.facebook.com/v13.0/me/messages?access_token={MESSENGER_PAGE_ACCESS_TOKEN}"
+    
+    response = http_client.post(
+        url,
+        endpoint='graph_send',
+        headers={"Content-Type": "application/json"},
+        json=message_data,
+        deadline=deadline
+    )
+    
+    logger.info(f"Réponse reçue de l'API Facebook. Status: {response.status_code}")
+    response_body = parse_graph_response(response)
+    logger.debug("Réponse de l'API Facebook: %s", lazy_json(response_body))
+    return response_body
+
+def parse_graph_response(response):
+    """
+    Décode la réponse de l'API Graph et lève GraphAPIError en cas d'erreur
+    """
+    try:
+        response_body = response.json()
+    except ValueError:
+        raise GraphAPIError({'message': f"Réponse invalide de l'API Graph (status {response.status_code})"},
+                            response.status_code)
+    
+    if isinstance(response_body, dict) and 'error' in response_body:
+        logger.error(f"Erreur lors de l'appel à l'API Send: {response_body['error']}")
+        raise GraphAPIError(response_body['error'], response.status_code)
+    
+    return response_body
+
+def message_priority(message_data):
+    """
+    Priorité d'envoi d'un message: texte, puis modèles (carrousels), puis médias
+    """
+    attachment = (message_data.get('message') or {}).get('attachment')
+    if not attachment:
+        return PRIORITY_TEXT
+    if attachment.get('type') == 'template':
+        return PRIORITY_TEMPLATE
+    return PRIORITY_MEDIA
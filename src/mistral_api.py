@@ -3,97 +3,691 @@ import requests
 import json
 import logging
 import signal
-from src.config import MISTRAL_API_KEY
+import time
+import hashlib
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
+from contextlib import contextmanager
+from src.config import (
+    MISTRAL_API_KEY, MISTRAL_CACHE_ENABLED, MISTRAL_CACHE_TTL, MISTRAL_CACHE_SIZE,
+    MISTRAL_SIMILARITY_THRESHOLD, MISTRAL_SIMILARITY_CACHE_SIZE, DEADLINE_SEND_RESERVE_SECONDS,
+    MISTRAL_ROUTING_ENABLED, MISTRAL_MODEL_SMALL, MISTRAL_MODEL_MEDIUM, MISTRAL_MODEL_LARGE,
+    MISTRAL_ROUTE_MAX_P95, MISTRAL_BREAKER_THRESHOLD, MISTRAL_BREAKER_RESET_SECONDS,
+    MISTRAL_MAX_CONCURRENCY, MISTRAL_CONCURRENCY_WAIT, MISTRAL_HEDGING, CONVERSATION_TOKEN_BUDGET
+)
+from src.http_client import http_client
+from src.cache_store import TwoTierCache
+from src.conversation import conversation_memory
+from src.faq import faq_index
+from src.utils.minhash import SimilarityCache
+from src.utils.metrics import metrics
+from src.utils.deadline import current_deadline, DeadlineExceeded
+from src.utils.resilience import CircuitBreaker, ConcurrencyLimiter
+from src.utils.singleflight import SingleFlight
+from src.utils.text_processing import similarity_shingles, extract_numbers, extract_keywords, MessageChunker
 
 logger = logging.getLogger(__name__)
 
+MISTRAL_MODEL = MISTRAL_MODEL_LARGE
+MISTRAL_MAX_TOKENS = 1000
+MISTRAL_CHAT_URL = "https://api.mistral.ai/v1/chat/completions"
+# Taille maximale d'un message texte Messenger
+MESSAGE_MAX_CHARS = 2000
+# Temps minimal pour qu'une génération ait une chance d'aboutir
+MISTRAL_MIN_BUDGET_SECONDS = 5
+TIMEOUT_RESPONSE = "Désolé, la génération de la réponse a pris trop de temps. Veuillez réessayer avec une question plus courte ou plus simple."
+UNAVAILABLE_RESPONSE = "Je suis désolé, je ne peux pas accéder à mon service de réponse en ce moment. Vous pouvez essayer le mode YouTube en tapant '/yt'."
+
+# Après plusieurs timeouts ou erreurs 5xx consécutifs, répondre tout de suite sans appeler l'API
+mistral_breaker = CircuitBreaker('mistral', MISTRAL_BREAKER_THRESHOLD, MISTRAL_BREAKER_RESET_SECONDS)
+completion_limiter = ConcurrencyLimiter('mistral', MISTRAL_MAX_CONCURRENCY)
+_hedge_executor = ThreadPoolExecutor(max_workers=2 * MISTRAL_MAX_CONCURRENCY, thread_name_prefix='mistral-hedge')
+
+
+class MistralUnavailable(Exception):
+    """
+    Appel refusé sans contacter l'API: circuit ouvert ou trop d'appels en cours
+    """
+
+
+class CallOutcome:
+    """
+    Résultat d'un appel protégé, à renseigner par l'appelant pour le disjoncteur
+    """
+    __slots__ = ('failed',)
+
+    def __init__(self):
+        self.failed = None
+
+    def record_status(self, status_code):
+        # Les erreurs du service (5xx, limitation de débit) comptent comme des échecs
+        self.failed = status_code >= 500 or status_code == 429
+
+# Cache des réponses: les messages d'erreur et de repli ne sont jamais mis en cache
+response_cache = TwoTierCache('mistral_responses', 'mistral_responses',
+                              ttl=MISTRAL_CACHE_TTL, maxsize=MISTRAL_CACHE_SIZE)
+_cache_settings = {'enabled': MISTRAL_CACHE_ENABLED}
+
+# Générations en cours, par clé de cache: un prompt identique attend la réponse déjà demandée
+completion_flight = SingleFlight('mistral')
+
+# Prompts reformulés (ponctuation, accents, ordre des mots): réponse d'un prompt similaire
+similar_response_cache = SimilarityCache(
+    maxsize=MISTRAL_SIMILARITY_CACHE_SIZE,
+    threshold=MISTRAL_SIMILARITY_THRESHOLD,
+    ttl=MISTRAL_CACHE_TTL
+)
+# En dessous, le prompt est trop court pour que la similarité soit fiable
+SIMILARITY_MIN_SHINGLES = 4
+
+# Questions sur le créateur du bot, auxquelles on répond sans appeler l'API
+CREATOR_PATTERNS = (
+    r"qui (?:t['’]a|ta|t as) (?:créé|cree|construit|développé|developpe|conçu|concu|fabriqué|fabrique|inventé|invente)",
+    r"par qui as[- ]?tu (?:été|ete) (?:créé|cree|développé|developpe|construit|conçu|concu)",
+    r"qui est (?:ton|responsable de|derrière|derriere) (?:créateur|createur|développeur|developpeur|toi)",
+    r"d['’ ]?o[uù] viens[- ]?tu",
+)
+CREATOR_RESPONSE = "J'ai été créé par Djamaldine Montana avec l'aide de Mistral. C'est un développeur talentueux qui m'a conçu pour aider les gens comme vous !"
+# Sans IGNORECASE, qui empêche le préfiltrage du moteur: le texte est passé en minuscules
+_creator_question = re.compile('|'.join(f'(?:{p})' for p in CREATOR_PATTERNS))
+
 def check_creator_question(prompt):
     """
     Vérifie si la question concerne le créateur du bot
     """
-    prompt = prompt.lower()
-    patterns = [
-        r"qui (t'a|ta|t as) (créé|cree|construit|développé|developpe|conçu|concu|fabriqué|fabrique|inventé|invente)",
-        r"par qui as[- ]?tu (été|ete) (créé|cree|développé|developpe|construit|conçu|concu)",
-        r"qui est (ton|responsable de|derrière|derriere) (créateur|createur|développeur|developpeur|toi)",
-        r"d['oòo]u viens[- ]?tu"
+    return _creator_question.search(prompt.lower()) is not None
+
+# Niveaux de modèles, du plus rapide au plus capable
+MODEL_TIERS = ('small', 'medium', 'large')
+TIER_MODELS = {'small': MISTRAL_MODEL_SMALL, 'medium': MISTRAL_MODEL_MEDIUM, 'large': MISTRAL_MODEL_LARGE}
+
+# Longueur de réponse visée par intention (caractères), dans la limite de 2 messages Messenger
+INTENT_REPLY_CHARS = {'chat': 600, 'factual': 2000, 'reasoning': 4000}
+# Approximation du nombre de caractères par token pour du texte en français
+CHARS_PER_TOKEN = 4
+
+INTENT_PATTERNS = (
+    ('reasoning', re.compile(
+        r"\b(explique|expliquer|pourquoi|démontre|demontre|calcule|résous|resous|analyse|compare|"
+        r"rédige|redige|dissertation|résume|resume|traduis|corrige|code|programme|algorithme|étape|etape)",
+        re.IGNORECASE)),
+    ('chat', re.compile(
+        r"^\W*(salut|bonjour|bonsoir|coucou|hello|hey|merci|ok|d'accord|ça va|ca va|comment (vas|va|allez)[- ]?(tu|vous)?|"
+        r"qui es[- ]?tu|au revoir|bonne (nuit|journée|journee))\b",
+        re.IGNORECASE)),
+)
+
+
+class ModelRoute:
+    """
+    Choix du modèle et du nombre maximal de tokens pour une requête
+    """
+    __slots__ = ('tier', 'model', 'max_tokens', 'intent')
+
+    def __init__(self, tier, max_tokens, intent):
+        self.tier = tier
+        self.model = TIER_MODELS[tier]
+        self.max_tokens = max_tokens
+        self.intent = intent
+
+    @property
+    def reply_chars(self):
+        return self.max_tokens * CHARS_PER_TOKEN
+
+    def __repr__(self):
+        return f"ModelRoute({self.tier}, {self.model}, max_tokens={self.max_tokens}, intent={self.intent})"
+
+
+DEFAULT_ROUTE = ModelRoute('large', MISTRAL_MAX_TOKENS, 'reasoning')
+
+
+def detect_intent(prompt):
+    """
+    Intention approximative du prompt: 'chat' (salutations, bavardage), 'reasoning'
+    (explication, calcul, rédaction) ou 'factual' (question simple)
+    """
+    for intent, pattern in INTENT_PATTERNS:
+        if pattern.search(prompt):
+            return intent
+    return 'factual'
+
+
+def route_latency_p95(tier):
+    return metrics.percentile(f'mistral.route.{tier}.latency_seconds', 95)
+
+
+def route_prompt(prompt, deadline=None):
+    """
+    Choisit le modèle selon la longueur du prompt, son intention et le p95 de latence
+    observé par modèle; max_tokens suit la longueur de réponse utile dans Messenger
+    """
+    if not MISTRAL_ROUTING_ENABLED:
+        return DEFAULT_ROUTE
+
+    intent = detect_intent(prompt)
+    if intent == 'reasoning' or len(prompt) > 600:
+        tier = 'large'
+    elif intent == 'chat' and len(prompt) < 80:
+        tier = 'small'
+    else:
+        tier = 'medium'
+
+    # Modèle lent en ce moment (ou plus lent que le budget restant): descendre d'un niveau
+    index = MODEL_TIERS.index(tier)
+    while index > 0:
+        p95 = route_latency_p95(MODEL_TIERS[index])
+        limit = MISTRAL_ROUTE_MAX_P95
+        if deadline is not None:
+            limit = min(limit, deadline.remaining())
+        if p95 is None or p95 <= limit:
+            break
+        metrics.incr(f'mistral.route.{MODEL_TIERS[index]}.downgraded')
+        index -= 1
+
+    max_tokens = min(MISTRAL_MAX_TOKENS, INTENT_REPLY_CHARS[intent] // CHARS_PER_TOKEN)
+    return ModelRoute(MODEL_TIERS[index], max_tokens, intent)
+
+
+def build_messages(prompt, route, context=None):
+    """
+    Messages de la requête: une consigne de longueur évite une réponse tronquée par max_tokens.
+    context: messages de l'historique de la conversation (voir context_messages)
+    """
+    return [
+        {"role": "system", "content": f"Réponds en {route.reply_chars} caractères au maximum."},
+        *(context or []),
+        {"role": "user", "content": prompt}
     ]
-    
-    for pattern in patterns:
-        if re.search(pattern, prompt):
-            return True
-    
-    return False
 
-def generate_mistral_response(prompt):
+
+# Marqueurs d'une question de suivi: liaison en tête, pronoms de rappel, renvoi à la réponse précédente
+FOLLOW_UP_PATTERNS = (
+    r"^\W*(?:et|mais|donc|alors|sinon)\b",
+    r"(?<!-)\b(?:il|elle|ils|elles|lui|leur|leurs|eux|celui|celle|ceux|celles|ceci|cela|ça|ca)\b",
+    r"-(?:le|la|les|lui|leur|en|y)\b",
+    r"\b(?:aussi|encore|pareil|autre chose|la suite|continue|précédente?|ci-dessus|davantage|plus de détails)\b",
+    r"\b(?:reformule|résume|traduis|simplifie|développe|tu as dit|tu viens de|ta réponse|ton message|ton exemple)\b",
+)
+# Sans IGNORECASE, qui empêche le préfiltrage du moteur: le texte est passé en minuscules
+_follow_up = re.compile('|'.join(f'(?:{p})' for p in FOLLOW_UP_PATTERNS))
+# En dessous, une question est elliptique ("Combien d'habitants ?") et suppose l'historique
+FOLLOW_UP_MAX_KEYWORDS = 2
+
+
+def needs_context(prompt, intent=None):
+    """
+    Indique si la réponse au prompt dépend de l'historique de la conversation.
+    Les salutations et les questions complètes sans marqueur de suivi n'en dépendent pas:
+    elles passent par le cache, commun à tous les expéditeurs.
+    """
+    if intent == 'chat':
+        return False
+    text = prompt.lower()
+    return _follow_up.search(text) is not None or len(extract_keywords(text)) <= FOLLOW_UP_MAX_KEYWORDS
+
+
+def context_messages(conversation, token_budget=CONVERSATION_TOKEN_BUDGET):
+    """
+    Derniers échanges de la conversation tenant dans le budget de tokens, du plus ancien
+    au plus récent; les échanges plus anciens sont remplacés par leur résumé s'il tient encore
+    """
+    budget = token_budget * CHARS_PER_TOKEN
+    messages = []
+    for question, answer in reversed(conversation.turns):
+        size = len(question) + len(answer)
+        if size > budget:
+            break
+        budget -= size
+        messages[:0] = [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+    if conversation.summary and len(conversation.summary) <= budget:
+        budget -= len(conversation.summary)
+        messages.insert(0, {"role": "system", "content": f"Sujets abordés précédemment: {conversation.summary}"})
+    metrics.observe('conversation.context_tokens', token_budget - budget // CHARS_PER_TOKEN)
+    return messages
+
+
+def record_route_usage(route, elapsed, usage=None):
+    """
+    Latence et consommation de tokens par niveau de modèle
+    """
+    metrics.incr(f'mistral.route.{route.tier}.requests')
+    metrics.observe(f'mistral.route.{route.tier}.latency_seconds', elapsed)
+    if usage:
+        metrics.incr(f'mistral.route.{route.tier}.prompt_tokens', usage.get('prompt_tokens', 0))
+        metrics.incr(f'mistral.route.{route.tier}.completion_tokens', usage.get('completion_tokens', 0))
+
+@contextmanager
+def protected_completion(deadline=None):
+    """
+    Encadre un appel à l'API: place dans le plafond d'appels simultanés, disjoncteur,
+    et enregistrement du résultat (timeout ou erreur réseau = échec)
+
+    Raises:
+        MistralUnavailable: si aucune place ne se libère à temps ou si le circuit est ouvert
+    """
+    wait = MISTRAL_CONCURRENCY_WAIT if deadline is None else min(MISTRAL_CONCURRENCY_WAIT, deadline.remaining())
+    if not completion_limiter.acquire(timeout=wait):
+        raise MistralUnavailable("Trop d'appels Mistral en cours")
+    if not mistral_breaker.allow():
+        completion_limiter.release()
+        raise MistralUnavailable("Circuit Mistral ouvert")
+
+    outcome = CallOutcome()
+    try:
+        yield outcome
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+        outcome.failed = True
+        raise
+    finally:
+        completion_limiter.release()
+        if outcome.failed is None:
+            mistral_breaker.release_trial()
+        elif outcome.failed:
+            mistral_breaker.record_failure()
+        else:
+            mistral_breaker.record_success()
+
+def hedge_win_rate():
+    fired = metrics.get_counter('mistral.hedge.fired')
+    return metrics.get_counter('mistral.hedge.hedge_won') / fired if fired else None
+
+metrics.register_gauge('mistral.hedge.win_rate', hedge_win_rate)
+
+def hedge_delay(route):
+    """
+    Délai avant la requête de couverture: le p95 observé du modèle, ou None sans couverture
+    """
+    if not MISTRAL_HEDGING:
+        return None
+    return route_latency_p95(route.tier)
+
+def post_completion(payload, deadline=None):
+    return http_client.post(
+        MISTRAL_CHAT_URL,
+        endpoint='mistral',
+        headers={
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {MISTRAL_API_KEY}"
+        },
+        json=payload,
+        deadline=deadline
+    )
+
+def _close_response(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+def _post_in_extra_slot(payload, deadline):
+    try:
+        return post_completion(payload, deadline)
+    finally:
+        completion_limiter.release()
+
+def post_completion_hedged(route, payload, deadline=None):
+    """
+    Envoie la requête; si elle n'a pas répondu au bout du p95 observé, en lance une seconde
+    identique et garde la première réponse exploitable. La requête perdante n'est pas annulée
+    (requests ne le permet pas), sa réponse est simplement fermée.
+    """
+    delay = hedge_delay(route)
+    if delay is None:
+        return post_completion(payload, deadline)
+
+    primary = _hedge_executor.submit(post_completion, payload, deadline)
+    try:
+        return primary.result(timeout=delay)
+    except FutureTimeout:
+        pass
+
+    # La couverture occupe sa propre place: pas de couverture si le plafond est atteint
+    if not completion_limiter.acquire(timeout=0):
+        return primary.result()
+    metrics.incr('mistral.hedge.fired')
+    hedge = _hedge_executor.submit(_post_in_extra_slot, payload, deadline)
+
+    names = {primary: 'primary', hedge: 'hedge'}
+    error = None
+    server_error = None
+    for future in as_completed(names):
+        try:
+            response = future.result()
+        except Exception as e:
+            error = e
+            continue
+        if response.status_code >= 500 and server_error is None:
+            # Attendre l'autre requête avant de conclure à une erreur du service
+            server_error = response
+            continue
+        metrics.incr(f'mistral.hedge.{names[future]}_won')
+        other = hedge if future is primary else primary
+        other.add_done_callback(_close_response)
+        return response
+    if server_error is not None:
+        return server_error
+    raise error
+
+def normalize_prompt(prompt):
+    """
+    Normalise un prompt pour la clé de cache: casse, espaces et ponctuation finale
+    """
+    text = unicodedata.normalize('NFC', prompt).lower()
+    text = ' '.join(text.split())
+    return text.rstrip(' ?!.')
+
+def response_cache_key(prompt, model=MISTRAL_MODEL, max_tokens=MISTRAL_MAX_TOKENS):
+    raw = f"{model}|{max_tokens}|{normalize_prompt(prompt)}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def set_response_cache_enabled(enabled):
+    """
+    Active ou désactive le cache des réponses (commande d'administration)
+    """
+    _cache_settings['enabled'] = enabled
+    logger.info(f"Cache des réponses Mistral {'activé' if enabled else 'désactivé'}")
+
+def flush_response_cache():
+    """
+    Vide le cache des réponses (commande d'administration)
+    """
+    response_cache.flush()
+    similar_response_cache.clear()
+    logger.info("Cache des réponses Mistral vidé")
+
+def response_cache_stats():
+    return {
+        'enabled': _cache_settings['enabled'],
+        'hit_rate': response_cache.hit_rate(),
+        'entries': len(response_cache._memory),
+        'similar_entries': len(similar_response_cache)
+    }
+
+def find_similar_response(prompt):
+    """
+    Cherche la réponse d'un prompt déjà vu quasi identique (MinHash sur les mots-clés)
+    """
+    if MISTRAL_SIMILARITY_THRESHOLD <= 0:
+        return None
+    shingles = similarity_shingles(prompt)
+    if len(shingles) < SIMILARITY_MIN_SHINGLES:
+        return None
+    match = similar_response_cache.get(shingles, namespace=' '.join(extract_numbers(prompt)))
+    if match is None:
+        metrics.incr('cache.mistral_similar.misses')
+        return None
+    response, score = match
+    metrics.incr('cache.mistral_similar.hits')
+    logger.info(f"Réponse Mistral servie depuis un prompt similaire (similarité {score:.2f})")
+    return response
+
+def remember_similar_response(prompt, response):
+    if MISTRAL_SIMILARITY_THRESHOLD <= 0:
+        return
+    shingles = similarity_shingles(prompt)
+    if len(shingles) >= SIMILARITY_MIN_SHINGLES:
+        similar_response_cache.set(shingles, response, namespace=' '.join(extract_numbers(prompt)))
+
+def deliver_messages(text, on_message):
+    """
+    Transmet un texte déjà complet à on_message, découpé en messages de MESSAGE_MAX_CHARS au plus
+    """
+    if on_message is not None:
+        chunker = MessageChunker(max_chars=MESSAGE_MAX_CHARS)
+        for message in chunker.feed(text) + chunker.flush():
+            on_message(message)
+    return text
+
+def generate_mistral_response(prompt, use_cache=True, on_message=None, deadline=None, sender_id=None):
     """
     Génère une réponse en utilisant l'API Mistral
+
+    Les réponses valides sont mises en cache (clé: prompt normalisé, modèle et max_tokens).
+    use_cache=False force un appel à l'API sans lire ni écrire le cache.
+
+    Si on_message est fourni, la réponse est générée en flux et chaque paragraphe complet
+    est transmis à on_message dès sa réception (messages d'erreur compris); la fonction
+    retourne alors le texte complet.
+
+    deadline: budget de temps de la requête (à défaut, celui du thread courant). Le timeout
+    de l'appel est borné par le temps restant moins le temps nécessaire à l'envoi de la réponse;
+    si le budget est insuffisant, un message d'excuse est retourné sans appeler l'API.
+
+    sender_id: expéditeur qui mémorise l'échange. Son historique de conversation n'est ajouté
+    au prompt (dans la limite de CONVERSATION_TOKEN_BUDGET) que pour une question de suivi
+    (voir needs_context); une telle réponse n'est ni lue ni écrite dans le cache.
     """
-    logger.info(f"Début de generate_mistral_response pour prompt: {prompt}")
+    logger.info("Début de generate_mistral_response pour prompt: %.200s", prompt)
     
-    # Vérifier si la question concerne le créateur
-    if check_creator_question(prompt):
-        logger.info("Question sur le créateur détectée. Réponse personnalisée envoyée.")
-        return "J'ai été créé par Djamaldine Montana avec l'aide de Mistral. C'est un développeur talentueux qui m'a conçu pour aider les gens comme vous !"
+    # Questions fréquentes sur le bot (créateur compris, déjà filtré par le routeur
+    # d'intentions en amont): réponse locale sans appel à l'API
+    faq_answer = faq_index.answer(prompt)
+    if faq_answer is not None:
+        logger.info("Réponse servie depuis la FAQ")
+        return deliver_messages(faq_answer, on_message)
     
     # Vérifier si la clé API est définie
     if not MISTRAL_API_KEY:
         logger.error("Erreur: MISTRAL_API_KEY n'est pas définie")
-        return "Je suis désolé, mais je ne peux pas répondre pour le moment car ma configuration n'est pas complète. Veuillez contacter l'administrateur."
-    
+        return deliver_messages("Je suis désolé, mais je ne peux pas répondre pour le moment car ma configuration n'est pas complète. Veuillez contacter l'administrateur.", on_message)
+
+    deadline = deadline or current_deadline()
+    route = route_prompt(prompt, deadline)
+    logger.info(f"Routage Mistral: {route}")
+
+    context = None
+    if sender_id and needs_context(prompt, route.intent):
+        conversation = conversation_memory.get(sender_id)
+        context = context_messages(conversation) if conversation else None
+
+    use_cache = use_cache and _cache_settings['enabled'] and not context
+    cache_key = response_cache_key(prompt, route.model, route.max_tokens)
+    if use_cache:
+        cached = response_cache.get(cache_key)
+        if cached is None:
+            cached = find_similar_response(prompt)
+        else:
+            logger.info("Réponse Mistral servie depuis le cache")
+        if cached is not None:
+            if sender_id:
+                conversation_memory.append(sender_id, prompt, cached)
+            return deliver_messages(cached, on_message)
+
+    if deadline is not None:
+        # Garder le temps d'envoyer la réponse
+        deadline = deadline.reserve(DEADLINE_SEND_RESERVE_SECONDS)
+        if not deadline.has(MISTRAL_MIN_BUDGET_SECONDS):
+            logger.warning(f"Budget insuffisant pour appeler Mistral ({deadline.remaining():.1f}s restantes)")
+            metrics.incr('deadline.mistral_skipped')
+            return deliver_messages(TIMEOUT_RESPONSE, on_message)
+
+    if on_message is not None:
+        # En flux, chaque appelant garde son propre flux de messages
+        generated_response, success = stream_completion(prompt, on_message, route=route, deadline=deadline,
+                                                        context=context)
+    elif use_cache:
+        # Même prompt déjà en cours de génération: partager l'appel au lieu d'en lancer un second
+        try:
+            (generated_response, success), shared = completion_flight.do(
+                cache_key,
+                lambda: request_completion(prompt, route=route, deadline=deadline),
+                timeout=deadline.remaining() if deadline is not None else None
+            )
+        except TimeoutError:
+            return TIMEOUT_RESPONSE
+        if shared:
+            if success and sender_id:
+                conversation_memory.append(sender_id, prompt, generated_response)
+            return generated_response
+    else:
+        generated_response, success = request_completion(prompt, route=route, deadline=deadline, context=context)
+    if success and use_cache:
+        response_cache.set(cache_key, generated_response)
+        remember_similar_response(prompt, generated_response)
+    if success and sender_id:
+        conversation_memory.append(sender_id, prompt, generated_response)
+    return generated_response
+
+def request_completion(prompt, route=DEFAULT_ROUTE, deadline=None, context=None):
+    """
+    Appelle l'API Mistral avec le modèle et max_tokens de la route
+
+    Returns:
+        tuple: (texte de la réponse ou message d'erreur, True si la réponse est valide)
+    """
+    started = time.monotonic()
     try:
         logger.info("Envoi de la requête à l'API Mistral...")
         
-        # Utiliser requests avec timeout au lieu de signal (qui peut ne pas fonctionner sur Vercel)
-        response = requests.post(
-            "https://api.mistral.ai/v1/chat/completions",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {MISTRAL_API_KEY}"
-            },
-            json={
-                "model": "mistral-large-latest",
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": 1000
-            },
-            timeout=45  # 45 secondes de timeout
-        )
+        # Utiliser le client HTTP partagé avec timeout au lieu de signal (qui peut ne pas fonctionner sur Vercel)
+        with protected_completion(deadline) as outcome:
+            response = post_completion_hedged(route, {
+                "model": route.model,
+                "messages": build_messages(prompt, route, context),
+                "max_tokens": route.max_tokens
+            }, deadline)
+            outcome.record_status(response.status_code)
         
         logger.info(f"Réponse reçue de l'API Mistral. Status: {response.status_code}")
         
         # Log du corps de la réponse pour le débogage
         response_text = response.text
-        logger.info(f"Corps de la réponse: {response_text[:500]}...")
+        logger.debug("Corps de la réponse: %.500s...", response_text)
         
         if response.status_code != 200:
             logger.error(f"Erreur API Mistral: {response.status_code} - {response_text}")
-            return f"Désolé, l'API Mistral a retourné une erreur (code {response.status_code}). Veuillez réessayer plus tard."
+            return f"Désolé, l'API Mistral a retourné une erreur (code {response.status_code}). Veuillez réessayer plus tard.", False
         
         try:
             data = response.json()
             logger.info("Réponse JSON analysée avec succès")
+            record_route_usage(route, time.monotonic() - started, data.get('usage'))
             
             if 'choices' not in data or len(data['choices']) == 0:
                 logger.error(f"Format de réponse inattendu: {data}")
-                return "Désolé, j'ai reçu une réponse dans un format inattendu. Veuillez réessayer."
+                return "Désolé, j'ai reçu une réponse dans un format inattendu. Veuillez réessayer.", False
             
             generated_response = data['choices'][0]['message']['content']
             
             if len(generated_response) > 4000:
                 generated_response = generated_response[:4000] + "... (réponse tronquée)"
             
-            logger.info(f"Réponse générée: {generated_response[:100]}...")
-            return generated_response
+            logger.debug("Réponse générée: %.100s...", generated_response)
+            return generated_response, True
         except ValueError as e:
             logger.error(f"Erreur lors de l'analyse JSON: {str(e)}")
-            return "Désolé, j'ai rencontré une erreur lors du traitement de la réponse. Veuillez réessayer."
+            return "Désolé, j'ai rencontré une erreur lors du traitement de la réponse. Veuillez réessayer.", False
             
-    except requests.exceptions.Timeout:
+    except (requests.exceptions.Timeout, DeadlineExceeded):
         logger.error("Timeout lors de la requête à l'API Mistral")
-        return "Désolé, la génération de la réponse a pris trop de temps. Veuillez réessayer avec une question plus courte ou plus simple."
+        # Compter le temps perdu dans la latence du modèle pour que le routage l'évite
+        record_route_usage(route, time.monotonic() - started)
+        return TIMEOUT_RESPONSE, False
+    except MistralUnavailable as e:
+        logger.warning(f"Appel à Mistral refusé: {str(e)}")
+        return UNAVAILABLE_RESPONSE, False
     except requests.exceptions.RequestException as e:
         logger.error(f"Erreur de requête HTTP: {str(e)}")
-        return "Désolé, je n'ai pas pu me connecter à l'API Mistral. Veuillez vérifier votre connexion et réessayer."
+        return "Désolé, je n'ai pas pu me connecter à l'API Mistral. Veuillez vérifier votre connexion et réessayer.", False
     except Exception as e:
         logger.error(f"Erreur inattendue: {str(e)}", exc_info=True)
-        return "Je suis désolé, mais j'ai rencontré une erreur inattendue. Veuillez réessayer plus tard."
+        return "Je suis désolé, mais j'ai rencontré une erreur inattendue. Veuillez réessayer plus tard.", False
+
+def stream_completion(prompt, on_message, route=DEFAULT_ROUTE, deadline=None, context=None):
+    """
+    Appelle l'API Mistral en flux (server-sent events) et transmet à on_message chaque
+    paragraphe complet dès sa réception. Les messages d'erreur sont aussi transmis.
+    Le flux est interrompu à l'expiration du budget de temps (deadline).
+
+    Returns:
+        tuple: (texte complet ou message d'erreur, True si la réponse est complète et valide)
+    """
+    chunker = MessageChunker(max_chars=MESSAGE_MAX_CHARS)
+    parts = []
+    sent = 0
+    usage = None
+    started = time.monotonic()
+
+    def emit(messages):
+        nonlocal sent
+        for message in messages:
+            if sent == 0:
+                metrics.observe('mistral.time_to_first_message_seconds', time.monotonic() - started)
+            on_message(message)
+            sent += 1
+
+    error_message = None
+    try:
+        logger.info("Envoi de la requête en flux à l'API Mistral...")
+        with protected_completion(deadline) as outcome:
+            response = http_client.post(
+                MISTRAL_CHAT_URL,
+                endpoint='mistral_stream',
+                headers={
+                    "Content-Type": "application/json",
+                    "Accept": "text/event-stream",
+                    "Authorization": f"Bearer {MISTRAL_API_KEY}"
+                },
+                json={
+                    "model": route.model,
+                    "messages": build_messages(prompt, route, context),
+                    "max_tokens": route.max_tokens,
+                    "stream": True
+                },
+                stream=True,
+                deadline=deadline
+            )
+            outcome.record_status(response.status_code)
+            try:
+                if response.status_code != 200:
+                    logger.error(f"Erreur API Mistral: {response.status_code} - {response.text}")
+                    error_message = f"Désolé, l'API Mistral a retourné une erreur (code {response.status_code}). Veuillez réessayer plus tard."
+                else:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith('data:'):
+                            continue
+                        data = line[len('data:'):].strip()
+                        if data == '[DONE]':
+                            break
+                        if deadline is not None and deadline.expired():
+                            raise DeadlineExceeded("Budget de temps épuisé pendant le flux Mistral")
+                        event = json.loads(data)
+                        # Le dernier événement du flux porte la consommation de tokens
+                        usage = event.get('usage') or usage
+                        choices = event.get('choices') or []
+                        delta = (choices[0].get('delta') or {}).get('content') if choices else None
+                        if not delta:
+                            continue
+                        parts.append(delta)
+                        emit(chunker.feed(delta))
+            finally:
+                response.close()
+    except (requests.exceptions.Timeout, DeadlineExceeded):
+        logger.error("Timeout lors de la lecture du flux de l'API Mistral")
+        error_message = TIMEOUT_RESPONSE
+        record_route_usage(route, time.monotonic() - started)
+    except MistralUnavailable as e:
+        logger.warning(f"Appel à Mistral refusé: {str(e)}")
+        error_message = UNAVAILABLE_RESPONSE
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Erreur de requête HTTP: {str(e)}")
+        error_message = "Désolé, je n'ai pas pu me connecter à l'API Mistral. Veuillez vérifier votre connexion et réessayer."
+    except Exception as e:
+        logger.error(f"Erreur inattendue pendant le flux Mistral: {str(e)}", exc_info=True)
+        error_message = "Je suis désolé, mais j'ai rencontré une erreur inattendue. Veuillez réessayer plus tard."
+
+    # Envoyer ce qui a déjà été généré, même si le flux a été interrompu
+    emit(chunker.flush())
+    generated_response = ''.join(parts)
+
+    if error_message is None and not generated_response:
+        logger.error("Flux Mistral terminé sans contenu")
+        error_message = "Désolé, j'ai reçu une réponse dans un format inattendu. Veuillez réessayer."
+    if error_message is not None:
+        if sent:
+            error_message = "(Réponse interrompue) " + error_message
+        emit([error_message])
+        return error_message, False
+
+    record_route_usage(route, time.monotonic() - started, usage)
+    metrics.observe('mistral.stream_messages', sent)
+    logger.debug("Réponse générée en flux: %.100s...", generated_response)
+    return generated_response, True
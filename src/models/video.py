@@ -2,12 +2,16 @@ from datetime import datetime
 from src.database import Database
 
 class Video:
-    def __init__(self, video_id=None, title=None, cloudinary_url=None, thumbnail=None, file_size=None):
+    def __init__(self, video_id=None, title=None, cloudinary_url=None, thumbnail=None, file_size=None,
+                 attachment_id=None, attachment_page_id=None):
         self.video_id = video_id
         self.title = title
         self.cloudinary_url = cloudinary_url
         self.thumbnail = thumbnail
         self.file_size = file_size
+        # Pièce jointe Messenger réutilisable et page à laquelle elle appartient
+        self.attachment_id = attachment_id
+        self.attachment_page_id = attachment_page_id
         self.collection = Database.get_instance().get_collection('videos')
     
     def save(self):
@@ -17,6 +21,8 @@ class Video:
             'cloudinaryUrl': self.cloudinary_url,
             'thumbnail': self.thumbnail,
             'fileSize': self.file_size,
+            'attachmentId': self.attachment_id,
+            'attachmentPageId': self.attachment_page_id,
             'createdAt': datetime.now()
         }
         
@@ -41,5 +47,62 @@ class Video:
             title=video_data.get('title'),
             cloudinary_url=video_data.get('cloudinaryUrl'),
             thumbnail=video_data.get('thumbnail'),
-            file_size=video_data.get('fileSize')
-        )
\ No newline at end of file
+            file_size=video_data.get('fileSize'),
+            attachment_id=video_data.get('attachmentId'),
+            attachment_page_id=video_data.get('attachmentPageId')
+        )
+    
+    @classmethod
+    def save_attachment(cls, video_id, attachment_id, page_id, title=None):
+        """
+        Enregistre l'ID de pièce jointe Messenger d'une vidéo sans écraser les autres champs
+        """
+        collection = Database.get_instance().get_collection('videos')
+        fields = {
+            'attachmentId': attachment_id,
+            'attachmentPageId': page_id,
+            'attachmentSavedAt': datetime.now()
+        }
+        if title:
+            fields['title'] = title
+        
+        result = collection.update_one(
+            {'videoId': video_id},
+            {'$set': fields, '$setOnInsert': {'createdAt': datetime.now()}},
+            upsert=True
+        )
+        
+        return result.acknowledged
+    
+    @classmethod
+    def save_cloudinary_url(cls, video_id, cloudinary_url, title=None, file_size=None):
+        """
+        Enregistre l'URL Cloudinary d'une vidéo sans écraser les autres champs
+        """
+        collection = Database.get_instance().get_collection('videos')
+        fields = {'cloudinaryUrl': cloudinary_url}
+        if title:
+            fields['title'] = title
+        if file_size:
+            fields['fileSize'] = file_size
+        
+        result = collection.update_one(
+            {'videoId': video_id},
+            {'$set': fields, '$setOnInsert': {'createdAt': datetime.now()}},
+            upsert=True
+        )
+        
+        return result.acknowledged
+    
+    @classmethod
+    def clear_attachment(cls, video_id):
+        """
+        Oublie l'ID de pièce jointe d'une vidéo (refusé par l'API Graph)
+        """
+        collection = Database.get_instance().get_collection('videos')
+        result = collection.update_one(
+            {'videoId': video_id},
+            {'$unset': {'attachmentId': '', 'attachmentPageId': '', 'attachmentSavedAt': ''}}
+        )
+        
+        return result.acknowledged
\ No newline at end of file
@@ -0,0 +1,60 @@
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class OutboundBatch:
+    """
+    Messages en attente d'envoi pour un destinataire, dans l'ordre de livraison
+    """
+
+    def __init__(self, recipient_id):
+        self.recipient_id = recipient_id
+        self.messages = []
+
+    def accepts(self, message_data):
+        return (message_data.get('recipient') or {}).get('id') == self.recipient_id
+
+    def add(self, message_data):
+        self.messages.append(message_data)
+
+
+def current_batch():
+    """
+    Retourne le lot ouvert dans le thread courant, ou None
+    """
+    return getattr(_local, 'batch', None)
+
+
+@contextmanager
+def outbound_batch(recipient_id, flush):
+    """
+    Regroupe les envois faits dans le bloc pour un destinataire et les transmet
+    en une seule fois via flush(messages) à la sortie du bloc.
+    Un bloc imbriqué rejoint le lot déjà ouvert.
+    """
+    if current_batch() is not None:
+        yield current_batch()
+        return
+
+    batch = OutboundBatch(recipient_id)
+    _local.batch = batch
+    try:
+        yield batch
+    except Exception:
+        _local.batch = None
+        # Livrer quand même les messages déjà préparés, puis propager l'erreur d'origine
+        if batch.messages:
+            try:
+                flush(batch.messages)
+            except Exception as e:
+                logger.error(f"Erreur lors de l'envoi du lot de messages: {str(e)}")
+        raise
+    else:
+        _local.batch = None
+        if batch.messages:
+            flush(batch.messages)
@@ -0,0 +1,256 @@
+import itertools
+import logging
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
+import requests
+from urllib3.exceptions import NewConnectionError, ConnectTimeoutError
+from src.config import (
+    SEND_RATE_PER_SECOND, SEND_BURST, SEND_QUEUE_SIZE, SEND_WORKERS,
+    SEND_MAX_RETRIES, SEND_BACKOFF_BASE, SEND_BACKOFF_MAX
+)
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Priorités d'envoi: les réponses texte courtes passent avant les pièces jointes
+PRIORITY_TEXT = 0
+PRIORITY_TEMPLATE = 1
+PRIORITY_MEDIA = 2
+
+
+class SendQueueFull(Exception):
+    """
+    La file d'envoi est pleine, le message n'a pas été accepté
+    """
+
+
+class TokenBucket:
+    """
+    Seau à jetons: débit moyen de `rate` envois par seconde, rafales jusqu'à `capacity`
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """
+        Attend qu'un jeton soit disponible et le consomme
+
+        Returns:
+            float: temps d'attente en secondes
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds):
+        """
+        Suspend les envois (après une erreur de limitation de débit de l'API Graph)
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class _SendJob:
+    def __init__(self, fn, priority, token_key, max_retries):
+        self.fn = fn
+        self.priority = priority
+        self.token_key = token_key
+        self.max_retries = max_retries
+        self.attempts = 0
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+def is_retryable(error):
+    """
+    Erreurs temporaires: limitation de débit Graph, erreurs 5xx et erreurs réseau survenues
+    avant l'envoi de la requête. Un timeout de lecture ou une connexion coupée en cours de
+    réponse ne sont pas rejoués: Graph a pu délivrer le message (voir http_client).
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return not_connected(error)
+    return bool(getattr(error, 'retryable', False))
+
+
+def not_connected(error):
+    """
+    Indique si l'erreur requests est survenue à l'établissement de la connexion
+    (résolution DNS, connexion refusée), donc sans que la requête soit partie
+    """
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class SendScheduler:
+    """
+    Ordonnanceur des envois sortants vers l'API Send: file bornée avec priorités,
+    seau à jetons par token de page et nouvelles tentatives avec backoff exponentiel et gigue
+    """
+
+    def __init__(self, rate=SEND_RATE_PER_SECOND, burst=SEND_BURST, max_queue=SEND_QUEUE_SIZE,
+                 workers=SEND_WORKERS, max_retries=SEND_MAX_RETRIES,
+                 backoff_base=SEND_BACKOFF_BASE, backoff_max=SEND_BACKOFF_MAX):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.num_workers = workers
+        self._queue = queue.PriorityQueue(maxsize=max_queue)
+        self._sequence = itertools.count()
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _bucket(self, token_key):
+        with self._lock:
+            bucket = self._buckets.get(token_key)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[token_key] = bucket
+            return bucket
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.num_workers):
+                thread = threading.Thread(target=self._run, name=f"send-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, fn, priority=PRIORITY_TEXT, token_key=None, max_retries=None):
+        """
+        Planifie un envoi et retourne un Future avec le résultat de fn()
+        """
+        self._ensure_started()
+        job = _SendJob(fn, priority, token_key, self.max_retries if max_retries is None else max_retries)
+        self._enqueue(job)
+        return job.future
+
+    def run(self, fn, priority=PRIORITY_TEXT, token_key=None, max_retries=None, inline=False):
+        """
+        Planifie un envoi et attend son résultat (ou son exception).
+
+        inline: pour les envois longs (upload de vidéo), seul le jeton d'envoi est obtenu par
+        la file, à son rang de priorité; fn() s'exécute dans le thread appelant, sans occuper
+        un worker pendant lequel les réponses texte attendraient.
+        """
+        if inline:
+            return self._run_inline(fn, priority, token_key, self.max_retries if max_retries is None else max_retries)
+        return self.submit(fn, priority, token_key, max_retries).result()
+
+    def _run_inline(self, fn, priority, token_key, max_retries):
+        attempt = 0
+        while True:
+            # Job sans fonction: le worker attend le jeton puis rend la main
+            self.submit(None, priority, token_key, max_retries=0).result()
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_retryable(e) or attempt >= max_retries:
+                    metrics.incr('send.failed')
+                    raise
+                delay = self._backoff(attempt)
+                attempt += 1
+                metrics.incr('send.retries')
+                if getattr(e, 'throttled', False):
+                    metrics.incr('send.throttled_remote')
+                    self._bucket(token_key).pause(delay)
+                logger.warning(f"Envoi échoué ({str(e)}), nouvelle tentative {attempt} dans {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            metrics.incr('send.sent')
+            return result
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def _enqueue(self, job):
+        try:
+            self._queue.put_nowait((job.priority, next(self._sequence), job))
+        except queue.Full:
+            metrics.incr('send.queue_full')
+            raise SendQueueFull("File d'envoi pleine")
+
+    def _retry_later(self, job, delay):
+        def requeue():
+            try:
+                self._enqueue(job)
+            except SendQueueFull as e:
+                job.future.set_exception(e)
+        timer = threading.Timer(delay, requeue)
+        timer.daemon = True
+        timer.start()
+
+    def _backoff(self, attempt):
+        # Backoff exponentiel avec gigue complète
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _run(self):
+        while True:
+            _, _, job = self._queue.get()
+            try:
+                self._execute(job)
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, job):
+        metrics.observe('send.queue_wait_seconds', time.monotonic() - job.enqueued_at)
+        bucket = self._bucket(job.token_key)
+        waited = bucket.acquire()
+        if waited > 0:
+            metrics.incr('send.throttled_local')
+            metrics.observe('send.throttle_wait_seconds', waited)
+
+        if job.fn is None:
+            job.future.set_result(None)
+            return
+
+        try:
+            result = job.fn()
+        except Exception as e:
+            if is_retryable(e) and job.attempts < job.max_retries:
+                delay = self._backoff(job.attempts)
+                job.attempts += 1
+                metrics.incr('send.retries')
+                if getattr(e, 'throttled', False):
+                    # L'API Graph limite le débit de la page: ralentir tous ses envois
+                    metrics.incr('send.throttled_remote')
+                    bucket.pause(delay)
+                logger.warning(f"Envoi échoué ({str(e)}), nouvelle tentative {job.attempts} dans {delay:.2f}s")
+                self._retry_later(job, delay)
+                return
+            metrics.incr('send.failed')
+            job.future.set_exception(e)
+            return
+
+        metrics.incr('send.sent')
+        job.future.set_result(result)
+
+
+send_scheduler = SendScheduler()
+metrics.register_gauge('send.queue_depth', send_scheduler.depth)
@@ -0,0 +1,78 @@
+import threading
+import time
+from concurrent.futures import Future
+from src.utils.metrics import metrics
+
+
+class RequestBatcher:
+    """
+    Regroupe les recherches par clé arrivant dans une courte fenêtre en appels groupés
+    fetch_many(clés) -> {clé: valeur}, d'au plus max_batch clés chacun.
+
+    Pas de thread de fond: le premier appelant attend `window` secondes que d'autres
+    requêtes rejoignent le lot, puis fait les appels pour tout le monde. Une clé déjà
+    en attente ou en cours de recherche n'est demandée qu'une fois.
+    """
+
+    def __init__(self, name, fetch_many, max_batch=50, window=0.02):
+        self.name = name
+        self.fetch_many = fetch_many
+        self.max_batch = max_batch
+        self.window = window
+        # clé -> Future, de la mise en file jusqu'à la réponse
+        self._pending = {}
+        self._queue = []
+        self._flushing = False
+        self._lock = threading.Lock()
+
+    def get_many(self, keys, timeout=None):
+        """
+        Retourne {clé: valeur} pour les clés demandées (None si absente de la réponse)
+
+        Raises:
+            TimeoutError: si la réponse n'arrive pas dans le délai
+            Exception: l'erreur de l'appel groupé qui contenait la clé
+        """
+        futures = {}
+        lead = False
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                future = self._pending.get(key)
+                if future is None:
+                    future = self._pending[key] = Future()
+                    self._queue.append(key)
+                else:
+                    metrics.incr(f'batcher.{self.name}.coalesced')
+                futures[key] = future
+            if self._queue and not self._flushing:
+                self._flushing = lead = True
+
+        if lead:
+            if self.window:
+                time.sleep(self.window)
+            self._flush()
+
+        return {key: future.result(timeout) for key, future in futures.items()}
+
+    def _flush(self):
+        while True:
+            with self._lock:
+                batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+                if not batch:
+                    self._flushing = False
+                    return
+
+            metrics.incr(f'batcher.{self.name}.calls')
+            metrics.observe(f'batcher.{self.name}.batch_size', len(batch))
+            try:
+                results, error = self.fetch_many(batch), None
+            except Exception as e:
+                results, error = {}, e
+
+            with self._lock:
+                futures = [self._pending.pop(key) for key in batch]
+            for key, future in zip(batch, futures):
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(results.get(key))
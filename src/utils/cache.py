@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Cache LRU en mémoire, borné en nombre d'entrées, avec expiration optionnelle (TTL)
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _expiry(self, ttl):
+        ttl = self.ttl if ttl is None else ttl
+        return time.monotonic() + ttl if ttl else None
+
+    def _get_entry(self, key):
+        # Doit être appelé avec le verrou
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def _set_entry(self, key, value, ttl):
+        # Doit être appelé avec le verrou
+        self._data[key] = (value, self._expiry(ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._get_entry(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._set_entry(key, value, ttl)
+
+    def add(self, key, value=True, ttl=None):
+        """
+        Ajoute la clé seulement si elle est absente (ou expirée)
+
+        Returns:
+            bool: True si la clé a été ajoutée, False si elle était déjà présente
+        """
+        with self._lock:
+            if self._get_entry(key) is not None:
+                return False
+            self._set_entry(key, value, ttl)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._get_entry(key) is not None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
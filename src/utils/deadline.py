@@ -0,0 +1,78 @@
+import threading
+import time
+
+# En dessous, un appel externe n'a aucune chance d'aboutir: ne pas le tenter
+MIN_TIMEOUT = 1.0
+
+_local = threading.local()
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Le budget de temps de la requête est épuisé
+    """
+
+
+class Deadline:
+    """
+    Budget de temps d'une requête webhook. Chaque appel externe dimensionne son timeout
+    sur le temps restant, et le traitement bascule vers une solution moins coûteuse
+    quand il ne reste plus assez de temps.
+
+    Utilisé comme gestionnaire de contexte, il devient le budget courant du thread
+    (voir current_deadline) pour les fonctions qui ne le reçoivent pas en paramètre.
+    """
+
+    def __init__(self, budget, expires_at=None):
+        self.budget = budget
+        self.expires_at = expires_at if expires_at is not None else time.monotonic() + budget
+        self._previous = []
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def has(self, seconds):
+        """
+        Indique s'il reste au moins `seconds` secondes
+        """
+        return self.remaining() >= seconds
+
+    def reserve(self, seconds):
+        """
+        Retourne un budget qui expire `seconds` secondes plus tôt, pour garder du temps
+        pour la suite (par exemple envoyer la réponse après l'avoir générée)
+        """
+        return Deadline(self.budget, self.expires_at - seconds)
+
+    def timeout(self, default):
+        """
+        Borne un timeout requests (nombre ou tuple (connexion, lecture)) par le temps restant
+
+        Raises:
+            DeadlineExceeded: s'il reste moins de MIN_TIMEOUT secondes
+        """
+        remaining = self.remaining()
+        if remaining < MIN_TIMEOUT:
+            raise DeadlineExceeded(f"Budget de temps épuisé ({remaining:.1f}s restantes)")
+        if isinstance(default, tuple):
+            return tuple(min(value, remaining) for value in default)
+        return min(default, remaining)
+
+    def __enter__(self):
+        self._previous.append(current_deadline())
+        _local.deadline = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _local.deadline = self._previous.pop()
+        return False
+
+
+def current_deadline():
+    """
+    Budget de temps actif dans le thread courant, ou None
+    """
+    return getattr(_local, 'deadline', None)
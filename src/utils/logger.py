@@ -1,32 +1,128 @@
+import json
 import logging
 import os
+import random
 import sys
 
+# Niveau global, niveaux par logger (ex: "src.youtube_api=WARNING,src.messenger_api=DEBUG")
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+# 'text' ou 'json'
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+# Proportion des lignes contenant un payload qui sont réellement journalisées
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '1.0'))
+# Taille maximale d'un payload sérialisé dans les logs
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv('LOG_PAYLOAD_MAX_CHARS', '2000'))
+
+class LazyJson:
+    """
+    Payload sérialisé en JSON seulement si la ligne de log est réellement émise,
+    et tronqué à max_chars caractères
+    """
+    __slots__ = ('obj', 'max_chars', 'indent')
+
+    def __init__(self, obj, max_chars=None, indent=None):
+        self.obj = obj
+        self.max_chars = LOG_PAYLOAD_MAX_CHARS if max_chars is None else max_chars
+        self.indent = indent
+
+    def __str__(self):
+        try:
+            text = json.dumps(self.obj, ensure_ascii=False, indent=self.indent, default=str)
+        except (TypeError, ValueError):
+            text = repr(self.obj)
+        if self.max_chars and len(text) > self.max_chars:
+            return f"{text[:self.max_chars]}... ({len(text)} caractères)"
+        return text
+
+def lazy_json(obj, max_chars=None, indent=None):
+    """
+    Prépare un payload pour un appel de log paresseux: logger.debug("Corps: %s", lazy_json(data))
+    """
+    return LazyJson(obj, max_chars, indent)
+
+class PayloadSamplingFilter(logging.Filter):
+    """
+    Ne garde qu'une proportion des lignes de log contenant un payload LazyJson
+    """
+    def __init__(self, rate=LOG_PAYLOAD_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if self.rate >= 1.0 or not record.args:
+            return True
+        args = record.args if isinstance(record.args, tuple) else (record.args,)
+        if any(isinstance(arg, LazyJson) for arg in args):
+            return random.random() < self.rate
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formate chaque ligne de log comme un objet JSON
+    """
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+def parse_log_levels(spec):
+    """
+    Analyse "logger=NIVEAU,logger=NIVEAU" en dictionnaire
+    """
+    levels = {}
+    for item in spec.split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
 def setup_logger():
     """
     Configure le logger pour l'application
     """
     # Créer le logger
     logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
-    
+    logger.setLevel(LOG_LEVEL)
+
     # Vérifier si des handlers existent déjà
     if not logger.handlers:
         # Créer un handler pour la console
         console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setLevel(logging.INFO)
-        
+        # Le filtrage par niveau se fait au niveau des loggers (global ou par module)
+        console_handler.setLevel(logging.DEBUG)
+
         # Définir le format
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        if LOG_FORMAT == 'json':
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
         console_handler.setFormatter(formatter)
-        
+        console_handler.addFilter(PayloadSamplingFilter())
+
         # Ajouter le handler au logger
         logger.addHandler(console_handler)
-        
+
         # Désactiver la propagation pour éviter les doublons
         logger.propagate = False
-    
+
+    # Niveaux spécifiques par logger
+    for name, level in parse_log_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
     return logger
 
+def get_logger(name=None):
+    """
+    Retourne un logger nommé pour un module de l'application
+    """
+    return logging.getLogger(name)
+
 # Initialiser le logger
-logger = setup_logger()
\ No newline at end of file
+logger = setup_logger()
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import deque
+
+
+class MetricsRegistry:
+    """
+    Registre de métriques en mémoire (compteurs, jauges et distributions)
+    partagé par les différents modules du bot
+    """
+
+    def __init__(self, window_size=1024):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._gauge_callbacks = {}
+        self._observations = {}
+        self._window_size = window_size
+
+    def incr(self, name, value=1):
+        """
+        Incrémente un compteur
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def get_counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def set_gauge(self, name, value):
+        """
+        Définit la valeur courante d'une jauge
+        """
+        with self._lock:
+            self._gauges[name] = value
+
+    def register_gauge(self, name, callback):
+        """
+        Enregistre une jauge calculée à la demande (ex: profondeur de file)
+        """
+        with self._lock:
+            self._gauge_callbacks[name] = callback
+
+    def observe(self, name, value):
+        """
+        Enregistre une observation (latence, taille...) dans une fenêtre glissante
+        """
+        with self._lock:
+            stats = self._observations.get(name)
+            if stats is None:
+                stats = {'count': 0, 'sum': 0.0, 'max': 0.0, 'window': deque(maxlen=self._window_size)}
+                self._observations[name] = stats
+            stats['count'] += 1
+            stats['sum'] += value
+            stats['max'] = max(stats['max'], value)
+            stats['window'].append(value)
+
+    def percentile(self, name, percent):
+        """
+        Retourne le percentile demandé sur la fenêtre glissante, ou None sans observation
+        """
+        with self._lock:
+            stats = self._observations.get(name)
+            if not stats or not stats['window']:
+                return None
+            values = sorted(stats['window'])
+        index = min(len(values) - 1, int(round(percent / 100.0 * (len(values) - 1))))
+        return values[index]
+
+    def timer(self, name):
+        """
+        Gestionnaire de contexte qui mesure la durée d'un bloc en secondes
+        """
+        return _Timer(self, name)
+
+    def snapshot(self):
+        """
+        Retourne un instantané sérialisable de toutes les métriques
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            callbacks = dict(self._gauge_callbacks)
+            observations = {
+                name: (stats['count'], stats['sum'], stats['max'], sorted(stats['window']))
+                for name, stats in self._observations.items()
+            }
+
+        for name, callback in callbacks.items():
+            try:
+                gauges[name] = callback()
+            except Exception:
+                gauges[name] = None
+
+        distributions = {}
+        for name, (count, total, maximum, values) in observations.items():
+            distributions[name] = {
+                'count': count,
+                'avg': total / count if count else 0.0,
+                'max': maximum,
+                'p50': values[len(values) // 2] if values else None,
+                'p95': values[min(len(values) - 1, int(len(values) * 0.95))] if values else None,
+            }
+
+        return {'counters': counters, 'gauges': gauges, 'distributions': distributions}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._observations.clear()
+
+
+class _Timer:
+    def __init__(self, registry, name):
+        self._registry = registry
+        self._name = name
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._registry.observe(self._name, time.monotonic() - self._start)
+        return False
+
+
+# Registre global utilisé par l'application
+metrics = MetricsRegistry()
@@ -0,0 +1,123 @@
+import hashlib
+import operator
+import random
+import threading
+import time
+from collections import OrderedDict
+
+# Hachés sur 30 bits: restent des petits entiers Python, nettement plus rapides à comparer
+_HASH_MASK = (1 << 30) - 1
+
+
+class MinHasher:
+    """
+    Signatures MinHash: estime la similarité de Jaccard entre deux ensembles de n-grammes.
+    Chaque n-gramme est haché une seule fois, les permutations sont des XOR avec des masques aléatoires.
+    """
+
+    def __init__(self, num_perm=64, seed=1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._masks = [rng.getrandbits(30) for _ in range(num_perm)]
+
+    def signature(self, shingles):
+        hashes = [
+            int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), 'little') & _HASH_MASK
+            for shingle in shingles
+        ]
+        if not hashes:
+            return None
+        return tuple(min(map(mask.__xor__, hashes)) for mask in self._masks)
+
+    @staticmethod
+    def similarity(sig_a, sig_b):
+        return sum(map(operator.eq, sig_a, sig_b)) / len(sig_a)
+
+
+class SimilarityCache:
+    """
+    Cache de quasi-doublons: les signatures MinHash des clés sont indexées par LSH (bandes),
+    une recherche ne compare que les entrées partageant au moins une bande.
+    Borné en nombre d'entrées (éviction LRU), avec expiration optionnelle (TTL).
+    """
+
+    def __init__(self, maxsize=10000, threshold=0.8, num_perm=64, bands=8, ttl=None):
+        if num_perm % bands:
+            raise ValueError("num_perm doit être un multiple de bands")
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        # id -> (signature, espace de noms, valeur, expiration)
+        self._entries = OrderedDict()
+        self._buckets = [{} for _ in range(bands)]
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _band_keys(self, signature, namespace):
+        return [(namespace,) + signature[i * self.rows:(i + 1) * self.rows] for i in range(self.bands)]
+
+    def _remove(self, entry_id):
+        # Doit être appelé avec le verrou
+        signature, namespace, _, _ = self._entries.pop(entry_id)
+        for band, key in enumerate(self._band_keys(signature, namespace)):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    def get(self, shingles, namespace=''):
+        """
+        Retourne (valeur, similarité) de l'entrée la plus proche au-dessus du seuil, ou None.
+        Seules les entrées du même espace de noms sont comparées.
+        """
+        signature = self.hasher.signature(shingles)
+        if signature is None:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            candidates = set()
+            for band, key in enumerate(self._band_keys(signature, namespace)):
+                candidates.update(self._buckets[band].get(key, ()))
+
+            best_id, best_score = None, self.threshold
+            for entry_id in candidates:
+                entry_signature, _, _, expires_at = self._entries[entry_id]
+                if expires_at is not None and expires_at <= now:
+                    self._remove(entry_id)
+                    continue
+                score = MinHasher.similarity(signature, entry_signature)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                return None
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id][2], best_score
+
+    def set(self, shingles, value, namespace=''):
+        signature = self.hasher.signature(shingles)
+        if signature is None:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (signature, namespace, value, expires_at)
+            for band, key in enumerate(self._band_keys(signature, namespace)):
+                self._buckets[band].setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets = [{} for _ in range(self.bands)]
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,116 @@
+import threading
+import time
+from src.utils.metrics import metrics
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur: après `failure_threshold` échecs consécutifs, les appels sont refusés
+    immédiatement pendant `reset_timeout` secondes, puis un appel d'essai est autorisé.
+    Son succès referme le circuit, son échec le rouvre.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        metrics.register_gauge(f'circuit.{name}.state', lambda: self.state)
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """
+        Indique si un appel peut être tenté
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    metrics.incr(f'circuit.{self.name}.rejected')
+                    return False
+                self._state = HALF_OPEN
+            # Un seul appel d'essai à la fois en semi-ouvert
+            if self._trial_in_flight:
+                metrics.incr(f'circuit.{self.name}.rejected')
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            if self._state != CLOSED:
+                self._state = CLOSED
+                metrics.incr(f'circuit.{self.name}.closed')
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    metrics.incr(f'circuit.{self.name}.opened')
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def release_trial(self):
+        """
+        Libère l'appel d'essai sans conclure (appel abandonné pour une raison sans lien avec le service)
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def reset(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+
+class ConcurrencyLimiter:
+    """
+    Plafond d'appels simultanés vers un service: au-delà, l'appelant attend au plus
+    `timeout` secondes une place libre puis renonce
+    """
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        metrics.register_gauge(f'{name}.in_flight', lambda: self.in_flight)
+
+    @property
+    def in_flight(self):
+        with self._lock:
+            return self._in_flight
+
+    def acquire(self, timeout=None):
+        if not self._semaphore.acquire(timeout=timeout):
+            metrics.incr(f'{self.name}.rejected')
+            return False
+        with self._lock:
+            self._in_flight += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._semaphore.release()
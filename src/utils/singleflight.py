@@ -0,0 +1,62 @@
+import threading
+from src.utils.metrics import metrics
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Regroupe les appels identiques simultanés: pour une même clé, seul le premier appelant
+    exécute la fonction, les suivants attendent son résultat (ou son exception).
+    Rien n'est conservé une fois l'appel terminé: ce n'est pas un cache.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, timeout=None):
+        """
+        Exécute fn() pour la clé, ou attend l'appel déjà en cours pour cette clé
+
+        Returns:
+            tuple: (résultat, True si le résultat vient de l'appel d'un autre appelant)
+
+        Raises:
+            TimeoutError: si l'appel en cours n'a pas abouti dans le délai `timeout`
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            metrics.incr(f'singleflight.{self.name}.shared')
+            if not flight.done.wait(timeout):
+                raise TimeoutError(f"Appel {self.name} en cours pour {key!r} non terminé à temps")
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        metrics.incr(f'singleflight.{self.name}.calls')
+        try:
+            flight.result = fn()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
@@ -1,4 +1,5 @@
 import re
+import unicodedata
 
 def clean_text(text):
     """
@@ -28,4 +29,87 @@ def extract_keywords(text):
     # Filtrer les mots vides
     keywords = [word for word in words if word not in stop_words and len(word) > 2]
     
-    return keywords
\ No newline at end of file
+    return keywords
+
+def strip_accents(text):
+    """
+    Supprime les accents (photosynthèse -> photosynthese)
+    """
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+def similarity_shingles(text, size=3):
+    """
+    Ensemble de n-grammes de caractères des mots-clés du texte, sans accents.
+    Indépendant de l'ordre des mots et de la ponctuation.
+    """
+    words = set(extract_keywords(strip_accents(text)))
+    shingles = set()
+    for word in words:
+        if len(word) <= size:
+            shingles.add(word)
+        else:
+            shingles.update(word[i:i + size] for i in range(len(word) - size + 1))
+    return shingles
+
+def extract_numbers(text):
+    """
+    Nombres présents dans le texte, triés: deux questions qui ne diffèrent que par
+    leurs nombres ("12 fois 7", "13 fois 7") n'ont pas la même réponse
+    """
+    return sorted(re.findall(r'\d+(?:[.,]\d+)?', text))
+
+class MessageChunker:
+    """
+    Découpe un texte reçu par morceaux (flux de génération) en messages complets:
+    un message est émis à chaque fin de paragraphe dès que min_chars caractères sont disponibles,
+    et jamais au-delà de max_chars caractères (coupé en fin de phrase si possible).
+    """
+    SENTENCE_END = re.compile(r'[.!?…](?=\s)')
+
+    def __init__(self, max_chars=2000, min_chars=200):
+        self.max_chars = max_chars
+        self.min_chars = min_chars
+        self._buffer = ''
+
+    def feed(self, text):
+        """
+        Ajoute du texte et retourne la liste des messages prêts à être envoyés
+        """
+        self._buffer += text
+        messages = []
+        while True:
+            cut = self._next_cut()
+            if cut is None:
+                return messages
+            message, self._buffer = self._buffer[:cut].strip(), self._buffer[cut:].lstrip()
+            if message:
+                messages.append(message)
+
+    def flush(self):
+        """
+        Retourne le texte restant, découpé en messages de max_chars caractères au plus
+        """
+        messages = []
+        while len(self._buffer) > self.max_chars:
+            cut = self._sentence_cut(self.max_chars) or self.max_chars
+            messages.append(self._buffer[:cut].strip())
+            self._buffer = self._buffer[cut:].lstrip()
+        if self._buffer.strip():
+            messages.append(self._buffer.strip())
+        self._buffer = ''
+        return messages
+
+    def _next_cut(self):
+        paragraph = self._buffer.rfind('\n\n', 0, self.max_chars)
+        if paragraph >= self.min_chars:
+            return paragraph
+        if len(self._buffer) > self.max_chars:
+            return self._sentence_cut(self.max_chars) or self.max_chars
+        return None
+
+    def _sentence_cut(self, limit):
+        cut = None
+        for match in self.SENTENCE_END.finditer(self._buffer, 0, limit):
+            cut = match.end()
+        return cut
@@ -0,0 +1,135 @@
+import queue
+import threading
+import logging
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+class VideoTooLarge(Exception):
+    """
+    La vidéo dépasse la taille maximale autorisée
+    """
+
+
+class StreamingVideo:
+    """
+    Objet fichier en lecture seule alimenté par la réponse HTTP amont.
+    Un thread lit la source pendant que l'upload consomme les octets, via un tampon borné:
+    la mémoire utilisée reste constante et le téléchargement se fait en même temps que l'upload.
+    """
+
+    def __init__(self, response, length, max_bytes, chunk_size=64 * 1024, buffer_chunks=16):
+        self._response = response
+        self._length = length
+        self._max_bytes = max_bytes
+        self._chunk_size = chunk_size
+        self._queue = queue.Queue(maxsize=buffer_chunks)
+        self._pending = b''
+        self._read = 0
+        self._closed = threading.Event()
+        self._finished = False
+        self._thread = threading.Thread(target=self._pump, name='video-stream', daemon=True)
+        self._thread.start()
+
+    @property
+    def len(self):
+        # Octets restant à lire, utilisé par MultipartEncoder pour calculer Content-Length
+        return max(0, self._length - self._read)
+
+    def _put(self, item):
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _pump(self):
+        received = 0
+        try:
+            for chunk in self._response.iter_content(chunk_size=self._chunk_size):
+                if not chunk:
+                    continue
+                received += len(chunk)
+                if received > self._max_bytes:
+                    # Content-Length absent ou erroné: interrompre dès que la limite est franchie
+                    metrics.incr('video_stream.aborted_too_large')
+                    self._put(VideoTooLarge(f"Vidéo trop volumineuse: plus de {self._max_bytes} octets"))
+                    return
+                if not self._put(chunk):
+                    return
+            self._put(_END)
+        except Exception as e:
+            self._put(e)
+        finally:
+            self._response.close()
+
+    def read(self, size=-1):
+        if self._finished:
+            return b''
+
+        while size < 0 or len(self._pending) < size:
+            item = self._queue.get()
+            if item is _END:
+                self._finished = True
+                break
+            if isinstance(item, Exception):
+                self._finished = True
+                self.close()
+                raise item
+            self._pending += item
+
+        if size < 0:
+            data, self._pending = self._pending, b''
+        else:
+            data, self._pending = self._pending[:size], self._pending[size:]
+        self._read += len(data)
+
+        if self._finished and not self._pending and self._read < self._length:
+            # Flux amont interrompu avant la taille annoncée
+            raise IOError(f"Flux vidéo interrompu: {self._read}/{self._length} octets reçus")
+        return data
+
+    def close(self):
+        self._closed.set()
+        # Vider le tampon pour débloquer le thread de lecture
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+
+def open_video_stream(http_client, url, max_bytes, deadline=None):
+    """
+    Ouvre la vidéo à l'URL donnée en flux continu
+
+    Returns:
+        StreamingVideo, ou None si la taille est inconnue (Content-Length absent) ou si la requête échoue
+
+    Raises:
+        VideoTooLarge: si Content-Length dépasse la taille maximale
+    """
+    response = http_client.get(url, endpoint='video_download', stream=True, deadline=deadline)
+    if response.status_code != 200:
+        logger.error(f"Erreur lors du téléchargement: {response.status_code}")
+        response.close()
+        return None
+
+    content_length = response.headers.get('Content-Length')
+    if not content_length or not content_length.isdigit():
+        response.close()
+        return None
+
+    length = int(content_length)
+    if length > max_bytes:
+        response.close()
+        metrics.incr('video_stream.rejected_content_length')
+        raise VideoTooLarge(f"Vidéo trop volumineuse: {length} octets > {max_bytes} octets")
+
+    metrics.observe('video_stream.bytes', length)
+    return StreamingVideo(response, length, max_bytes)
@@ -7,9 +7,23 @@ import logging
 import tempfile
 import shutil
 import uuid
+import re
+
+from src.config import (
+    YOUTUBE_SEARCH_CACHE_TTL, YOUTUBE_SEARCH_STALE_SECONDS, YOUTUBE_SEARCH_CACHE_SIZE,
+    YOUTUBE_DETAILS_CACHE_TTL, YOUTUBE_DETAILS_CACHE_SIZE, YOUTUBE_DETAILS_BATCH_WINDOW,
+    YOUTUBE_SEARCH_FETCH_SIZE
+)
+from src.http_client import http_client
+from src.cache_store import TwoTierCache
+from src.youtube_quota import quota_ledger, SEARCH_LIST_COST, VIDEOS_LIST_COST
+from src.utils.metrics import metrics
+from src.utils.singleflight import SingleFlight
+from src.utils.batcher import RequestBatcher
+from src.utils.text_processing import clean_text, strip_accents
 
 # Configuration du logger
-from src.utils.logger import get_logger
+from src.utils.logger import get_logger, lazy_json
 logger = get_logger(__name__)
 
 # Importer pytube pour le téléchargement de vidéos
@@ -20,6 +34,141 @@ except ImportError:
     logger.warning("La bibliothèque pytube n'est pas installée. Le téléchargement de vidéos ne sera pas disponible.")
     PYTUBE_AVAILABLE = False
 
+# Résultats de recherche, conservés périmés pour les servir quand le quota est bas
+search_cache = TwoTierCache('youtube_search', 'youtube_search_cache', ttl=YOUTUBE_SEARCH_CACHE_TTL,
+                            maxsize=YOUTUBE_SEARCH_CACHE_SIZE, stale_ttl=YOUTUBE_SEARCH_STALE_SECONDS)
+
+def search_cache_key(query, max_results, page_token=None):
+    """
+    Clé de cache d'une page de recherche: la requête en minuscules, sans accents ni ponctuation.
+    Tous les mots sont gardés, même courts: "iphone 14" et "iphone 15" sont deux recherches.
+    """
+    normalized = clean_text(strip_accents(query.lower())) or ' '.join(query.lower().split())
+    key = f"{normalized}|{max_results}"
+    return f"{key}|{page_token}" if page_token else key
+
+def encode_page_token(api_token, offset):
+    """
+    Jeton de page local: position dans les résultats d'un appel search.list et jeton de
+    l'API de cet appel (vide pour le premier)
+    """
+    return f"{offset}:{api_token or ''}"
+
+def decode_page_token(page_token):
+    """
+    Retourne (jeton de l'API, position) d'un jeton de page local; un jeton de l'API seul
+    (sessions enregistrées avant le découpage local) désigne le début de ses résultats
+    """
+    if not page_token:
+        return None, 0
+    offset, separator, api_token = page_token.partition(':')
+    if not separator or not offset.isdigit():
+        return page_token, 0
+    return api_token or None, int(offset)
+
+def copy_page(page):
+    # Chaque appelant reçoit ses propres dictionnaires
+    return {'videos': [dict(video) for video in page['videos']], 'nextPageToken': page.get('nextPageToken')}
+
+# Attente maximale des détails de vidéos demandés par un autre appelant
+YOUTUBE_DETAILS_TIMEOUT = 15
+
+def cached_lookup(video_ids, cache, batcher):
+    """
+    Valeurs par ID de vidéo depuis le cache, les absentes étant demandées au batcher
+
+    Returns:
+        dict: ID de vidéo -> valeur, pour les vidéos trouvées
+    """
+    found = {}
+    missing = []
+    for video_id in dict.fromkeys(video_ids):
+        cached = cache.get(video_id)
+        if cached is not None:
+            found[video_id] = cached
+        else:
+            missing.append(video_id)
+    
+    if missing:
+        try:
+            fetched = batcher.get_many(missing, timeout=YOUTUBE_DETAILS_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération des détails des vidéos: {str(e)}")
+            fetched = {}
+        found.update((video_id, value) for video_id, value in fetched.items() if value is not None)
+    return found
+
+# Détails par ID de vidéo: titre, durée... changent rarement, un cache long suffit
+video_details_cache = TwoTierCache('youtube_video_details', 'youtube_video_details',
+                                   ttl=YOUTUBE_DETAILS_CACHE_TTL, maxsize=YOUTUBE_DETAILS_CACHE_SIZE)
+
+_ISO8601_DURATION = re.compile(
+    r'^P(?:(?P<days>\d+)D)?(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$'
+)
+
+def parse_iso8601_duration(value):
+    """
+    Convertit une durée ISO-8601 de l'API YouTube (PT1H2M3S, P1DT2H, P0D) en secondes
+    
+    Returns:
+        int: Durée en secondes, ou None si le format n'est pas reconnu
+    """
+    match = _ISO8601_DURATION.match(value or '')
+    if not match or value in ('P', 'PT'):
+        return None
+    parts = {name: int(number) for name, number in match.groupdict(default='0').items()}
+    return parts['days'] * 86400 + parts['hours'] * 3600 + parts['minutes'] * 60 + parts['seconds']
+
+# Durées seules, pour les résultats de recherche (bouton de téléchargement)
+video_durations_cache = TwoTierCache('youtube_video_durations', 'youtube_video_durations',
+                                     ttl=YOUTUBE_DETAILS_CACHE_TTL, maxsize=YOUTUBE_DETAILS_CACHE_SIZE)
+
+# Champs de videos.list: la durée seule pour les recherches, et ceux utilisés par build_video_details
+VIDEO_DURATION_FIELDS = "items(id,contentDetails/duration)"
+VIDEO_DETAILS_FIELDS = (
+    "items(id,snippet(title,description,publishedAt,channelTitle,thumbnails),"
+    "contentDetails/duration,statistics(viewCount,likeCount,commentCount))"
+)
+
+def build_video_details(item):
+    """
+    Détails d'une vidéo à partir d'un élément de la réponse videos.list
+    """
+    video_id = item['id']
+    snippet = item.get('snippet', {})
+    content_details = item.get('contentDetails', {})
+    statistics = item.get('statistics', {})
+    
+    video_details = {
+        'id': video_id,
+        'videoId': video_id,  # Ajouter explicitement videoId pour la compatibilité
+        'title': snippet.get('title', 'Titre non disponible'),
+        'description': snippet.get('description', 'Description non disponible'),
+        'publishedAt': snippet.get('publishedAt', ''),
+        'channelTitle': snippet.get('channelTitle', 'Chaîne inconnue'),
+        'duration': content_details.get('duration', ''),
+        'durationSeconds': parse_iso8601_duration(content_details.get('duration')),
+        'viewCount': statistics.get('viewCount', '0'),
+        'likeCount': statistics.get('likeCount', '0'),
+        'commentCount': statistics.get('commentCount', '0'),
+        'url': f"https://www.youtube.com/watch?v={video_id}"
+    }
+    
+    # Extraire la miniature avec vérification
+    thumbnails = snippet.get('thumbnails', {})
+    for quality in ['high', 'medium', 'default']:
+        if quality in thumbnails and 'url' in thumbnails[quality]:
+            video_details['thumbnail'] = thumbnails[quality]['url']
+            break
+    
+    if 'thumbnail' not in video_details:
+        video_details['thumbnail'] = f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"
+    
+    return video_details
+
+def is_quota_error(response):
+    return response.status_code == 403 and 'quotaExceeded' in response.text
+
 class YouTubeAPI:
     """
     Classe pour interagir avec l'API YouTube
@@ -34,6 +183,11 @@ class YouTubeAPI:
             logger.error("Clé API YouTube manquante dans les variables d'environnement")
         
         self.base_url = "https://www.googleapis.com/youtube/v3"
+        # Durées et détails des vidéos: recherches simultanées regroupées par lots de 50 IDs
+        self.durations_batcher = RequestBatcher('youtube_durations', self.fetch_durations,
+                                                max_batch=50, window=YOUTUBE_DETAILS_BATCH_WINDOW)
+        self.details_batcher = RequestBatcher('youtube_details', self.fetch_videos_details,
+                                              max_batch=50, window=YOUTUBE_DETAILS_BATCH_WINDOW)
     
     def search_videos(self, query: str, max_results: int = 5) -> Optional[List[Dict[str, Any]]]:
         """
@@ -46,6 +200,109 @@ class YouTubeAPI:
         Returns:
             Liste de vidéos ou None en cas d'erreur
         """
+        page = self.search_page(query, max_results)
+        return page['videos'] if page is not None else None
+    
+    def search_page(self, query: str, max_results: int = 5, page_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Page de résultats d'une recherche: {'videos': [...], 'nextPageToken': jeton de la page suivante ou None}
+        
+        Un appel search.list coûte 100 unités quel que soit maxResults: chaque appel ramène
+        YOUTUBE_SEARCH_FETCH_SIZE résultats, découpés ensuite en pages localement. Les pages
+        suivantes ne coûtent rien tant que ces résultats ne sont pas épuisés.
+        
+        Returns:
+            La page, ou None en cas d'erreur
+        """
+        api_token, offset = decode_page_token(page_token)
+        results = self.search_results(query, max(max_results, YOUTUBE_SEARCH_FETCH_SIZE), api_token)
+        if results is None:
+            return None
+        
+        end = offset + max_results
+        if end < len(results['videos']):
+            next_token = encode_page_token(api_token, end)
+        elif results['nextPageToken']:
+            next_token = encode_page_token(results['nextPageToken'], 0)
+        else:
+            next_token = None
+        return {'videos': results['videos'][offset:end], 'nextPageToken': next_token}
+    
+    def search_results(self, query: str, max_results: int, page_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Résultats d'un appel search.list: {'videos': [...], 'nextPageToken': jeton de l'API ou None}
+        
+        Les résultats sont mis en cache (clé: requête normalisée et jeton de page). Quand le
+        quota du jour est bas, une recherche déjà faite est servie depuis le cache même périmée
+        plutôt que de dépenser les 100 unités d'un appel search.list.
+        
+        Returns:
+            Les résultats, ou None en cas d'erreur
+        """
+        key = search_cache_key(query, max_results, page_token)
+        page = search_cache.get(key)
+        if page is not None:
+            logger.info(f"Recherche YouTube servie depuis le cache: {query}")
+            return copy_page(page)
+        
+        if quota_ledger.is_low():
+            stale = search_cache.get(key, allow_stale=True)
+            if stale is not None:
+                logger.info(f"Quota YouTube bas, résultats périmés servis pour: {query}")
+                metrics.incr('youtube.search.stale_served')
+                return copy_page(stale)
+            if not quota_ledger.can_spend(SEARCH_LIST_COST):
+                logger.warning(f"Quota YouTube épuisé, recherche impossible: {query}")
+                metrics.incr('youtube.search.quota_rejected')
+                return None
+        
+        page = self.fetch_search(query, max_results, page_token)
+        if page is None:
+            # Erreur de l'API (quota dépassé compris): mieux vaut des résultats périmés que rien
+            stale = search_cache.get(key, allow_stale=True)
+            if stale is not None:
+                metrics.incr('youtube.search.stale_served')
+                return copy_page(stale)
+            return None
+        
+        self.add_durations(page['videos'])
+        search_cache.set(key, page)
+        return copy_page(page)
+    
+    def add_durations(self, videos):
+        """
+        Ajoute la durée en secondes ('duration', None si inconnue) à chaque vidéo,
+        en un seul appel videos.list limité à la durée pour toutes les vidéos absentes du cache
+        """
+        durations = cached_lookup([video['videoId'] for video in videos], video_durations_cache,
+                                  self.durations_batcher)
+        for video in videos:
+            video['duration'] = (durations.get(video['videoId']) or {}).get('durationSeconds')
+        return videos
+    
+    def fetch_durations(self, video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Appelle videos.list pour 50 vidéos au plus (1 unité de quota), en ne transférant que
+        la durée, et met les durées en cache
+        
+        Returns:
+            dict: ID de vidéo -> {'durationSeconds'}, pour les vidéos trouvées
+        """
+        items = self.list_videos(video_ids, "contentDetails", VIDEO_DURATION_FIELDS)
+        durations = {}
+        for item in items:
+            duration = {'durationSeconds': parse_iso8601_duration(item.get('contentDetails', {}).get('duration'))}
+            durations[item['id']] = duration
+            video_durations_cache.set(item['id'], duration)
+        return durations
+    
+    def fetch_search(self, query: str, max_results: int = 5, page_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Appelle search.list (100 unités de quota), sans passer par le cache
+        
+        Returns:
+            {'videos': [...], 'nextPageToken': ...}, ou None en cas d'erreur
+        """
         if not self.api_key:
             logger.error("Impossible de rechercher des vidéos: clé API manquante")
             return None
@@ -62,34 +319,39 @@ class YouTubeAPI:
                 "type": "video",
                 "key": self.api_key
             }
+            if page_token:
+                params["pageToken"] = page_token
             
             # Effectuer la requête
-            response = requests.get(search_url, params=params)
+            response = http_client.get(search_url, endpoint='youtube', params=params)
+            quota_ledger.spend(SEARCH_LIST_COST)
+            if is_quota_error(response):
+                quota_ledger.exhaust()
             response.raise_for_status()
             
             # Analyser la réponse
             data = response.json()
             
             # Journaliser la structure complète de la réponse pour le débogage
-            logger.info(f"Structure complète de la réponse YouTube: {json.dumps(data, indent=2)}")
+            logger.debug("Structure complète de la réponse YouTube: %s", lazy_json(data))
             
             # Vérifier si des résultats ont été trouvés
             if 'items' not in data or not data['items']:
                 logger.warning(f"Aucun résultat trouvé pour la recherche: {query}")
-                return []
+                return {'videos': [], 'nextPageToken': None}
             
             # Extraire les informations des vidéos
             videos = []
             for i, item in enumerate(data['items']):
                 try:
-                    logger.info(f"Traitement de l'élément {i}: {json.dumps(item, indent=2)}")
+                    logger.debug("Traitement de l'élément %d: %s", i, lazy_json(item))
                     
                     # Extraire l'ID de la vidéo avec vérification de sécurité
                     if 'id' not in item:
                         logger.warning(f"Élément sans 'id': {item}")
                         continue
                     
-                    logger.info(f"Structure de l'ID: {json.dumps(item['id'], indent=2)}")
+                    logger.debug("Structure de l'ID: %s", lazy_json(item['id']))
                     
                     video_id = None
                     if isinstance(item['id'], dict):
@@ -159,7 +421,7 @@ class YouTubeAPI:
                         'url': f"https://www.youtube.com/watch?v={video_id}"
                     }
                     
-                    logger.info(f"Vidéo extraite avec succès: {json.dumps(video, indent=2)}")
+                    logger.debug("Vidéo extraite avec succès: %s", lazy_json(video))
                     videos.append(video)
                     
                 except Exception as e:
@@ -168,7 +430,7 @@ class YouTubeAPI:
                     continue
             
             logger.info(f"Recherche YouTube réussie: {len(videos)} vidéos trouvées")
-            return videos
+            return {'videos': videos, 'nextPageToken': data.get('nextPageToken')}
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Erreur de requête lors de la recherche YouTube: {str(e)}")
@@ -193,80 +455,72 @@ class YouTubeAPI:
         Returns:
             Détails de la vidéo ou None en cas d'erreur
         """
-        if not self.api_key:
-            logger.error("Impossible d'obtenir les détails de la vidéo: clé API manquante")
-            return None
-            
-        try:
-            logger.info(f"Récupération des détails pour la vidéo: {video_id}")
-            
-            # Construire l'URL pour les détails de la vidéo
-            video_url = f"{self.base_url}/videos"
-            params = {
-                "part": "snippet,contentDetails,statistics",
-                "id": video_id,
-                "key": self.api_key
-            }
-            
-            # Effectuer la requête
-            response = requests.get(video_url, params=params)
-            response.raise_for_status()
-            
-            # Analyser la réponse
-            data = response.json()
-            
-            # Vérifier si des résultats ont été trouvés
-            if 'items' not in data or not data['items']:
-                logger.warning(f"Aucun détail trouvé pour la vidéo: {video_id}")
-                return None
-            
-            # Extraire les détails de la vidéo
-            video_data = data['items'][0]
-            snippet = video_data.get('snippet', {})
-            content_details = video_data.get('contentDetails', {})
-            statistics = video_data.get('statistics', {})
-            
-            # Construire l'objet de détails
-            video_details = {
-                'id': video_id,
-                'videoId': video_id,  # Ajouter explicitement videoId pour la compatibilité
-                'title': snippet.get('title', 'Titre non disponible'),
-                'description': snippet.get('description', 'Description non disponible'),
-                'publishedAt': snippet.get('publishedAt', ''),
-                'channelTitle': snippet.get('channelTitle', 'Chaîne inconnue'),
-                'duration': content_details.get('duration', ''),
-                'viewCount': statistics.get('viewCount', '0'),
-                'likeCount': statistics.get('likeCount', '0'),
-                'commentCount': statistics.get('commentCount', '0'),
-                'url': f"https://www.youtube.com/watch?v={video_id}"
-            }
-            
-            # Extraire la miniature avec vérification
-            thumbnails = snippet.get('thumbnails', {})
-            for quality in ['high', 'medium', 'default']:
-                if quality in thumbnails and 'url' in thumbnails[quality]:
-                    video_details['thumbnail'] = thumbnails[quality]['url']
-                    break
-            
-            if 'thumbnail' not in video_details:
-                video_details['thumbnail'] = f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"
-            
-            logger.info(f"Détails récupérés avec succès pour la vidéo: {video_id}")
-            return video_details
+        return self.get_videos_details([video_id]).get(video_id)
+    
+    def get_videos_details(self, video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Obtient les détails de plusieurs vidéos, depuis le cache ou par appels groupés
+        
+        Les demandes simultanées (carrousel, téléchargements) sont regroupées en appels
+        videos.list de 50 IDs au plus, et un ID déjà demandé n'est pas redemandé.
+        
+        Args:
+            video_ids: IDs des vidéos YouTube
             
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Erreur de requête lors de la récupération des détails de la vidéo: {str(e)}")
-            return None
-        except json.JSONDecodeError as e:
-            logger.error(f"Erreur de décodage JSON lors de la récupération des détails de la vidéo: {str(e)}")
-            return None
-        except Exception as e:
-            logger.error(f"Erreur inattendue lors de la récupération des détails de la vidéo: {str(e)}")
-            return None
+        Returns:
+            dict: ID de vidéo -> détails, pour les vidéos trouvées
+        """
+        return cached_lookup(video_ids, video_details_cache, self.details_batcher)
+    
+    def fetch_videos_details(self, video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Appelle videos.list pour 50 vidéos au plus (1 unité de quota) et met les détails en cache
+        
+        Returns:
+            dict: ID de vidéo -> détails, pour les vidéos trouvées
+        """
+        items = self.list_videos(video_ids, "snippet,contentDetails,statistics", VIDEO_DETAILS_FIELDS)
+        details = {}
+        for item in items:
+            video_details = build_video_details(item)
+            details[item['id']] = video_details
+            video_details_cache.set(item['id'], video_details)
+        return details
+    
+    def list_videos(self, video_ids: List[str], part: str, fields: str) -> List[Dict[str, Any]]:
+        """
+        Appelle videos.list (1 unité de quota) en ne transférant que les champs demandés
+        
+        Returns:
+            Les éléments de la réponse qui ont un ID
+        """
+        if not self.api_key:
+            logger.error("Impossible d'obtenir les détails des vidéos: clé API manquante")
+            return []
+        if not quota_ledger.can_spend(VIDEOS_LIST_COST):
+            logger.warning("Quota YouTube épuisé, détails des vidéos indisponibles")
+            return []
+        
+        logger.info(f"Récupération de {part} pour {len(video_ids)} vidéo(s)")
+        params = {
+            "part": part,
+            "id": ",".join(video_ids),
+            "fields": fields,
+            "key": self.api_key
+        }
+        response = http_client.get(f"{self.base_url}/videos", endpoint='youtube', params=params)
+        quota_ledger.spend(VIDEOS_LIST_COST)
+        if is_quota_error(response):
+            quota_ledger.exhaust()
+        response.raise_for_status()
+        return [item for item in response.json().get('items', []) if item.get('id')]
 
 # Créer une instance de l'API pour une utilisation facile
 youtube_api = YouTubeAPI()
 
+# Recherches identiques en cours: une seule requête à l'API pour tous les appelants
+search_flight = SingleFlight('youtube_search')
+
 # Fonctions d'aide pour maintenir la compatibilité avec le code existant
 def search_videos(query, max_results=5):
     """
@@ -288,23 +542,35 @@ def search_youtube(query, max_results=5):
     Cette fonction est conçue pour être compatible avec le code existant.
     Elle s'assure que chaque vidéo dans les résultats a un champ 'videoId'.
     """
+    page = search_youtube_page(query, max_results)
+    return page['videos'] if page is not None else None
+
+def search_youtube_page(query, max_results=5, page_token=None):
+    """
+    Page de résultats d'une recherche YouTube: {'videos': [...], 'nextPageToken': ...}, ou None
+    
+    Les recherches identiques simultanées partagent un seul appel.
+    """
     try:
-        logger.info(f"Appel de search_youtube avec query={query}, max_results={max_results}")
-        videos = search_videos(query, max_results)
+        logger.info(f"Appel de search_youtube_page avec query={query}, max_results={max_results}, page_token={page_token}")
+        key = (' '.join(query.lower().split()), max_results, page_token)
+        page, shared = search_flight.do(key, lambda: youtube_api.search_page(query, max_results, page_token))
         
-        if videos is None:
-            logger.warning("search_videos a retourné None")
+        if page is None:
+            logger.warning("search_page a retourné None")
             return None
+        if shared:
+            page = copy_page(page)
             
         # S'assurer que chaque vidéo a un champ 'videoId'
-        for video in videos:
+        for video in page['videos']:
             if 'id' in video and 'videoId' not in video:
                 video['videoId'] = video['id']
                 
-        logger.info(f"search_youtube a trouvé {len(videos)} vidéos")
-        return videos
+        logger.info(f"search_youtube_page a trouvé {len(page['videos'])} vidéos")
+        return page
     except Exception as e:
-        logger.error(f"Erreur dans search_youtube: {str(e)}")
+        logger.error(f"Erreur dans search_youtube_page: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
         return None
 
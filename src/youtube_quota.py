@@ -0,0 +1,70 @@
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from src.config import YOUTUBE_DAILY_QUOTA, YOUTUBE_QUOTA_RESERVE
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Coût en unités de quota des méthodes de l'API YouTube Data
+SEARCH_LIST_COST = 100
+VIDEOS_LIST_COST = 1
+
+try:
+    from zoneinfo import ZoneInfo
+    # Le quota YouTube est remis à zéro à minuit, heure du Pacifique
+    QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+except Exception:
+    QUOTA_TIMEZONE = timezone(timedelta(hours=-8))
+
+
+class QuotaLedger:
+    """
+    Unités de quota YouTube consommées dans la journée, comptées localement.
+    Sous `reserve` unités restantes, le quota est considéré comme bas: les appels évitables
+    (recherche déjà en cache, même périmée) ne sont plus faits.
+    """
+
+    def __init__(self, daily_quota=YOUTUBE_DAILY_QUOTA, reserve=YOUTUBE_QUOTA_RESERVE):
+        self.daily_quota = daily_quota
+        self.reserve = reserve
+        self._day = None
+        self._spent = 0
+        self._lock = threading.Lock()
+        metrics.register_gauge('youtube.quota.remaining', self.remaining)
+
+    def _roll(self):
+        # Doit être appelé avec le verrou
+        today = datetime.now(QUOTA_TIMEZONE).date()
+        if today != self._day:
+            self._day = today
+            self._spent = 0
+
+    def spend(self, units):
+        with self._lock:
+            self._roll()
+            self._spent += units
+        metrics.incr('youtube.quota.spent', units)
+
+    def exhaust(self):
+        """
+        L'API a refusé un appel pour quota dépassé: plus aucun appel jusqu'au lendemain
+        """
+        with self._lock:
+            self._roll()
+            self._spent = max(self._spent, self.daily_quota)
+        logger.warning("Quota YouTube épuisé pour la journée")
+
+    def remaining(self):
+        with self._lock:
+            self._roll()
+            return max(0, self.daily_quota - self._spent)
+
+    def can_spend(self, units):
+        return self.remaining() >= units
+
+    def is_low(self):
+        return self.remaining() < self.reserve
+
+
+quota_ledger = QuotaLedger()
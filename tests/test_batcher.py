@@ -0,0 +1,39 @@
+import unittest
+import sys
+import os
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.batcher import RequestBatcher
+
+class TestRequestBatcher(unittest.TestCase):
+
+    def test_splits_and_deduplicates(self):
+        """Test le découpage en lots et la suppression des clés en double"""
+        calls = []
+
+        def fetch_many(keys):
+            calls.append(list(keys))
+            return {key: key * 2 for key in keys if key != 3}
+
+        batcher = RequestBatcher('test', fetch_many, max_batch=2, window=0)
+        results = batcher.get_many([1, 2, 2, 3])
+
+        self.assertEqual(calls, [[1, 2], [3]])
+        self.assertEqual(results, {1: 2, 2: 4, 3: None})
+
+    def test_error_is_propagated(self):
+        """Test que l'erreur de l'appel groupé est transmise et n'est pas conservée"""
+        def fail(keys):
+            raise ValueError("panne")
+
+        batcher = RequestBatcher('test', fail, window=0)
+        with self.assertRaises(ValueError):
+            batcher.get_many(["a"])
+
+        batcher.fetch_many = lambda keys: {"a": 1}
+        self.assertEqual(batcher.get_many(["a"]), {"a": 1})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.conversation import ConversationMemory, Conversation, summarize_turns
+from src.mistral_api import context_messages
+
+class TestConversationMemory(unittest.TestCase):
+
+    def test_keeps_last_turns_and_summarizes_older(self):
+        """Test que seuls les derniers échanges sont gardés, les plus anciens étant résumés"""
+        memory = ConversationMemory(max_turns=2, flush_interval=0)
+        memory.append("123", "Parle-moi des volcans", "Les volcans...")
+        memory.append("123", "Et les séismes ?", "Les séismes...")
+        memory.append("123", "Merci", "De rien")
+
+        conversation = memory.get("123")
+        self.assertEqual([q for q, _ in conversation.turns], ["Et les séismes ?", "Merci"])
+        self.assertIn("volcans", conversation.summary)
+
+    @patch('src.conversation.MONGODB_URI', 'mongodb://test')
+    def test_writes_are_batched(self):
+        """Test que les échanges de plusieurs expéditeurs sont écrits en une seule opération"""
+        memory = ConversationMemory(write_batch=3, flush_interval=0)
+        collection = MagicMock()
+        collection.find_one.return_value = None
+        memory._collection = collection
+
+        memory.append("1", "Question", "Réponse")
+        memory.append("2", "Question", "Réponse")
+        collection.bulk_write.assert_not_called()
+        memory.append("3", "Question", "Réponse")
+
+        collection.bulk_write.assert_called_once()
+        self.assertEqual(len(collection.bulk_write.call_args[0][0]), 3)
+
+    @patch('src.conversation.MONGODB_URI', 'mongodb://test')
+    def test_loads_from_database(self):
+        """Test le chargement de l'historique depuis MongoDB lors d'un défaut de cache"""
+        memory = ConversationMemory(flush_interval=0)
+        collection = MagicMock()
+        collection.find_one.return_value = {'_id': "123", 'turns': [{'q': "Bonjour", 'a': "Salut"}], 'summary': "chats"}
+        memory._collection = collection
+
+        conversation = memory.get("123")
+        memory.get("123")
+
+        self.assertEqual(conversation.turns, [("Bonjour", "Salut")])
+        collection.find_one.assert_called_once()
+
+    def test_context_respects_token_budget(self):
+        """Test que le contexte envoyé à Mistral est borné par le budget de tokens"""
+        conversation = Conversation([("a" * 400, "b" * 400), ("Question", "Réponse")], summary="volcans")
+
+        messages = context_messages(conversation, token_budget=100)
+
+        self.assertEqual([m["content"] for m in messages], ["Sujets abordés précédemment: volcans", "Question", "Réponse"])
+
+    def test_summary_is_bounded(self):
+        """Test que le résumé des échanges oubliés reste borné"""
+        summary = summarize_turns("", [(f"question numéro{i} importante", "") for i in range(200)])
+        self.assertLessEqual(len(summary), 300)
+
+if __name__ == '__main__':
+    unittest.main()
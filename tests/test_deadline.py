@@ -0,0 +1,66 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.deadline import Deadline, DeadlineExceeded, current_deadline
+from src.http_client import HttpClient
+from src.messenger_api import handle_watch_video
+from src.mistral_api import generate_mistral_response
+
+class TestDeadline(unittest.TestCase):
+
+    def test_timeout_is_clamped(self):
+        """Test que le timeout est borné par le temps restant"""
+        deadline = Deadline(10)
+        connect, read = deadline.timeout((5, 45))
+        self.assertEqual(connect, 5)
+        self.assertLessEqual(read, 10)
+        self.assertLessEqual(deadline.reserve(8).timeout(30), 2)
+
+    def test_exhausted_budget(self):
+        """Test qu'aucun appel n'est tenté quand le budget est épuisé"""
+        with self.assertRaises(DeadlineExceeded):
+            Deadline(10).reserve(9.5).timeout(30)
+
+    def test_current_deadline(self):
+        """Test le budget courant du thread"""
+        self.assertIsNone(current_deadline())
+        with Deadline(10) as deadline:
+            self.assertIs(current_deadline(), deadline)
+        self.assertIsNone(current_deadline())
+
+    def test_http_client_uses_deadline(self):
+        """Test que le client HTTP dimensionne le timeout sur le budget restant"""
+        client = HttpClient()
+        session = MagicMock()
+        session.request.return_value = MagicMock(status_code=200)
+        with patch.object(client, '_session_for', return_value=session):
+            client.post("https://api.mistral.ai/v1/chat/completions", endpoint='mistral', deadline=Deadline(10))
+
+        connect, read = session.request.call_args.kwargs["timeout"]
+        self.assertLessEqual(read, 10)
+
+    @patch('src.messenger_api.resolve_video_source')
+    @patch('src.messenger_api.send_text_message')
+    def test_watch_video_falls_back_to_link(self, mock_send_text, mock_resolve):
+        """Test l'envoi du lien YouTube quand le budget ne permet pas de préparer la vidéo"""
+        handle_watch_video("123", "vid1", deadline=Deadline(10))
+
+        mock_resolve.assert_not_called()
+        self.assertIn("https://www.youtube.com/watch?v=vid1", mock_send_text.call_args.args[1])
+
+    @patch('src.mistral_api.MISTRAL_API_KEY', 'test-key')
+    @patch('src.mistral_api.http_client.post')
+    def test_mistral_skipped_without_budget(self, mock_post):
+        """Test qu'aucune génération n'est lancée sans budget suffisant"""
+        response = generate_mistral_response("Une question inédite sur le budget", deadline=Deadline(6))
+
+        mock_post.assert_not_called()
+        self.assertIn("trop de temps", response)
+
+if __name__ == '__main__':
+    unittest.main()
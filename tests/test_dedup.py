@@ -0,0 +1,72 @@
+import unittest
+from unittest.mock import patch, MagicMock, ANY
+import time
+import sys
+import os
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pymongo.errors import DuplicateKeyError
+from src.dedup import EventDeduplicator, event_key
+from src.utils.cache import TTLCache
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_lru_eviction_and_expiry(self):
+        """Test l'éviction LRU et l'expiration des entrées"""
+        cache = TTLCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+
+        cache.set("d", 4, ttl=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("d"))
+
+class TestEventDeduplicator(unittest.TestCase):
+
+    def test_event_key(self):
+        """Test la clé d'idempotence des messages et des postbacks"""
+        self.assertEqual(event_key({"message": {"mid": "m.1", "text": "salut"}}), "mid:m.1")
+        self.assertEqual(
+            event_key({"sender": {"id": "123"}, "timestamp": 1700, "postback": {"payload": "{}"}}),
+            "postback:123:1700"
+        )
+        self.assertIsNone(event_key({"read": {"watermark": 1}}))
+
+    @patch('src.dedup.MONGODB_URI', None)
+    def test_duplicate_is_dropped_locally(self):
+        """Test qu'un renvoi du même message est détecté par le cache local"""
+        dedup = EventDeduplicator()
+        self.assertTrue(dedup.claim("mid:m.1"))
+        self.assertFalse(dedup.claim("mid:m.1"))
+        self.assertTrue(dedup.claim("mid:m.2"))
+        self.assertTrue(dedup.claim(None))
+
+    @patch('src.dedup.MONGODB_URI', 'mongodb://test')
+    def test_duplicate_is_dropped_across_instances(self):
+        """Test qu'un événement déjà enregistré par une autre instance est ignoré"""
+        dedup = EventDeduplicator()
+        dedup._collection = MagicMock()
+        dedup._collection.insert_one.side_effect = DuplicateKeyError("duplicate")
+
+        self.assertFalse(dedup.claim("mid:m.3"))
+
+    @patch('src.messenger_api.handle_message')
+    def test_handle_webhook_event_skips_duplicates(self, mock_handle_message):
+        """Test que handle_message n'est appelé qu'une fois pour un message renvoyé"""
+        from src.messenger_api import handle_webhook_event
+        event = {"sender": {"id": "123"}, "message": {"mid": "m.dup", "text": "salut"}}
+
+        with patch('src.messenger_api.deduplicator', EventDeduplicator()), patch('src.dedup.MONGODB_URI', None):
+            handle_webhook_event(event)
+            handle_webhook_event(event)
+
+        mock_handle_message.assert_called_once_with("123", event["message"], deadline=ANY)
+
+if __name__ == '__main__':
+    unittest.main()
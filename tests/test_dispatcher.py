@@ -0,0 +1,81 @@
+import unittest
+from unittest.mock import patch
+import threading
+import time
+import sys
+import os
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.dispatcher import LaneDispatcher, SenderLanes
+
+def make_event(sender_id, text):
+    return {"sender": {"id": sender_id}, "message": {"text": text}}
+
+class TestSenderLanes(unittest.TestCase):
+
+    def test_offer_and_next(self):
+        """Test qu'un seul appelant prend la main sur la file d'un expéditeur"""
+        lanes = SenderLanes()
+        self.assertTrue(lanes.offer("a", 1))
+        self.assertFalse(lanes.offer("a", 2))
+        self.assertTrue(lanes.offer("b", 3))
+        self.assertEqual(lanes.next("a"), 2)
+        self.assertIsNone(lanes.next("a"))
+        self.assertTrue(lanes.offer("a", 4))
+
+class TestLaneDispatcher(unittest.TestCase):
+
+    def test_same_sender_events_keep_order(self):
+        """Test que les messages d'un même expéditeur sont traités dans l'ordre"""
+        handled = []
+        lock = threading.Lock()
+
+        def handler(event):
+            time.sleep(0.01)
+            with lock:
+                handled.append((event["sender"]["id"], event["message"]["text"]))
+
+        dispatcher = LaneDispatcher(handler, max_workers=4)
+        events = [make_event(sender, str(i)) for i in range(5) for sender in ("a", "b")]
+        dispatcher.dispatch_batch(events, timeout=5)
+        dispatcher.shutdown()
+
+        for sender in ("a", "b"):
+            texts = [text for s, text in handled if s == sender]
+            self.assertEqual(texts, ["0", "1", "2", "3", "4"])
+
+    def test_different_senders_run_in_parallel(self):
+        """Test que des expéditeurs différents sont traités en parallèle"""
+        barrier = threading.Barrier(3, timeout=5)
+        dispatcher = LaneDispatcher(lambda event: barrier.wait(), max_workers=3)
+
+        futures = dispatcher.dispatch_batch([make_event(s, "x") for s in ("a", "b", "c")], timeout=5)
+        dispatcher.shutdown()
+
+        # Sans parallélisme, la barrière expirerait et lèverait une exception
+        for future in futures:
+            self.assertIsNone(future.exception())
+
+class TestWebhookBatch(unittest.TestCase):
+
+    @patch('api.webhook.WEBHOOK_MODE', 'inline')
+    @patch('api.webhook.get_dispatcher')
+    def test_all_events_of_all_entries_are_dispatched(self, mock_get_dispatcher):
+        """Test que tous les événements de toutes les entrées sont traités"""
+        from api.webhook import app
+        response = app.test_client().post('/api/webhook', json={
+            "object": "page",
+            "entry": [
+                {"messaging": [make_event("a", "1"), make_event("a", "2")]},
+                {"messaging": [make_event("b", "3")]}
+            ]
+        })
+
+        self.assertEqual(response.status_code, 200)
+        events = mock_get_dispatcher.return_value.dispatch_batch.call_args[0][0]
+        self.assertEqual([e["message"]["text"] for e in events], ["1", "2", "3"])
+
+if __name__ == '__main__':
+    unittest.main()
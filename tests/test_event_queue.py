@@ -0,0 +1,257 @@
+import unittest
+from unittest.mock import patch, MagicMock, ANY
+import threading
+import queue
+import time
+import sys
+import os
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.event_queue import EventQueue, InMemoryQueueBackend, MongoQueueBackend, WorkerPool
+from src.dedup import EventDeduplicator
+from src.utils.metrics import metrics
+
+class TestEventQueue(unittest.TestCase):
+
+    def test_queue_is_bounded(self):
+        """Test que la file refuse les événements au-delà de sa capacité"""
+        event_queue = EventQueue(InMemoryQueueBackend(maxsize=2))
+
+        self.assertTrue(event_queue.put({"sender": {"id": "1"}}))
+        self.assertTrue(event_queue.put({"sender": {"id": "2"}}))
+        self.assertFalse(event_queue.put({"sender": {"id": "3"}}))
+        self.assertEqual(event_queue.depth(), 2)
+
+    def test_worker_pool_processes_events(self):
+        """Test que les workers traitent les événements mis en file"""
+        processed = []
+        done = threading.Event()
+
+        def handler(event):
+            processed.append(event["sender"]["id"])
+            if len(processed) == 3:
+                done.set()
+
+        pool = WorkerPool(EventQueue(InMemoryQueueBackend(maxsize=10)), handler, num_workers=2)
+        try:
+            for sender_id in ["1", "2", "3"]:
+                self.assertTrue(pool.submit({"sender": {"id": sender_id}}))
+            self.assertTrue(done.wait(5))
+        finally:
+            pool.stop()
+
+        self.assertEqual(sorted(processed), ["1", "2", "3"])
+        self.assertIsNotNone(metrics.percentile('webhook.queue_wait_seconds', 95))
+
+    def test_worker_pool_survives_handler_errors(self):
+        """Test qu'une erreur dans le gestionnaire n'arrête pas le worker"""
+        done = threading.Event()
+
+        def handler(event):
+            if not event["ok"]:
+                raise Exception("boom")
+            done.set()
+
+        pool = WorkerPool(EventQueue(InMemoryQueueBackend(maxsize=10)), handler, num_workers=1)
+        try:
+            pool.submit({"ok": False})
+            pool.submit({"ok": True})
+            self.assertTrue(done.wait(5))
+        finally:
+            pool.stop()
+
+    def test_overflow_processed_inline(self):
+        """Test qu'un événement refusé par la file pleine est traité dans la requête"""
+        handler = MagicMock()
+        pool = WorkerPool(EventQueue(InMemoryQueueBackend(maxsize=1)), handler, num_workers=1)
+
+        self.assertTrue(pool.process_overflow({"sender": {"id": "1"}}, deadline="budget"))
+
+        handler.assert_called_once_with({"sender": {"id": "1"}}, deadline="budget")
+
+    def test_overflow_keeps_sender_order(self):
+        """Test qu'un événement refusé par la file pleine passe après ceux de son expéditeur"""
+        order = []
+        gate = threading.Event()
+        done = threading.Event()
+
+        def handler(event, **kwargs):
+            if event["n"] == 1:
+                gate.wait(5)
+            order.append(event["n"])
+            if len(order) == 3:
+                done.set()
+
+        pool = WorkerPool(EventQueue(InMemoryQueueBackend(maxsize=1)), handler, num_workers=1)
+        try:
+            pool.submit({"sender": {"id": "1"}, "n": 1})
+            while pool.event_queue.depth():
+                time.sleep(0.01)
+            self.assertTrue(pool.submit({"sender": {"id": "1"}, "n": 2}))
+            self.assertFalse(pool.submit({"sender": {"id": "1"}, "n": 3}))
+            self.assertFalse(pool.process_overflow({"sender": {"id": "1"}, "n": 3}))
+            gate.set()
+            self.assertTrue(done.wait(5))
+        finally:
+            pool.stop()
+
+        self.assertEqual(order, [1, 2, 3])
+
+    def test_submit_does_not_wait_for_idle_workers(self):
+        """Test que submit() n'attend pas les workers bloqués sur la file vide"""
+        processed = []
+        done = threading.Event()
+
+        def handler(event):
+            processed.append(event)
+            if len(processed) == 5:
+                done.set()
+
+        pool = WorkerPool(EventQueue(InMemoryQueueBackend(maxsize=10)), handler, num_workers=4)
+        pool.start()
+        try:
+            time.sleep(0.1)
+            for n in range(5):
+                start = time.monotonic()
+                self.assertTrue(pool.submit({"sender": {"id": str(n)}}))
+                self.assertLess(time.monotonic() - start, 0.1)
+                time.sleep(0.05)
+            self.assertTrue(done.wait(5))
+        finally:
+            pool.stop()
+
+    @patch('src.database.Database')
+    def test_mongo_backend_reclaims_stale_events(self, mock_database):
+        """Test la reprise des événements pris par une instance qui ne les a jamais acquittés"""
+        collection = mock_database.get_instance.return_value.get_collection.return_value
+        collection.find_one_and_update.return_value = {
+            "_id": "e1", "event": {"sender": {"id": "1"}}, "enqueuedAt": 1.0, "status": "processing"
+        }
+        backend = MongoQueueBackend(maxsize=10, visibility_timeout=60, max_attempts=3)
+
+        item = backend.get(timeout=0)
+
+        self.assertEqual(item["_id"], "e1")
+        query, update = collection.find_one_and_update.call_args[0]
+        stale = query["$or"][1]
+        self.assertEqual(stale["status"], "processing")
+        self.assertEqual(stale["attempts"], {"$not": {"$gte": 3}})
+        self.assertEqual((update["$set"]["claimedAt"] - stale["claimedAt"]["$lt"]).total_seconds(), 60)
+        self.assertEqual(update["$inc"], {"attempts": 1})
+
+    @patch('src.database.Database')
+    def test_mongo_backend_buries_exhausted_events(self, mock_database):
+        """Test que les événements pris max_attempts fois sont abandonnés puis purgés par TTL"""
+        database = mock_database.get_instance.return_value
+        collection = database.get_collection.return_value
+        collection.find_one_and_update.return_value = None
+        collection.update_many.return_value.modified_count = 1
+        backend = MongoQueueBackend(maxsize=10, visibility_timeout=60, max_attempts=3, dead_letter_ttl=3600)
+
+        with self.assertRaises(queue.Empty):
+            backend.get(timeout=0)
+        with self.assertRaises(queue.Empty):
+            backend.get(timeout=0)
+
+        database.ensure_ttl_index.assert_called_once_with('webhook_events', 'deadAt', 3600)
+        collection.update_many.assert_called_once()
+        query, update = collection.update_many.call_args[0]
+        self.assertEqual(query["attempts"], {"$gte": 3})
+        self.assertEqual(update["$set"]["status"], "dead")
+
+    @patch('src.messenger_api.handle_message')
+    @patch('src.database.Database')
+    def test_reclaimed_event_is_not_dropped_as_duplicate(self, mock_database, mock_handle_message):
+        """Test qu'un événement repris est traité bien que déjà enregistré à la réception"""
+        from src.messenger_api import claim_webhook_event, process_webhook_event
+        event = {"sender": {"id": "1"}, "message": {"mid": "m.stale", "text": "salut"}}
+        collection = mock_database.get_instance.return_value.get_collection.return_value
+        reclaimed = [{"_id": "e1", "event": event, "enqueuedAt": 1.0, "status": "processing"}]
+        collection.find_one_and_update.side_effect = lambda *args, **kwargs: reclaimed.pop() if reclaimed else None
+        collection.update_many.return_value.modified_count = 0
+        done = threading.Event()
+        collection.delete_one.side_effect = lambda *args: done.set()
+
+        with patch('src.messenger_api.deduplicator', EventDeduplicator()), patch('src.dedup.MONGODB_URI', None):
+            # Enregistré à la réception par l'instance qui s'est arrêtée pendant le traitement
+            self.assertTrue(claim_webhook_event(event))
+            pool = WorkerPool(EventQueue(MongoQueueBackend(maxsize=10)), process_webhook_event, num_workers=1)
+            pool.start()
+            try:
+                self.assertTrue(done.wait(5))
+            finally:
+                pool.stop()
+
+        mock_handle_message.assert_called_once_with("1", event["message"], deadline=ANY)
+        collection.delete_one.assert_called_once_with({"_id": "e1"})
+
+class TestWebhookIngest(unittest.TestCase):
+
+    @patch('api.webhook.WEBHOOK_MODE', 'ingest')
+    @patch('api.webhook.get_worker_pool')
+    def test_ingest_mode_enqueues_and_acknowledges(self, mock_get_pool):
+        """Test que le mode ingest met les événements en file sans les traiter"""
+        from api.webhook import app
+        pool = MagicMock()
+        pool.submit.return_value = True
+        mock_get_pool.return_value = pool
+
+        with patch('api.webhook.handle_webhook_event') as mock_handle:
+            response = app.test_client().post('/api/webhook', json={
+                "object": "page",
+                "entry": [{"messaging": [{"sender": {"id": "123"}, "message": {"text": "salut"}}]}]
+            })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b"EVENT_RECEIVED")
+        pool.submit.assert_called_once()
+        mock_handle.assert_not_called()
+
+    @patch('api.webhook.WEBHOOK_MODE', 'ingest')
+    @patch('api.webhook.get_worker_pool')
+    def test_ingest_mode_drops_redeliveries(self, mock_get_pool):
+        """Test qu'un renvoi de Facebook est écarté avant d'occuper la file"""
+        from api.webhook import app
+        from src.messenger_api import process_webhook_event
+        pool = MagicMock()
+        pool.submit.return_value = True
+        mock_get_pool.return_value = pool
+        body = {"object": "page",
+                "entry": [{"messaging": [{"sender": {"id": "123"}, "message": {"mid": "m.1", "text": "salut"}}]}]}
+
+        with patch('src.messenger_api.deduplicator', EventDeduplicator()), patch('src.dedup.MONGODB_URI', None):
+            app.test_client().post('/api/webhook', json=body)
+            app.test_client().post('/api/webhook', json=body)
+
+        pool.submit.assert_called_once()
+        mock_get_pool.assert_called_with(process_webhook_event)
+
+    @patch('api.webhook.METRICS_TOKEN', 'secret')
+    def test_metrics_require_token(self):
+        """Test que les métriques ne sont servies qu'avec le jeton configuré"""
+        from api.webhook import app
+        client = app.test_client()
+
+        self.assertEqual(client.get('/api/metrics').status_code, 401)
+        self.assertEqual(client.get('/api/metrics', headers={"Authorization": "Bearer wrong"}).status_code, 401)
+        response = client.get('/api/metrics', headers={"Authorization": "Bearer secret"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.get_json(), dict)
+
+    @patch('api.webhook.METRICS_TOKEN', None)
+    def test_metrics_disabled_without_token(self):
+        """Test que l'endpoint des métriques est désactivé sans jeton configuré"""
+        from api.webhook import app
+        response = app.test_client().get('/api/metrics', headers={"Authorization": "Bearer "})
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_payload_is_rejected(self):
+        """Test qu'un corps invalide est rejeté"""
+        from api.webhook import app
+        response = app.test_client().post('/api/webhook', data="not json")
+        self.assertEqual(response.status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import json
+import tempfile
+import sys
+import os
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.faq import FaqIndex, load_faq, faq_terms, faq_index
+from src.utils.metrics import metrics
+
+ENTRIES = [
+    {"questions": ["Quelles sont les commandes disponibles ?", "Comment utiliser le bot ?"], "answer": "Commandes"},
+    {"questions": ["Quelle est la durée maximale des vidéos ?"], "answer": "Limites"},
+    {"questions": ["Es-tu ChatGPT ?"], "answer": "Mistral"},
+]
+
+class TestFaq(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.index = FaqIndex(ENTRIES, min_confidence=0.7)
+
+    def test_terms(self):
+        """Test la normalisation des termes (accents, pluriel, mots vides)"""
+        self.assertEqual(faq_terms("Les vidéos"), ["video"])
+
+    def test_answer_close_question(self):
+        """Test la réponse à une reformulation proche"""
+        self.assertEqual(self.index.answer("quelles commandes sont disponibles"), "Commandes")
+        self.assertEqual(self.index.answer("Es-tu ChatGPT ?"), "Mistral")
+
+    def test_reject_unrelated_question(self):
+        """Test qu'une question qui ne fait que mentionner un terme de la base est ignorée"""
+        self.assertIsNone(self.index.answer("Explique-moi les commandes SQL SELECT et JOIN"))
+        self.assertIsNone(self.index.answer("Quelle est la capitale de la France ?"))
+
+    def test_terms_elision(self):
+        """Test la séparation des élisions et des traits d'union"""
+        self.assertEqual(faq_terms("sais-tu l'historique d'une vidéo"), faq_terms("tu sais historique une vidéo"))
+
+    def test_reject_unknown_subject(self):
+        """Test qu'une question sur un sujet inconnu de la base part à Mistral"""
+        for question in [
+            "Qui a créé Facebook ?",
+            "Qui a créé Python ?",
+            "Quelles sont les commandes SQL disponibles ?",
+            "Comment activer le mode avion ?",
+            "Que sais-tu faire en cuisine ?",
+        ]:
+            with self.subTest(question=question):
+                self.assertIsNone(faq_index.answer(question))
+
+    def test_answer_bundled_faq(self):
+        """Test les reformulations reconnues par la base fournie"""
+        for question in [
+            "qui t'a fait ?",
+            "quelles commandes sont disponibles",
+            "comment rechercher une vidéo sur youtube",
+            "quelle est la durée maximale d'une vidéo",
+            "tu te souviens de notre conversation ?",
+        ]:
+            with self.subTest(question=question):
+                self.assertIsNotNone(faq_index.answer(question))
+
+    def test_hit_rate(self):
+        """Test le compteur de taux de réponse"""
+        self.index.answer("Es-tu ChatGPT ?")
+        self.index.answer("Raconte une histoire")
+        self.assertEqual(self.index.hit_rate(), 0.5)
+
+    def test_load_from_file(self):
+        """Test le chargement de la base depuis un fichier JSON, et l'absence de fichier"""
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as f:
+            json.dump(ENTRIES, f)
+        try:
+            self.assertEqual(len(load_faq(f.name)), 3)
+        finally:
+            os.unlink(f.name)
+        self.assertEqual(len(load_faq("/chemin/inexistant.json")), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import requests
+from src.http_client import HttpClient
+
+class TestHttpClient(unittest.TestCase):
+
+    def test_one_session_per_host(self):
+        """Test qu'une même session keep-alive est réutilisée pour un hôte"""
+        client = HttpClient()
+        graph = client._session_for("https://graph.facebook.com/v13.0/me/messages")
+        self.assertIs(graph, client._session_for("https://graph.facebook.com/v13.0/me/message_attachments"))
+        self.assertIsNot(graph, client._session_for("https://api.mistral.ai/v1/chat/completions"))
+
+    def test_other_hosts_share_bounded_session(self):
+        """Test que les hôtes de téléchargement partagent une session aux pools bornés"""
+        client = HttpClient(shared_hosts=2)
+        sessions = {client._session_for(f"https://rr{i}---sn-abc.googlevideo.com/videoplayback") for i in range(5)}
+
+        self.assertEqual(len(sessions), 1)
+        self.assertEqual(len(client._sessions), 1)
+        session = sessions.pop()
+        for i in range(5):
+            session.get_adapter("https://").poolmanager.connection_from_url(f"https://rr{i}---sn-abc.googlevideo.com/")
+        self.assertEqual(len(session.get_adapter("https://").poolmanager.pools), 2)
+
+    @patch('src.http_client.time.sleep')
+    def test_retries_transient_errors(self, mock_sleep):
+        """Test les nouvelles tentatives sur les erreurs 5xx pour les endpoints idempotents"""
+        client = HttpClient()
+        session = client._session_for("https://www.googleapis.com/youtube/v3/search")
+        failure = MagicMock(status_code=503)
+        success = MagicMock(status_code=200)
+
+        with patch.object(session, 'request', side_effect=[failure, success]) as mock_request:
+            response = client.get("https://www.googleapis.com/youtube/v3/search", endpoint='youtube')
+
+        self.assertIs(response, success)
+        self.assertEqual(mock_request.call_count, 2)
+        mock_sleep.assert_called_once()
+
+    def test_no_retry_for_message_sends(self):
+        """Test que les envois de messages ne sont jamais rejoués"""
+        client = HttpClient()
+        session = client._session_for("https://graph.facebook.com/v13.0/me/messages")
+
+        with patch.object(session, 'request', side_effect=requests.exceptions.ConnectionError("reset")) as mock_request:
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                client.post("https://graph.facebook.com/v13.0/me/messages", endpoint='graph_send', json={})
+
+        self.assertEqual(mock_request.call_count, 1)
+
+    def test_connection_stats(self):
+        """Test les compteurs de connexions par hôte"""
+        client = HttpClient()
+        client._session_for("https://graph.facebook.com/v13.0/me/messages")
+        stats = client.connection_stats()
+        self.assertEqual(stats["graph.facebook.com"]["requests"], 0)
+        self.assertEqual(stats["graph.facebook.com"]["connections_reused"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.intent_router import IntentRouter
+
+class TestIntentRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.router = IntentRouter()
+        self.router.command('youtube_mode', '/yt', MagicMock())
+        self.router.command('cache', '/cache', MagicMock(), prefix=True, when=lambda sender_id: sender_id == "admin")
+        self.router.pattern('greeting', [r"\bbonjour\b", r"\bsalut\b"], MagicMock())
+        self.router.postback('watch_video', MagicMock())
+        self.router.compile()
+
+    def route_name(self, text, sender_id="123"):
+        route = self.router.match(text, sender_id)
+        return route.name if route else None
+
+    def test_commands(self):
+        """Test les commandes exactes et à préfixe"""
+        self.assertEqual(self.route_name("/yt"), 'youtube_mode')
+        self.assertEqual(self.route_name(" /yt "), 'youtube_mode')
+        self.assertIsNone(self.route_name("/yt chats"))
+        self.assertEqual(self.route_name("/cache flush", "admin"), 'cache')
+        self.assertIsNone(self.route_name("/cachette", "admin"))
+
+    def test_condition_on_sender(self):
+        """Test qu'une route réservée est ignorée pour les autres expéditeurs"""
+        self.assertIsNone(self.route_name("/cache flush", "123"))
+
+    def test_patterns(self):
+        """Test les intentions reconnues n'importe où dans le message"""
+        self.assertEqual(self.route_name("eh bien, bonjour à tous"), 'greeting')
+        self.assertIsNone(self.route_name("quelle est la capitale de la france ?"))
+
+    def test_postback(self):
+        """Test le routage des actions de postback"""
+        self.assertEqual(self.router.match_postback('watch_video').name, 'watch_video')
+        self.assertIsNone(self.router.match_postback('inconnue'))
+
+    def test_duplicate_route(self):
+        """Test le refus d'un nom de route déjà utilisé"""
+        with self.assertRaises(ValueError):
+            self.router.command('youtube_mode', 'yt/', MagicMock())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from unittest.mock import MagicMock
+import json
+import logging
+import sys
+import os
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.logger import lazy_json, PayloadSamplingFilter, JsonFormatter, parse_log_levels
+
+class TestLogger(unittest.TestCase):
+
+    def test_lazy_json_not_serialized_when_level_disabled(self):
+        """Test que le payload n'est pas sérialisé si la ligne n'est pas émise"""
+        payload = MagicMock()
+        logger = logging.getLogger("test.lazy")
+        logger.setLevel(logging.INFO)
+
+        logger.debug("Payload: %s", lazy_json(payload))
+
+        payload.__str__.assert_not_called()
+
+    def test_lazy_json_is_truncated(self):
+        """Test la troncature des payloads volumineux"""
+        text = str(lazy_json({"text": "x" * 100}, max_chars=20))
+        self.assertTrue(text.startswith('{"text": "xxxxxxxxxx'))
+        self.assertIn("caractères", text)
+
+    def test_payload_sampling(self):
+        """Test que seules les lignes avec payload sont échantillonnées"""
+        sampling = PayloadSamplingFilter(rate=0.0)
+        with_payload = logging.LogRecord("t", logging.INFO, "", 0, "Corps: %s", (lazy_json({}),), None)
+        without_payload = logging.LogRecord("t", logging.INFO, "", 0, "Message %s", ("envoyé",), None)
+
+        self.assertFalse(sampling.filter(with_payload))
+        self.assertTrue(sampling.filter(without_payload))
+
+    def test_json_formatter(self):
+        """Test le format JSON des lignes de log"""
+        record = logging.LogRecord("src.test", logging.WARNING, "", 0, "Attention %s", ("ici",), None)
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry["level"], "WARNING")
+        self.assertEqual(entry["logger"], "src.test")
+        self.assertEqual(entry["message"], "Attention ici")
+
+    def test_parse_log_levels(self):
+        """Test l'analyse des niveaux par logger"""
+        self.assertEqual(
+            parse_log_levels("src.youtube_api=warning, src.messenger_api=DEBUG"),
+            {"src.youtube_api": "WARNING", "src.messenger_api": "DEBUG"}
+        )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,16 @@
 import unittest
 from unittest.mock import patch, MagicMock
 import json
+import requests
 import sys
 import os
 
 # Ajouter le répertoire parent au chemin de recherche
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.messenger_api import send_text_message, send_youtube_results, handle_message
+from src.messenger_api import send_text_message, send_youtube_results, handle_message, send_message_batch
+from src.messenger_api import handle_watch_video, GraphAPIError, current_page_id
+from src import messenger_api
 
 class TestMessengerApi(unittest.TestCase):
     
@@ -26,8 +29,9 @@ class TestMessengerApi(unittest.TestCase):
         self.assertEqual(args["recipient"]["id"], "123")
         self.assertEqual(args["message"]["text"], "Test message")
     
+    @patch('src.messenger_api.prefetch_video_sources')
     @patch('src.messenger_api.call_send_api')
-    def test_send_youtube_results(self, mock_call_send_api):
+    def test_send_youtube_results(self, mock_call_send_api, mock_prefetch):
         """Test l'envoi des résultats YouTube"""
         # Configurer le mock
         mock_call_send_api.return_value = {"recipient_id": "123", "message_id": "456"}
@@ -56,7 +60,42 @@ class TestMessengerApi(unittest.TestCase):
         self.assertEqual(args["message"]["attachment"]["type"], "template")
         self.assertEqual(args["message"]["attachment"]["payload"]["template_type"], "generic")
         self.assertEqual(len(args["message"]["attachment"]["payload"]["elements"]), 2)
+        mock_prefetch.assert_called_once_with(videos)
     
+    @patch('src.messenger_api.prefetch_video_sources')
+    @patch('src.messenger_api.call_send_api')
+    def test_send_youtube_results_hides_download(self, mock_call_send_api, mock_prefetch):
+        """Test que le bouton de téléchargement n'est proposé que pour les vidéos courtes"""
+        videos = [
+            {"title": "Courte", "thumbnail": "http://example.com/1.jpg", "videoId": "a", "duration": 45},
+            {"title": "Longue", "thumbnail": "http://example.com/2.jpg", "videoId": "b", "duration": 600},
+            {"title": "Inconnue", "thumbnail": "http://example.com/3.jpg", "videoId": "c", "duration": None},
+        ]
+
+        send_youtube_results("123", videos)
+
+        elements = mock_call_send_api.call_args[0][0]["message"]["attachment"]["payload"]["elements"]
+        self.assertEqual([len(element["buttons"]) for element in elements], [2, 1, 2])
+
+    @patch('src.messenger_api.prefetch_video_sources')
+    @patch('src.messenger_api.search_sessions')
+    @patch('src.messenger_api.search_youtube_page')
+    @patch('src.messenger_api.call_send_api')
+    def test_more_results_quick_reply(self, mock_call_send_api, mock_search, mock_sessions, mock_prefetch):
+        """Test l'envoi de la page suivante depuis la réponse rapide Plus de résultats"""
+        mock_sessions.get.return_value = {"query": "chats", "pageToken": "page2"}
+        mock_search.return_value = {"videos": [
+            {"title": "Chat", "thumbnail": "http://example.com/1.jpg", "videoId": "a", "duration": 30}
+        ], "nextPageToken": None}
+
+        handle_message("123", {"text": "Plus de résultats", "quick_reply": {"payload": '{"action": "youtube_more"}'}})
+
+        mock_search.assert_called_once_with("chats", page_token="page2")
+        message = mock_call_send_api.call_args[0][0]["message"]
+        self.assertEqual(message["attachment"]["payload"]["elements"][0]["title"], "Chat")
+        self.assertNotIn("quick_replies", message)
+        mock_sessions.set.assert_called_once_with("123", {"query": "chats", "pageToken": None})
+
     @patch('src.messenger_api.generate_mistral_response')
     @patch('src.messenger_api.send_text_message')
     def test_handle_message_mistral_mode(self, mock_send_text, mock_generate_response):
@@ -68,18 +107,46 @@ class TestMessengerApi(unittest.TestCase):
         handle_message("123", {"text": "Hello, how are you?"})
         
         # Vérifier que les fonctions ont été appelées correctement
-        mock_generate_response.assert_called_once_with("Hello, how are you?")
+        mock_generate_response.assert_called_once_with("Hello, how are you?", deadline=None, sender_id="123")
         mock_send_text.assert_called_once_with("123", "This is a test response")
     
-    @patch('src.messenger_api.search_youtube')
+    @patch('src.messenger_api.generate_mistral_response')
+    @patch('src.messenger_api.send_text_message')
+    def test_handle_message_canned_reply(self, mock_send_text, mock_generate_response):
+        """Test qu'une question sur le créateur est traitée sans appeler Mistral"""
+        handle_message("123", {"text": "D'où viens-tu ?"})
+
+        mock_generate_response.assert_not_called()
+        self.assertIn("Djamaldine", mock_send_text.call_args[0][1])
+
+    @patch('src.messenger_api.MISTRAL_STREAMING', True)
+    @patch('src.messenger_api.send_sender_action')
+    @patch('src.messenger_api.generate_mistral_response')
+    @patch('src.messenger_api.send_text_message')
+    def test_handle_message_mistral_streaming(self, mock_send_text, mock_generate_response, mock_action):
+        """Test l'envoi progressif de la réponse Mistral avec l'indicateur de saisie"""
+        def generate(prompt, on_message, deadline=None, sender_id=None):
+            on_message("Premier paragraphe.")
+            on_message("Second paragraphe.")
+            return "Premier paragraphe.\n\nSecond paragraphe."
+        mock_generate_response.side_effect = generate
+
+        handle_message("123", {"text": "Explique-moi"})
+
+        self.assertEqual([c.args[1] for c in mock_send_text.call_args_list], ["Premier paragraphe.", "Second paragraphe."])
+        self.assertEqual(mock_action.call_args_list[0].args, ("123", "typing_on"))
+        self.assertEqual(mock_action.call_args_list[-1].args, ("123", "typing_off"))
+
+    @patch('src.messenger_api.remember_search_page')
+    @patch('src.messenger_api.search_youtube_page')
     @patch('src.messenger_api.send_youtube_results')
     @patch('src.messenger_api.send_text_message')
-    def test_handle_message_youtube_mode(self, mock_send_text, mock_send_results, mock_search):
+    def test_handle_message_youtube_mode(self, mock_send_text, mock_send_results, mock_search, mock_remember):
         """Test le traitement d'un message en mode YouTube"""
         # Configurer les mocks
-        mock_search.return_value = [
+        mock_search.return_value = {"videos": [
             {"title": "Test Video", "thumbnail": "http://example.com/thumb.jpg", "videoId": "123456"}
-        ]
+        ], "nextPageToken": "page2"}
         
         # Simuler l'activation du mode YouTube
         handle_message("123", {"text": "/yt"})
@@ -94,6 +161,245 @@ class TestMessengerApi(unittest.TestCase):
         # Vérifier que les fonctions ont été appelées correctement
         mock_search.assert_called_once_with("cat videos")
         mock_send_results.assert_called_once()
+        self.assertTrue(mock_send_results.call_args.kwargs["more_results"])
+        mock_remember.assert_called_once_with("123", "cat videos", "page2")
+
+    @patch('src.messenger_api.send_message_batch')
+    @patch('src.messenger_api.send_message_now')
+    def test_send_long_text_message_is_batched(self, mock_send_now, mock_send_batch):
+        """Test que les chunks d'un long message partent dans un seul lot"""
+        send_text_message("123", "a" * 4500)
+        
+        mock_send_now.assert_not_called()
+        mock_send_batch.assert_called_once()
+        messages = mock_send_batch.call_args[0][0]
+        self.assertEqual([len(m["message"]["text"]) for m in messages], [2000, 2000, 500])
+    
+    @patch('src.messenger_api.http_client.post')
+    @patch('src.messenger_api.send_message_now')
+    def test_send_message_batch_single_request(self, mock_send_now, mock_post):
+        """Test l'envoi de plusieurs messages en une requête batch ordonnée"""
+        mock_post.return_value.json.return_value = [
+            {"code": 200, "body": json.dumps({"message_id": "m1"})},
+            {"code": 200, "body": json.dumps({"message_id": "m2"})}
+        ]
+        messages = [
+            {"recipient": {"id": "123"}, "message": {"text": "un"}},
+            {"recipient": {"id": "123"}, "message": {"text": "deux"}}
+        ]
+        
+        results = send_message_batch(messages)
+        
+        mock_post.assert_called_once()
+        operations = json.loads(mock_post.call_args[1]["data"]["batch"])
+        self.assertEqual(operations[1]["depends_on"], "msg0")
+        self.assertEqual([r["message_id"] for r in results], ["m1", "m2"])
+        mock_send_now.assert_not_called()
+    
+    @patch('src.messenger_api.http_client.post')
+    @patch('src.messenger_api.send_message_now')
+    def test_send_message_batch_partial_failure(self, mock_send_now, mock_post):
+        """Test le repli sur des envois individuels après un échec partiel"""
+        mock_post.return_value.json.return_value = [
+            {"code": 200, "body": json.dumps({"message_id": "m1"})},
+            {"code": 500, "body": json.dumps({"error": {"message": "boom"}})},
+            None
+        ]
+        mock_send_now.return_value = {"message_id": "retry"}
+        messages = [
+            {"recipient": {"id": "123"}, "message": {"text": str(i)}} for i in range(3)
+        ]
+        
+        results = send_message_batch(messages)
+        
+        self.assertEqual([c[0][0]["message"]["text"] for c in mock_send_now.call_args_list], ["1", "2"])
+        self.assertEqual(len(results), 3)
+
+    @patch('src.messenger_api.http_client.post')
+    @patch('src.messenger_api.send_message_now')
+    def test_send_message_batch_read_timeout_not_resent(self, mock_send_now, mock_post):
+        """Test qu'un lot peut-être délivré (timeout de lecture) n'est pas renvoyé message par message"""
+        mock_post.side_effect = requests.exceptions.ReadTimeout("read timed out")
+        messages = [
+            {"recipient": {"id": "123"}, "message": {"text": str(i)}} for i in range(3)
+        ]
+        
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            send_message_batch(messages)
+        
+        mock_send_now.assert_not_called()
+
+    @patch('src.messenger_api.http_client.post')
+    @patch('src.messenger_api.send_message_now')
+    def test_send_message_batch_rejected_is_resent(self, mock_send_now, mock_post):
+        """Test le repli quand Graph a rejeté le lot entier avec une erreur explicite"""
+        mock_post.return_value.status_code = 400
+        mock_post.return_value.json.return_value = {"error": {"code": 100, "message": "Invalid batch"}}
+        mock_send_now.return_value = {"message_id": "retry"}
+        messages = [
+            {"recipient": {"id": "123"}, "message": {"text": str(i)}} for i in range(2)
+        ]
+        
+        results = send_message_batch(messages)
+        
+        self.assertEqual(mock_send_now.call_count, 2)
+        self.assertEqual(len(results), 2)
+
+    @patch('src.messenger_api.MONGODB_URI', 'mongodb://test')
+    @patch('src.messenger_api.Video')
+    @patch('src.messenger_api.resolve_video_source')
+    @patch('src.messenger_api.send_video_attachment')
+    @patch('src.messenger_api.send_text_message')
+    def test_watch_video_cache_hit(self, mock_send_text, mock_send_attachment, mock_resolve, mock_video):
+        """Test qu'une vidéo déjà téléversée est renvoyée sans téléchargement"""
+        mock_video.find_by_video_id.return_value = MagicMock(
+            attachment_id="att-1", attachment_page_id=current_page_id(), title="Chat"
+        )
+        
+        handle_watch_video("123", "vid1")
+        
+        mock_send_attachment.assert_called_once_with("123", "att-1", "Chat")
+        mock_resolve.assert_not_called()
+        mock_send_text.assert_not_called()
+    
+    @patch('src.messenger_api.MONGODB_URI', 'mongodb://test')
+    @patch('src.messenger_api.Video')
+    @patch('src.messenger_api.resolve_video_source')
+    @patch('src.messenger_api.open_video_data')
+    @patch('src.messenger_api.send_video_file')
+    @patch('src.messenger_api.send_video_attachment')
+    @patch('src.messenger_api.send_text_message')
+    def test_watch_video_stale_attachment(self, mock_send_text, mock_send_attachment, mock_send_file,
+                                          mock_open, mock_resolve, mock_video):
+        """Test l'invalidation d'une pièce jointe refusée par l'API Graph"""
+        mock_video.find_by_video_id.return_value = MagicMock(
+            attachment_id="att-old", attachment_page_id=current_page_id(), title="Chat"
+        )
+        mock_send_attachment.side_effect = GraphAPIError({"code": 100, "message": "Invalid attachment"})
+        mock_resolve.return_value = {"url": "https://video.example/vid1.mp4", "title": "Chat", "duration": 30}
+        mock_send_file.return_value = "att-new"
+        
+        handle_watch_video("123", "vid1")
+        
+        mock_video.clear_attachment.assert_called_once_with("vid1")
+        mock_resolve.assert_called_once_with("vid1", deadline=None)
+        mock_open.return_value.close.assert_called_once()
+        mock_video.save_attachment.assert_called_once_with("vid1", "att-new", current_page_id(), title="Chat")
+
+    @patch('src.messenger_api.VIDEO_DELIVERY_MODE', 'cloudinary')
+    @patch('src.messenger_api.MONGODB_URI', None)
+    @patch('src.messenger_api.resolve_video_source')
+    @patch('src.messenger_api.upload_remote_video')
+    @patch('src.messenger_api.open_video_data')
+    @patch('src.messenger_api.send_message_batch')
+    @patch('src.messenger_api.send_text_message')
+    def test_watch_video_cloudinary_delivery(self, mock_send_text, mock_send_batch, mock_open,
+                                             mock_remote_upload, mock_resolve):
+        """Test la livraison par URL Cloudinary sans passer les octets par la fonction"""
+        mock_resolve.return_value = {"url": "https://video.example/vid1.mp4", "title": "Chat", "duration": 30}
+        mock_remote_upload.return_value = {"secure_url": "https://res.cloudinary.com/demo/video/upload/youtube_vid1.mp4"}
+        mock_send_batch.return_value = [{"message_id": "m1", "attachment_id": "att-1"}, {"message_id": "m2"}]
+        
+        handle_watch_video("123", "vid1")
+        
+        mock_remote_upload.assert_called_once_with("https://video.example/vid1.mp4", "youtube_vid1")
+        messages = mock_send_batch.call_args[0][0]
+        self.assertEqual(messages[0]["message"]["attachment"]["payload"]["url"],
+                         "https://res.cloudinary.com/demo/video/upload/youtube_vid1.mp4")
+        mock_open.assert_not_called()
+
+    @patch('src.messenger_api.VIDEO_DELIVERY_MODE', 'cloudinary')
+    @patch('src.messenger_api.MONGODB_URI', None)
+    @patch('src.messenger_api.resolve_video_source')
+    @patch('src.messenger_api.upload_remote_video')
+    @patch('src.messenger_api.open_video_data')
+    @patch('src.messenger_api.send_video_file')
+    @patch('src.messenger_api.send_text_message')
+    def test_watch_video_ip_bound_skips_cloudinary(self, mock_send_text, mock_send_file, mock_open,
+                                                   mock_remote_upload, mock_resolve):
+        """Test qu'une URL liée à notre adresse IP est envoyée directement, sans upload distant"""
+        mock_resolve.return_value = {
+            "url": "https://rr1.googlevideo.com/videoplayback?expire=1&ip=1.2.3.4&sig=abc", "title": "Chat", "duration": 30
+        }
+        mock_send_file.return_value = "att-1"
+
+        handle_watch_video("123", "vid1")
+
+        mock_remote_upload.assert_not_called()
+        mock_open.assert_called_once()
+        mock_send_file.assert_called_once()
+
+    @patch('src.messenger_api.MONGODB_URI', None)
+    @patch('src.messenger_api.video_flight')
+    @patch('src.messenger_api.resolve_video_source')
+    @patch('src.messenger_api.send_video_attachment')
+    @patch('src.messenger_api.send_text_message')
+    def test_watch_video_shared_preparation(self, mock_send_text, mock_send_attachment, mock_resolve, mock_flight):
+        """Test qu'un demandeur simultané reçoit la pièce jointe préparée pour un autre"""
+        mock_flight.do.return_value = ({"attachment_id": "att-1", "title": "Chat"}, True)
+
+        handle_watch_video("456", "vid1")
+
+        self.assertEqual(mock_flight.do.call_args[0][0], "vid1")
+        mock_send_attachment.assert_called_once_with("456", "att-1", "Chat")
+        mock_resolve.assert_not_called()
+
+
+class TestVideoSourcePrefetch(unittest.TestCase):
+
+    def setUp(self):
+        messenger_api.video_sources.clear()
+        with messenger_api._source_prefetch_lock:
+            messenger_api._source_prefetch_pending.clear()
+
+    def tearDown(self):
+        self.setUp()
+
+    @patch('src.messenger_api.time.time', return_value=1000)
+    def test_source_ttl(self, mock_time):
+        """Test la durée de vie tirée de l'expiration de l'URL signée"""
+        url = "https://rr1.googlevideo.com/videoplayback?expire=5000&ip=1.2.3.4&sig=abc"
+        self.assertEqual(messenger_api.source_ttl(url), 4000 - messenger_api.VIDEO_SOURCE_EXPIRY_MARGIN)
+        self.assertEqual(messenger_api.source_ttl("https://video.example/vid1.mp4"),
+                         messenger_api.VIDEO_SOURCE_DEFAULT_TTL)
+
+    @patch('src.messenger_api.MONGODB_URI', None)
+    @patch('src.messenger_api._source_prefetch_executor')
+    @patch('src.messenger_api.extract_video_source')
+    def test_prefetch_warms_cache(self, mock_extract, mock_executor):
+        """Test qu'un clic après le préchargement ne relance pas l'extraction"""
+        mock_executor.submit.side_effect = lambda fn, *args: fn(*args)
+        mock_extract.return_value = {"url": "https://video.example/a.mp4", "title": "A", "duration": 30}
+        videos = [
+            {"videoId": "a", "duration": 30},
+            {"videoId": "b", "duration": 600},
+        ]
+
+        messenger_api.prefetch_video_sources(videos)
+        source = messenger_api.resolve_video_source("a")
+
+        mock_extract.assert_called_once()
+        self.assertEqual(mock_extract.call_args[0][0], "a")
+        self.assertEqual(source["title"], "A")
+
+    @patch('src.messenger_api.VIDEO_PREFETCH_MAX_PENDING', 2)
+    @patch('src.messenger_api._source_prefetch_executor')
+    def test_prefetch_bounded(self, mock_executor):
+        """Test que les préchargements en attente sont bornés"""
+        messenger_api.prefetch_video_sources([{"videoId": str(i), "duration": 30} for i in range(5)])
+
+        self.assertEqual(mock_executor.submit.call_count, 2)
+
+    @patch('src.messenger_api.MONGODB_URI', None)
+    @patch('src.messenger_api.open_video_data', return_value=None)
+    @patch('src.messenger_api.send_text_message')
+    def test_refused_source_forgotten(self, mock_send_text, mock_open):
+        """Test qu'une source en cache inutilisable est oubliée"""
+        messenger_api.video_sources.set("vid1", {"url": "https://video.example/vid1.mp4", "title": "Chat", "duration": 30})
+
+        handle_watch_video("123", "vid1")
+
+        self.assertNotIn("vid1", messenger_api.video_sources)
 
 if __name__ == '__main__':
     unittest.main()
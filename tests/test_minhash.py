@@ -0,0 +1,49 @@
+import unittest
+import sys
+import os
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.minhash import SimilarityCache
+from src.utils.text_processing import similarity_shingles, strip_accents, extract_numbers
+
+class TestSimilarityCache(unittest.TestCase):
+
+    def test_strip_accents(self):
+        """Test la suppression des accents"""
+        self.assertEqual(strip_accents("photosynthèse à l'école"), "photosynthese a l'ecole")
+
+    def test_matches_reworded_prompt(self):
+        """Test qu'une reformulation (accents, ponctuation, ordre des mots) retrouve la réponse"""
+        cache = SimilarityCache(threshold=0.7)
+        cache.set(similarity_shingles("c'est quoi la photosynthèse ?"), "réponse")
+
+        match = cache.get(similarity_shingles("la photosynthese c quoi"))
+        self.assertIsNotNone(match)
+        self.assertEqual(match[0], "réponse")
+        self.assertIsNone(cache.get(similarity_shingles("explique la gravitation universelle")))
+
+    def test_numbers_are_significant(self):
+        """Test que deux calculs différents ne partagent pas la même réponse"""
+        cache = SimilarityCache(threshold=0.8)
+        first, second = "combien fait 12 fois 7", "combien fait 13 fois 7"
+        cache.set(similarity_shingles(first), "84", namespace=' '.join(extract_numbers(first)))
+
+        self.assertEqual(extract_numbers(second), ["13", "7"])
+        self.assertIsNone(cache.get(similarity_shingles(second), namespace=' '.join(extract_numbers(second))))
+        self.assertIsNotNone(cache.get(similarity_shingles(first), namespace=' '.join(extract_numbers(first))))
+
+    def test_bounded_size(self):
+        """Test l'éviction LRU au-delà de la taille maximale"""
+        cache = SimilarityCache(maxsize=2)
+        cache.set(similarity_shingles("histoire de la revolution francaise"), "a")
+        cache.set(similarity_shingles("recette des crepes bretonnes"), "b")
+        cache.set(similarity_shingles("distance entre la terre et la lune"), "c")
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(similarity_shingles("histoire de la revolution francaise")))
+        self.assertEqual(cache.get(similarity_shingles("recette des crepes bretonnes"))[0], "b")
+
+if __name__ == '__main__':
+    unittest.main()
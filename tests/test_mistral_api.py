@@ -1,15 +1,41 @@
 import unittest
 from unittest.mock import patch, MagicMock
 import json
+import threading
 import sys
 import os
 
 # Ajouter le répertoire parent au chemin de recherche
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.mistral_api import generate_mistral_response, check_creator_question
+from src.mistral_api import (
+    generate_mistral_response, check_creator_question, response_cache, response_cache_key,
+    route_prompt, detect_intent, TIER_MODELS, flush_response_cache, mistral_breaker, UNAVAILABLE_RESPONSE,
+    needs_context
+)
+from src.utils.metrics import metrics
+from src.conversation import Conversation
+from src.utils.deadline import Deadline
+from src.utils.text_processing import MessageChunker
+
+def stream_response(deltas, status_code=200):
+    mock_response = MagicMock()
+    mock_response.status_code = status_code
+    lines = [f"data: {json.dumps({'choices': [{'delta': {'content': delta}}]})}" for delta in deltas]
+    mock_response.iter_lines.return_value = lines + ["", "data: [DONE]"]
+    return mock_response
+
+def completion_response(content, status_code=200):
+    mock_response = MagicMock()
+    mock_response.status_code = status_code
+    mock_response.json.return_value = {"choices": [{"message": {"content": content}}]}
+    return mock_response
 
 class TestMistralApi(unittest.TestCase):
+
+    def setUp(self):
+        flush_response_cache()
+        mistral_breaker.reset()
     
     def test_check_creator_question(self):
         """Test la détection des questions sur le créateur"""
@@ -24,7 +50,8 @@ class TestMistralApi(unittest.TestCase):
         self.assertFalse(check_creator_question("Quelle est la capitale de la France ?"))
         self.assertFalse(check_creator_question("Peux-tu m'aider avec un problème ?"))
     
-    @patch('requests.post')
+    @patch('src.mistral_api.MISTRAL_API_KEY', 'test-key')
+    @patch('src.mistral_api.http_client.post')
     def test_generate_mistral_response(self, mock_post):
         """Test la génération de réponse via l'API Mistral"""
         # Configurer le mock
@@ -51,14 +78,212 @@ class TestMistralApi(unittest.TestCase):
         mock_post.assert_called_once()
         args, kwargs = mock_post.call_args
         self.assertEqual(args[0], "https://api.mistral.ai/v1/chat/completions")
-        self.assertEqual(kwargs["json"]["messages"][0]["content"], "What is the capital of France?")
+        self.assertEqual(kwargs["json"]["messages"][-1]["content"], "What is the capital of France?")
     
     def test_generate_mistral_response_creator_question(self):
-        """Test la réponse personnalisée pour les questions sur le créateur"""
+        """Test la réponse personnalisée (FAQ) pour les questions sur le créateur"""
         response = generate_mistral_response("Qui t'a créé ?")
         self.assertIn("Djamaldine Montana", response)
         self.assertIn("Mistral", response)
 
+    @patch('src.mistral_api.MISTRAL_API_KEY', 'test-key')
+    @patch('src.mistral_api.http_client.post')
+    def test_response_cache(self, mock_post):
+        """Test qu'une question déjà posée est servie depuis le cache"""
+        mock_post.return_value = completion_response("Bonjour !")
+
+        self.assertEqual(generate_mistral_response("Bonjour"), "Bonjour !")
+        self.assertEqual(generate_mistral_response("  BONJOUR ? "), "Bonjour !")
+        self.assertEqual(mock_post.call_count, 1)
+
+        # Contournement explicite du cache
+        generate_mistral_response("Bonjour", use_cache=False)
+        self.assertEqual(mock_post.call_count, 2)
+
+    @patch('src.mistral_api.MISTRAL_API_KEY', 'test-key')
+    @patch('src.mistral_api.http_client.post')
+    def test_errors_are_not_cached(self, mock_post):
+        """Test que les messages d'erreur ne sont jamais mis en cache"""
+        mock_post.return_value = completion_response("", status_code=500)
+
+        generate_mistral_response("Qui es-tu ?")
+        self.assertIsNone(response_cache.get(response_cache_key("Qui es-tu ?")))
+
+        mock_post.return_value = completion_response("Je suis un assistant.")
+        self.assertEqual(generate_mistral_response("Qui es-tu ?"), "Je suis un assistant.")
+        self.assertEqual(mock_post.call_count, 2)
+
+    @patch('src.mistral_api.MISTRAL_API_KEY', 'test-key')
+    @patch('src.mistral_api.http_client.post')
+    def test_similar_prompt_cache(self, mock_post):
+        """Test qu'une reformulation d'une question déjà posée est servie depuis le cache"""
+        mock_post.return_value = completion_response("La photosynthèse est...")
+
+        generate_mistral_response("C'est quoi la photosynthèse ?")
+        self.assertEqual(generate_mistral_response("la photosynthese c quoi"), "La photosynthèse est...")
+        self.assertEqual(mock_post.call_count, 1)
+
+    @patch('src.mistral_api.MISTRAL_API_KEY', 'test-key')
+    @patch('src.mistral_api.http_client.post')
+    def test_streaming_sends_paragraphs(self, mock_post):
+        """Test que les paragraphes sont transmis au fil de la génération"""
+        first = "a" * 250 + "."
+        mock_post.return_value = stream_response([first[:100], first[100:], "\n\n", "Suite", " et fin."])
+        messages = []
+
+        response = generate_mistral_response("Raconte une histoire", on_message=messages.append)
+
+        self.assertEqual(messages, [first, "Suite et fin."])
+        self.assertEqual(response, first + "\n\nSuite et fin.")
+        self.assertTrue(mock_post.call_args.kwargs["json"]["stream"])
+
+        # La réponse complète est mise en cache et resservie d'un bloc
+        messages.clear()
+        generate_mistral_response("Raconte une histoire", on_message=messages.append)
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(messages, [first, "Suite et fin."])
+
+    @patch('src.mistral_api.MISTRAL_API_KEY', 'test-key')
+    @patch('src.mistral_api.http_client.post')
+    def test_streaming_error_is_sent_and_not_cached(self, mock_post):
+        """Test qu'une erreur de l'API en flux est transmise et non mise en cache"""
+        mock_post.return_value = stream_response([], status_code=503)
+        messages = []
+
+        generate_mistral_response("Raconte une histoire", on_message=messages.append)
+
+        self.assertEqual(len(messages), 1)
+        self.assertIn("503", messages[0])
+        self.assertIsNone(response_cache.get(response_cache_key("Raconte une histoire")))
+
+    def test_message_chunker(self):
+        """Test le découpage en messages d'au plus max_chars caractères, en fin de phrase"""
+        chunker = MessageChunker(max_chars=50, min_chars=10)
+        self.assertEqual(chunker.feed("Court."), [])
+        self.assertEqual(chunker.feed(" Paragraphe assez long.\n\nDébut"), ["Court. Paragraphe assez long."])
+        messages = chunker.feed(" d'une phrase. " + "x" * 60)
+        self.assertEqual(messages, ["Début d'une phrase.", "x" * 50])
+        self.assertEqual(chunker.flush(), ["x" * 10])
+
+    def test_detect_intent(self):
+        """Test la détection approximative de l'intention"""
+        self.assertEqual(detect_intent("Salut !"), "chat")
+        self.assertEqual(detect_intent("Explique-moi la photosynthèse"), "reasoning")
+        self.assertEqual(detect_intent("Quelle est la capitale du Japon ?"), "factual")
+
+    def test_route_prompt(self):
+        """Test le choix du modèle et de max_tokens selon le prompt"""
+        metrics.reset()
+        greeting = route_prompt("salut")
+        self.assertEqual(greeting.tier, "small")
+        self.assertLess(greeting.max_tokens, route_prompt("Quelle est la capitale du Japon ?").max_tokens)
+        self.assertEqual(route_prompt("Explique-moi la relativité restreinte").tier, "large")
+
+    def test_route_avoids_slow_models(self):
+        """Test le passage au niveau inférieur quand le p95 observé dépasse la limite ou le budget"""
+        metrics.reset()
+        for _ in range(20):
+            metrics.observe('mistral.route.large.latency_seconds', 30)
+            metrics.observe('mistral.route.medium.latency_seconds', 8)
+        self.assertEqual(route_prompt("Explique-moi la relativité restreinte").tier, "medium")
+        self.assertEqual(route_prompt("Explique-moi la relativité restreinte", deadline=Deadline(6)).tier, "small")
+        metrics.reset()
+
+    @patch('src.mistral_api.MISTRAL_API_KEY', 'test-key')
+    @patch('src.mistral_api.http_client.post')
+    def test_route_usage_metrics(self, mock_post):
+        """Test l'envoi au modèle choisi et l'enregistrement de la consommation de tokens"""
+        metrics.reset()
+        response = completion_response("Bonjour ! Comment puis-je vous aider ?")
+        response.json.return_value["usage"] = {"prompt_tokens": 12, "completion_tokens": 9}
+        mock_post.return_value = response
+
+        generate_mistral_response("Bonjour")
+
+        self.assertEqual(mock_post.call_args.kwargs["json"]["model"], TIER_MODELS["small"])
+        self.assertEqual(metrics.get_counter('mistral.route.small.completion_tokens'), 9)
+        self.assertIsNotNone(metrics.percentile('mistral.route.small.latency_seconds', 95))
+
+    @patch('src.mistral_api.MISTRAL_API_KEY', 'test-key')
+    @patch('src.mistral_api.http_client.post')
+    def test_circuit_breaker_fails_fast(self, mock_post):
+        """Test que le circuit s'ouvre après des erreurs 5xx consécutives et répond sans appeler l'API"""
+        mock_post.return_value = completion_response("", status_code=503)
+        for i in range(mistral_breaker.failure_threshold):
+            generate_mistral_response(f"Question numéro {i} sur la panne", use_cache=False)
+        calls = mock_post.call_count
+
+        self.assertEqual(generate_mistral_response("Encore une question", use_cache=False), UNAVAILABLE_RESPONSE)
+        self.assertEqual(mock_post.call_count, calls)
+        mistral_breaker.reset()
+
+    @patch('src.mistral_api.MISTRAL_API_KEY', 'test-key')
+    @patch('src.mistral_api.MISTRAL_HEDGING', True)
+    @patch('src.mistral_api.route_latency_p95', return_value=0.05)
+    @patch('src.mistral_api.http_client.post')
+    def test_hedged_request(self, mock_post, mock_p95):
+        """Test qu'une requête de couverture répond à la place d'une requête lente"""
+        metrics.reset()
+        release = threading.Event()
+
+        def post(*args, **kwargs):
+            if mock_post.call_count == 1:
+                release.wait(2)
+                return completion_response("lente")
+            return completion_response("rapide")
+        mock_post.side_effect = post
+
+        self.assertEqual(generate_mistral_response("Quelle est la capitale du Japon ?", use_cache=False), "rapide")
+        release.set()
+        self.assertEqual(metrics.get_counter('mistral.hedge.hedge_won'), 1)
+
+        """Test que la clé du cache dépend du modèle et de max_tokens"""
+        self.assertEqual(response_cache_key("Salut  toi"), response_cache_key("salut toi !"))
+        self.assertNotEqual(response_cache_key("salut", model="mistral-small-latest"), response_cache_key("salut"))
+        self.assertNotEqual(response_cache_key("salut", max_tokens=200), response_cache_key("salut"))
+
+    @patch('src.mistral_api.MISTRAL_API_KEY', 'test-key')
+    @patch('src.mistral_api.conversation_memory')
+    @patch('src.mistral_api.http_client.post')
+    def test_conversation_context(self, mock_post, mock_memory):
+        """Test l'ajout de l'historique au prompt, sans passer par le cache"""
+        mock_memory.get.return_value = Conversation([("Parle-moi de Paris", "Paris est la capitale de la France.")])
+        mock_post.return_value = completion_response("Environ deux millions.")
+
+        generate_mistral_response("Combien d'habitants ?", sender_id="123")
+        generate_mistral_response("Combien d'habitants ?", sender_id="123")
+
+        self.assertEqual(mock_post.call_count, 2)
+        contents = [m["content"] for m in mock_post.call_args.kwargs["json"]["messages"]]
+        self.assertEqual(contents[1:], ["Parle-moi de Paris", "Paris est la capitale de la France.", "Combien d'habitants ?"])
+        mock_memory.append.assert_called_with("123", "Combien d'habitants ?", "Environ deux millions.")
+
+    @patch('src.mistral_api.MISTRAL_API_KEY', 'test-key')
+    @patch('src.mistral_api.conversation_memory')
+    @patch('src.mistral_api.http_client.post')
+    def test_returning_sender_uses_cache(self, mock_post, mock_memory):
+        """Test qu'une question complète d'un expéditeur avec historique passe par le cache"""
+        mock_memory.get.return_value = Conversation([("Parle-moi de Paris", "Paris est la capitale de la France.")])
+        mock_post.return_value = completion_response("Rome.")
+
+        generate_mistral_response("Quelle est la capitale de l'Italie ?", sender_id="123")
+        response = generate_mistral_response("Quelle est la capitale de l'Italie ?", sender_id="456")
+
+        self.assertEqual(response, "Rome.")
+        self.assertEqual(mock_post.call_count, 1)
+        contents = [m["content"] for m in mock_post.call_args.kwargs["json"]["messages"]]
+        self.assertEqual(contents[1:], ["Quelle est la capitale de l'Italie ?"])
+        mock_memory.append.assert_called_with("456", "Quelle est la capitale de l'Italie ?", "Rome.")
+
+    def test_needs_context(self):
+        """Test la détection des questions de suivi"""
+        self.assertTrue(needs_context("Combien d'habitants ?"))
+        self.assertTrue(needs_context("Et celle de l'Espagne, quelle est-elle ?"))
+        self.assertTrue(needs_context("Peux-tu traduire ta réponse en anglais ?"))
+        self.assertFalse(needs_context("Quelle est la capitale de l'Italie ?"))
+        self.assertFalse(needs_context("Combien de temps faut-il pour cuire des pâtes ?"))
+        self.assertFalse(needs_context("Bonjour", intent='chat'))
+
 if __name__ == '__main__':
     unittest.main()
 
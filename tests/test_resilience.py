@@ -0,0 +1,49 @@
+import unittest
+import time
+import sys
+import os
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.resilience import CircuitBreaker, ConcurrencyLimiter, CLOSED, OPEN, HALF_OPEN
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_after_consecutive_failures(self):
+        """Test l'ouverture du circuit après des échecs consécutifs"""
+        breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_half_open_trial(self):
+        """Test qu'un seul appel d'essai passe après le délai, et que son succès referme le circuit"""
+        breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CLOSED)
+
+class TestConcurrencyLimiter(unittest.TestCase):
+
+    def test_rejects_beyond_limit(self):
+        """Test le refus d'un appel au-delà du plafond"""
+        limiter = ConcurrencyLimiter('test', 1)
+        self.assertTrue(limiter.acquire(timeout=0))
+        self.assertFalse(limiter.acquire(timeout=0.01))
+        self.assertEqual(limiter.in_flight, 1)
+        limiter.release()
+        self.assertTrue(limiter.acquire(timeout=0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+from unittest.mock import MagicMock
+import threading
+import time
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+import sys
+import os
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.send_scheduler import SendScheduler, SendQueueFull, TokenBucket, is_retryable, PRIORITY_TEXT, PRIORITY_MEDIA
+from src.messenger_api import GraphAPIError, message_priority
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        """Test que le seau laisse passer une rafale puis limite le débit"""
+        bucket = TokenBucket(rate=50, capacity=2)
+        self.assertEqual(bucket.acquire(), 0.0)
+        self.assertEqual(bucket.acquire(), 0.0)
+        self.assertGreater(bucket.acquire(), 0.0)
+
+class TestSendScheduler(unittest.TestCase):
+
+    def test_retries_throttling_errors(self):
+        """Test la nouvelle tentative après une limitation de débit de l'API Graph"""
+        scheduler = SendScheduler(rate=1000, burst=10, workers=1, backoff_base=0.01, backoff_max=0.02)
+        send = MagicMock(side_effect=[GraphAPIError({"code": 613, "message": "Calls limit"}), {"message_id": "m1"}])
+
+        self.assertEqual(scheduler.run(send), {"message_id": "m1"})
+        self.assertEqual(send.call_count, 2)
+
+    def test_does_not_retry_permanent_errors(self):
+        """Test qu'une erreur définitive est remontée sans nouvelle tentative"""
+        scheduler = SendScheduler(rate=1000, burst=10, workers=1)
+        send = MagicMock(side_effect=GraphAPIError({"code": 100, "message": "Invalid parameter"}))
+
+        with self.assertRaises(GraphAPIError):
+            scheduler.run(send)
+        self.assertEqual(send.call_count, 1)
+
+    def test_network_errors_after_send_not_retried(self):
+        """Test que seules les erreurs réseau survenues avant l'envoi sont rejouées"""
+        refused = MaxRetryError(None, "/", NewConnectionError(None, "Connection refused"))
+        self.assertTrue(is_retryable(requests.exceptions.ConnectionError(refused)))
+        self.assertTrue(is_retryable(requests.exceptions.ConnectTimeout()))
+        self.assertFalse(is_retryable(requests.exceptions.ReadTimeout()))
+        self.assertFalse(is_retryable(requests.exceptions.ConnectionError(ProtocolError("Connection aborted."))))
+
+        scheduler = SendScheduler(rate=1000, burst=10, workers=1, backoff_base=0.01, backoff_max=0.02)
+        send = MagicMock(side_effect=requests.exceptions.ReadTimeout())
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            scheduler.run(send)
+        self.assertEqual(send.call_count, 1)
+
+    def test_text_goes_before_media(self):
+        """Test que les messages texte passent avant les pièces jointes en attente"""
+        scheduler = SendScheduler(rate=1000, burst=10, workers=1)
+        gate = threading.Event()
+        order = []
+
+        blocker = scheduler.submit(gate.wait)
+        time.sleep(0.05)
+        media = scheduler.submit(lambda: order.append("media"), priority=PRIORITY_MEDIA)
+        text = scheduler.submit(lambda: order.append("text"), priority=PRIORITY_TEXT)
+        gate.set()
+        for future in (blocker, media, text):
+            future.result(timeout=5)
+
+        self.assertEqual(order, ["text", "media"])
+
+    def test_inline_media_does_not_hold_worker(self):
+        """Test qu'un upload long ne bloque pas les réponses texte"""
+        scheduler = SendScheduler(rate=1000, burst=10, workers=1)
+        gate = threading.Event()
+        upload = threading.Thread(target=scheduler.run, args=(gate.wait,),
+                                  kwargs={"priority": PRIORITY_MEDIA, "inline": True})
+        upload.start()
+        time.sleep(0.05)
+
+        self.assertEqual(scheduler.submit(lambda: "text").result(timeout=1), "text")
+        gate.set()
+        upload.join(timeout=5)
+        self.assertFalse(upload.is_alive())
+
+    def test_bounded_queue(self):
+        """Test que la file d'envoi refuse les messages au-delà de sa capacité"""
+        scheduler = SendScheduler(rate=1000, burst=10, workers=1, max_queue=1)
+        gate = threading.Event()
+        scheduler.submit(gate.wait)
+        time.sleep(0.05)
+        scheduler.submit(lambda: None)
+
+        with self.assertRaises(SendQueueFull):
+            scheduler.submit(lambda: None)
+        gate.set()
+
+    def test_message_priority(self):
+        """Test la priorité selon le type de message"""
+        self.assertEqual(message_priority({"message": {"text": "salut"}}), PRIORITY_TEXT)
+        self.assertEqual(message_priority({"message": {"attachment": {"type": "video"}}}), PRIORITY_MEDIA)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import threading
+import time
+import sys
+import os
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.singleflight import SingleFlight
+from src.utils.metrics import metrics
+
+class TestSingleFlight(unittest.TestCase):
+
+    def start_leader(self, flight, key, fn):
+        results = []
+        thread = threading.Thread(target=lambda: results.append(flight.do(key, fn)))
+        thread.start()
+        return thread, results
+
+    def test_concurrent_callers_share_one_call(self):
+        """Test que les appels simultanés d'une même clé partagent un seul appel"""
+        metrics.reset()
+        flight = SingleFlight('test_shared')
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait(2)
+            return "résultat"
+
+        thread, leader_results = self.start_leader(flight, "clé", fetch)
+        started.wait(2)
+        follower = threading.Thread(target=lambda: leader_results.append(flight.do("clé", fetch)))
+        follower.start()
+        # Attendre que le second appelant soit en attente du premier
+        while not metrics.get_counter('singleflight.test_shared.shared'):
+            time.sleep(0.001)
+        release.set()
+        thread.join()
+        follower.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(leader_results, key=lambda r: r[1]), [("résultat", False), ("résultat", True)])
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_error_is_shared_and_not_kept(self):
+        """Test que l'exception est transmise et que l'appel suivant est relancé"""
+        flight = SingleFlight('test')
+
+        def fail():
+            raise ValueError("panne")
+
+        with self.assertRaises(ValueError):
+            flight.do("clé", fail)
+        self.assertEqual(flight.do("clé", lambda: 1), (1, False))
+
+    def test_follower_timeout(self):
+        """Test l'abandon de l'attente après le délai"""
+        flight = SingleFlight('test')
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(2)
+
+        thread, _ = self.start_leader(flight, "clé", slow)
+        started.wait(2)
+        with self.assertRaises(TimeoutError):
+            flight.do("clé", slow, timeout=0.01)
+        release.set()
+        thread.join()
+
+if __name__ == '__main__':
+    unittest.main()
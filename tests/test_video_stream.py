@@ -0,0 +1,56 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+from src.video_stream import StreamingVideo, VideoTooLarge, open_video_stream
+
+def fake_response(chunks, content_length=None, status_code=200):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = {'Content-Length': str(content_length)} if content_length is not None else {}
+    response.iter_content.return_value = iter(chunks)
+    return response
+
+class TestStreamingVideo(unittest.TestCase):
+
+    def test_multipart_upload_reads_whole_stream(self):
+        """Test que l'upload multipart lit tout le flux sans le charger d'avance"""
+        chunks = [b"a" * 1000, b"b" * 1000, b"c" * 500]
+        stream = StreamingVideo(fake_response(chunks), 2500, max_bytes=10000, buffer_chunks=1)
+        encoder = MultipartEncoder(fields={'filedata': ('v.mp4', stream, 'video/mp4')})
+
+        body = encoder.read()
+
+        self.assertEqual(len(body), encoder.len)
+        self.assertIn(b"a" * 1000 + b"b" * 1000 + b"c" * 500, body)
+
+    def test_aborts_when_running_size_exceeds_limit(self):
+        """Test l'arrêt dès que la taille reçue dépasse la limite"""
+        stream = StreamingVideo(fake_response([b"x" * 600, b"x" * 600]), 1000, max_bytes=1000)
+
+        with self.assertRaises(VideoTooLarge):
+            stream.read(2000)
+
+    def test_rejects_large_content_length(self):
+        """Test le refus immédiat d'une vidéo annoncée trop volumineuse"""
+        client = MagicMock()
+        client.get.return_value = fake_response([], content_length=9 * 1024 * 1024)
+
+        with self.assertRaises(VideoTooLarge):
+            open_video_stream(client, "https://video.example/v.mp4", 8 * 1024 * 1024)
+        client.get.return_value.iter_content.assert_not_called()
+
+    def test_unknown_length_is_not_streamed(self):
+        """Test qu'une source sans Content-Length n'est pas diffusée en flux"""
+        client = MagicMock()
+        client.get.return_value = fake_response([b"x"])
+
+        self.assertIsNone(open_video_stream(client, "https://video.example/v.mp4", 1000))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,36 @@
 import unittest
 from unittest.mock import patch, MagicMock
 import json
+import threading
+import requests
 import sys
 import os
 
 # Ajouter le répertoire parent au chemin de recherche
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.youtube_api import search_youtube
+from src.youtube_api import search_youtube, youtube_api, search_cache_key, parse_iso8601_duration
+from src.config import YOUTUBE_SEARCH_FETCH_SIZE
+from src.youtube_quota import QuotaLedger
+from src.cache_store import TwoTierCache
+
+def search_response(video_ids, status_code=200):
+    mock_response = MagicMock()
+    mock_response.status_code = status_code
+    mock_response.text = ""
+    mock_response.json.return_value = {
+        "items": [{"id": {"videoId": video_id}, "snippet": {"title": video_id}} for video_id in video_ids]
+    }
+    return mock_response
+
+def durations_response(durations):
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.text = ""
+    mock_response.json.return_value = {
+        "items": [{"id": video_id, "contentDetails": {"duration": duration}} for video_id, duration in durations.items()]
+    }
+    return mock_response
 
 class TestYoutubeApi(unittest.TestCase):
     
@@ -65,6 +88,160 @@ class TestYoutubeApi(unittest.TestCase):
             type='video'
         )
 
+class TestYoutubeSearchCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = TwoTierCache('test_youtube_search', 'test', ttl=60, stale_ttl=3600)
+        self.details_cache = TwoTierCache('test_youtube_details', 'test', ttl=60)
+        self.durations_cache = TwoTierCache('test_youtube_durations', 'test', ttl=60)
+        self.ledger = QuotaLedger(daily_quota=1000, reserve=200)
+        patches = [
+            patch('src.youtube_api.search_cache', self.cache),
+            patch('src.youtube_api.video_details_cache', self.details_cache),
+            patch('src.youtube_api.video_durations_cache', self.durations_cache),
+            patch('src.youtube_api.quota_ledger', self.ledger),
+            patch.object(youtube_api, 'api_key', 'test-key'),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_cache_key_normalization(self):
+        """Test que la casse, les accents et la ponctuation ne changent pas la clé, contrairement aux mots courts"""
+        self.assertEqual(search_cache_key("Musique de Noël !", 5), search_cache_key("musique  de noel", 5))
+        self.assertNotEqual(search_cache_key("noel musique", 5), search_cache_key("noel musique", 10))
+        self.assertNotEqual(search_cache_key("iphone 14", 5), search_cache_key("iphone 15", 5))
+        self.assertNotEqual(search_cache_key("psg om", 5), search_cache_key("psg ol", 5))
+
+    @patch('src.youtube_api.http_client.get')
+    def test_repeated_search_uses_cache(self, mock_get):
+        """Test qu'une recherche répétée ne consomme pas de quota"""
+        mock_get.side_effect = [search_response(["vid1", "vid2"]), durations_response({"vid1": "PT45S"})]
+
+        youtube_api.search_videos("musique de Noël")
+        videos = youtube_api.search_videos("Musique de noel !")
+
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual([v["videoId"] for v in videos], ["vid1", "vid2"])
+        self.assertEqual(self.ledger.remaining(), 899)
+
+    @patch('src.youtube_api.http_client.get')
+    def test_durations_in_one_batched_call(self, mock_get):
+        """Test l'ajout des durées en un seul appel videos.list, limité aux vidéos hors cache"""
+        self.durations_cache.set("vid1", {"durationSeconds": 30})
+        mock_get.side_effect = [search_response(["vid1", "vid2", "vid3"]),
+                                durations_response({"vid2": "PT1H2M3S", "vid3": "PT59S"})]
+
+        videos = youtube_api.search_videos("chats")
+
+        params = mock_get.call_args.kwargs["params"]
+        self.assertEqual(params["id"], "vid2,vid3")
+        self.assertEqual(params["part"], "contentDetails")
+        self.assertEqual(params["fields"], "items(id,contentDetails/duration)")
+        self.assertEqual([v["duration"] for v in videos], [30, 3723, 59])
+        self.assertEqual(self.durations_cache.get("vid3")["durationSeconds"], 59)
+        self.assertIsNone(self.details_cache.get("vid3"))
+
+    @patch('src.youtube_api.http_client.get')
+    def test_concurrent_details_lookups_are_merged(self, mock_get):
+        """Test que des recherches de détails simultanées partagent un seul appel videos.list"""
+        mock_get.return_value = durations_response({"vid1": "PT10S", "vid2": "PT20S", "vid3": "PT30S"})
+        results = {}
+        threads = [
+            threading.Thread(target=lambda ids=ids: results.update(youtube_api.get_videos_details(ids)))
+            for ids in (["vid1", "vid2"], ["vid2", "vid3"])
+        ]
+        with patch.object(youtube_api.details_batcher, 'window', 0.1):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(sorted(mock_get.call_args.kwargs["params"]["id"].split(",")), ["vid1", "vid2", "vid3"])
+        self.assertEqual(sorted(results), ["vid1", "vid2", "vid3"])
+
+    @patch('src.youtube_api.http_client.get')
+    def test_details_batches_of_50(self, mock_get):
+        """Test le découpage en appels de 50 IDs au plus, et le passage de l'aide à un ID par le cache"""
+        mock_get.return_value = durations_response({"vid0": "PT10S"})
+
+        youtube_api.get_videos_details([f"vid{i}" for i in range(120)])
+        details = youtube_api.get_video_details("vid0")
+
+        self.assertEqual([len(c.kwargs["params"]["id"].split(",")) for c in mock_get.call_args_list], [50, 50, 20])
+        self.assertEqual(details["durationSeconds"], 10)
+
+    @patch('src.youtube_api.http_client.get')
+    def test_next_page(self, mock_get):
+        """Test le jeton de page suivante et la mise en cache de chaque page"""
+        first = search_response(["vid1"])
+        first.json.return_value["nextPageToken"] = "page2"
+        mock_get.side_effect = [first, durations_response({}), search_response(["vid2"]), durations_response({})]
+
+        page = youtube_api.search_page("chats")
+        next_page = youtube_api.search_page("chats", page_token=page["nextPageToken"])
+        youtube_api.search_page("chats", page_token="page2")
+
+        self.assertEqual(mock_get.call_args_list[2].kwargs["params"]["pageToken"], "page2")
+        self.assertEqual(next_page["videos"][0]["videoId"], "vid2")
+        self.assertIsNone(next_page["nextPageToken"])
+        self.assertEqual(mock_get.call_count, 4)
+
+    @patch('src.youtube_api.http_client.get')
+    def test_pages_cut_from_one_search(self, mock_get):
+        """Test que les pages suivantes sont découpées dans un seul appel search.list"""
+        ids = [f"vid{i}" for i in range(7)]
+        mock_get.side_effect = [search_response(ids), durations_response({})]
+
+        page = youtube_api.search_page("chats")
+        next_page = youtube_api.search_page("chats", page_token=page["nextPageToken"])
+
+        self.assertEqual(mock_get.call_args_list[0].kwargs["params"]["maxResults"], YOUTUBE_SEARCH_FETCH_SIZE)
+        self.assertEqual([v["videoId"] for v in page["videos"]], ids[:5])
+        self.assertEqual([v["videoId"] for v in next_page["videos"]], ids[5:])
+        self.assertIsNone(next_page["nextPageToken"])
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(self.ledger.remaining(), 899)
+
+    def test_parse_iso8601_duration(self):
+        """Test la conversion des durées ISO-8601 en secondes"""
+        self.assertEqual(parse_iso8601_duration("PT1M5S"), 65)
+        self.assertEqual(parse_iso8601_duration("P1DT2H"), 93600)
+        self.assertEqual(parse_iso8601_duration("P0D"), 0)
+        self.assertIsNone(parse_iso8601_duration("PT"))
+        self.assertIsNone(parse_iso8601_duration("1:05"))
+
+    @patch('src.youtube_api.http_client.get')
+    def test_stale_results_when_quota_low(self, mock_get):
+        """Test que des résultats périmés sont servis quand le quota est bas"""
+        self.cache.set(search_cache_key("chats", YOUTUBE_SEARCH_FETCH_SIZE), {"videos": [{"id": "vid1", "videoId": "vid1"}], "nextPageToken": None}, ttl=0)
+        self.ledger.spend(850)
+
+        videos = youtube_api.search_videos("chats")
+
+        mock_get.assert_not_called()
+        self.assertEqual(videos[0]["videoId"], "vid1")
+
+    @patch('src.youtube_api.http_client.get')
+    def test_quota_exhausted(self, mock_get):
+        """Test qu'aucun appel n'est fait quand le quota ne couvre plus une recherche"""
+        self.ledger.spend(950)
+
+        self.assertIsNone(youtube_api.search_videos("chats"))
+        mock_get.assert_not_called()
+
+    @patch('src.youtube_api.http_client.get')
+    def test_quota_exceeded_response(self, mock_get):
+        """Test qu'un refus de l'API pour quota dépassé épuise le quota local"""
+        response = search_response([], status_code=403)
+        response.text = '{"error": {"errors": [{"reason": "quotaExceeded"}]}}'
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError("403")
+        mock_get.return_value = response
+
+        self.assertIsNone(youtube_api.search_videos("chats"))
+        self.assertEqual(self.ledger.remaining(), 0)
+
 if __name__ == '__main__':
     unittest.main()
 